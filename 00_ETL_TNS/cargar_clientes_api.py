@@ -10,7 +10,10 @@ from psycopg2 import extras
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import config
 from db_utils import get_db_connection
+from instrumentacion import instrumentar, registrar_metricas, registrar_error
+from huellas import RegistroHuellas
 
+@instrumentar('clientes', 'deteccion_cambios')
 def detectar_y_reportar_cambios(df_api, conn):
     """
     Compara el DataFrame de la API con el estado actual de dim_clientes_empresa
@@ -62,10 +65,15 @@ def detectar_y_reportar_cambios(df_api, conn):
 
     except Exception as e:
         print(f"ERROR: Ocurrió un error durante la detección de cambios de clientes: {e}")
+        registrar_error(e)
 
 # --- El resto de las funciones (extraer_clientes_api, cargar_dim_clientes_empresa) se mantienen igual ---
-def extraer_clientes_api():
-    # ... (código existente)
+@instrumentar('clientes', 'extraccion')
+def extraer_clientes_api(huellas=None):
+    """
+    Extrae los terceros de cada empresa desde la API. Con un RegistroHuellas, se omiten
+    las empresas cuyo payload no cambió desde la última carga.
+    """
     print("INFO: Iniciando extracción de clientes desde la API de TNS...")
     lista_dfs_empresas = []
     MAPEO_COLUMNAS_API = { 'OCODIGO': 'cod_cliente_erp', 'ONIT': 'nit', 'ONOMBRE': 'nombre_erp', 'OCODCLASIFICACION1': 'cod_clasificacion_erp', 'ONOMCLASIFICACION1': 'clasificacion_erp', 'ODIRECC1': 'direccion_erp', 'OTELEF1': 'telefono_erp', 'OCODCIUDAD': 'ciudad_erp', 'OINACTIVO': 'inactivo_erp'}
@@ -77,6 +85,10 @@ def extraer_clientes_api():
         try:
             response = requests.get(url_terceros, params=params, timeout=300)
             response.raise_for_status()
+            registrar_metricas(bytes_descargados=len(response.content))
+            if huellas is not None and huellas.payload_sin_cambios(nombre_empresa, response.content):
+                print(f"INFO: Los terceros de {nombre_empresa} no cambiaron desde la última carga; se omiten.")
+                continue
             datos_api_raw = response.json()
             lista_terceros_api = []
             if isinstance(datos_api_raw, dict) and datos_api_raw.get("status") == "OK":
@@ -97,6 +109,7 @@ def extraer_clientes_api():
         return df_consolidado
     return None
 
+@instrumentar('clientes', 'carga')
 def cargar_dim_clientes_empresa(df_crudo, conn):
     # ... (código existente)
     print("\nINFO: Sincronizando datos de la API con la tabla 'dim_clientes_empresa'...")
@@ -116,25 +129,38 @@ def cargar_dim_clientes_empresa(df_crudo, conn):
         with conn.cursor() as cursor:
             extras.execute_values(cursor, query_dim, datos_dim, page_size=1000)
             conn.commit()
+            registrar_metricas(filas_afectadas_bd=len(datos_dim))
             print(f"¡ÉXITO! {cursor.rowcount} registros afectados en 'dim_clientes_empresa'.")
+            return len(datos_dim)
     except Exception as e:
         print(f"ERROR CRÍTICO durante la carga a dim_clientes_empresa: {e}")
+        registrar_error(e)
         conn.rollback()
 
 def ejecutar_etl_clientes():
     """
     Función principal orquesta el proceso completo de ETL para clientes.
+    Solo se reportan y cargan los clientes nuevos o que cambiaron desde la última carga.
     """
     print("=== INICIO DEL PROCESO ETL DE CLIENTES (API -> dim_clientes_empresa) ===")
 
-    df_clientes_crudo = extraer_clientes_api()
+    huellas = RegistroHuellas('clientes', 'terceros')
+    df_clientes_crudo = extraer_clientes_api(huellas)
 
-    if df_clientes_crudo is not None:
+    if df_clientes_crudo is None:
+        print("INFO: No hay terceros nuevos que procesar.")
+    else:
         conn = get_db_connection()
         if conn:
             try:
-                detectar_y_reportar_cambios(df_clientes_crudo.copy(), conn)
-                cargar_dim_clientes_empresa(df_clientes_crudo, conn)
+                columnas = [c for c in df_clientes_crudo.columns if c != 'empresa_erp']
+                df_cambiados = huellas.filtrar_cambiados(conn, df_clientes_crudo, ['cod_cliente_erp', 'empresa_erp'], columnas)
+                if df_cambiados.empty:
+                    huellas.confirmar(conn)
+                else:
+                    detectar_y_reportar_cambios(df_cambiados.copy(), conn)
+                    if cargar_dim_clientes_empresa(df_cambiados, conn) is not None:
+                        huellas.confirmar(conn)
             finally:
                 conn.close()
                 print("\nINFO: Conexión a la base de datos cerrada.")
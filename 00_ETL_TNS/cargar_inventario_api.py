@@ -5,79 +5,103 @@ import requests
 import os
 import sys
 from datetime import datetime
-from psycopg2 import extras
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import config
-from db_utils import get_db_connection
+from db_utils import get_db_connection, execute_query, copiar_dataframe, preparar_tabla_sombra, publicar_tabla_sombra
+from instrumentacion import instrumentar, registrar_metricas, registrar_error
+from pipeline import ejecutar_pipeline
+
+@instrumentar('inventario', 'extraccion')
+def extraer_inventario_empresa(empresa_config):
+    """
+    Descarga la lista de productos (con sus bodegas) de una empresa desde la API.
+    Devuelve la lista de resultados o None si la respuesta no fue OK.
+    """
+    nombre_empresa = empresa_config["nombre_corto"]
+    url_productos = config.API_URLS["productos"]
+    print(f"--- Procesando inventario para: {nombre_empresa} ---")
+    
+    params = { "empresa": empresa_config["empresa_tns"], "usuario": empresa_config["usuario_tns"], "password": empresa_config["password_tns"], "tnsapitoken": empresa_config["tnsapitoken"], "codsuc": "00"}
+    
+    response = requests.get(url_productos, params=params, timeout=300)
+    response.raise_for_status()
+    registrar_metricas(bytes_descargados=len(response.content))
+    datos_api_raw = response.json()
+    
+    if not (isinstance(datos_api_raw, dict) and datos_api_raw.get("status") == "OK"):
+        return None
+    return datos_api_raw.get("results", [])
+
+@instrumentar('inventario', 'transformacion')
+def transformar_inventario_empresa(empresa_config, resultados):
+    """
+    Aplana las bodegas de cada producto y aplica la lógica de negocio de la empresa
+    (bodegas permitidas y lista de precio). Devuelve None si no queda nada por cargar.
+    """
+    nombre_empresa = empresa_config["nombre_corto"]
+
+    # --- LÓGICA DE EXTRACCIÓN SIMPLIFICADA Y CORREGIDA ---
+    # Aplanamos el JSON directamente
+    df_empresa = pd.json_normalize(
+        resultados,
+        record_path='Bodegas',
+        meta=['OCODIGO', 'OREFERENCIA', 'Items'],
+        errors='ignore' # Ignora productos sin la estructura de Bodegas
+    )
+    if df_empresa.empty: return None
+    
+    # Añadimos la columna de la empresa
+    df_empresa['empresa_erp'] = nombre_empresa
+    
+    # Aplicamos los filtros de negocio
+    bodegas_permitidas = empresa_config.get("bodegas_permitidas", [])
+    df_empresa = df_empresa[df_empresa['OCODBODEGA'].isin(bodegas_permitidas)]
+    
+    if nombre_empresa in ["CAMDUN", "GMD"]:
+        lista_precio_permitida = empresa_config.get("lista_precio_permitida", "1")
+        mask = df_empresa['Items'].apply(lambda items: isinstance(items, list) and any(str(item.get("OCODLISTA", "")).strip() == lista_precio_permitida for item in items))
+        df_empresa = df_empresa[mask]
+    
+    if df_empresa.empty: return None
+    print(f"¡ÉXITO! Se procesaron {len(df_empresa)} registros de inventario para {nombre_empresa}.")
+
+    df_empresa = df_empresa.rename(columns={
+        'OCODIGO': 'codigo_erp', 'OREFERENCIA': 'referencia',
+        'OCODBODEGA': 'cod_bodega_erp', 'OEXISTENCIA': 'cantidad_disponible'
+    })
+    columnas_finales = ['codigo_erp', 'referencia', 'empresa_erp', 'cod_bodega_erp', 'cantidad_disponible']
+    return df_empresa[columnas_finales]
 
 def extraer_y_transformar_inventario():
     """
-    Extrae y transforma los datos de inventario desde la API, aplicando la lógica de negocio.
+    Extrae y transforma el inventario de todas las empresas en un único DataFrame
+    (para usos puntuales; el proceso diario usa el pipeline por empresa).
     """
     print("INFO: Iniciando extracción y transformación de inventario...")
     
     lista_dfs_finales = []
-    
     for empresa_config in config.API_CONFIG_TNS:
-        nombre_empresa = empresa_config["nombre_corto"]
-        url_productos = config.API_URLS["productos"]
-        print(f"--- Procesando inventario para: {nombre_empresa} ---")
-        
-        params = { "empresa": empresa_config["empresa_tns"], "usuario": empresa_config["usuario_tns"], "password": empresa_config["password_tns"], "tnsapitoken": empresa_config["tnsapitoken"], "codsuc": "00"}
-        
         try:
-            response = requests.get(url_productos, params=params, timeout=300)
-            response.raise_for_status()
-            datos_api_raw = response.json()
-            
-            if not (isinstance(datos_api_raw, dict) and datos_api_raw.get("status") == "OK"):
-                continue
-
-            # --- LÓGICA DE EXTRACCIÓN SIMPLIFICADA Y CORREGIDA ---
-            # Aplanamos el JSON directamente
-            df_empresa = pd.json_normalize(
-                datos_api_raw.get("results", []),
-                record_path='Bodegas',
-                meta=['OCODIGO', 'OREFERENCIA', 'Items'],
-                errors='ignore' # Ignora productos sin la estructura de Bodegas
-            )
-            if df_empresa.empty: continue
-            
-            # Añadimos la columna de la empresa
-            df_empresa['empresa_erp'] = nombre_empresa
-            
-            # Aplicamos los filtros de negocio
-            bodegas_permitidas = empresa_config.get("bodegas_permitidas", [])
-            df_empresa = df_empresa[df_empresa['OCODBODEGA'].isin(bodegas_permitidas)]
-            
-            if nombre_empresa in ["CAMDUN", "GMD"]:
-                lista_precio_permitida = empresa_config.get("lista_precio_permitida", "1")
-                mask = df_empresa['Items'].apply(lambda items: isinstance(items, list) and any(str(item.get("OCODLISTA", "")).strip() == lista_precio_permitida for item in items))
-                df_empresa = df_empresa[mask]
-            
-            if not df_empresa.empty:
+            resultados = extraer_inventario_empresa(empresa_config)
+            df_empresa = transformar_inventario_empresa(empresa_config, resultados) if resultados is not None else None
+            if df_empresa is not None:
                 lista_dfs_finales.append(df_empresa)
-                print(f"¡ÉXITO! Se procesaron {len(df_empresa)} registros de inventario para {nombre_empresa}.")
-
         except Exception as e:
-            print(f"ERROR al procesar {nombre_empresa}: {e}")
+            print(f"ERROR al procesar {empresa_config['nombre_corto']}: {e}")
 
     if lista_dfs_finales:
         df_consolidado = pd.concat(lista_dfs_finales, ignore_index=True)
-        df_consolidado = df_consolidado.rename(columns={
-            'OCODIGO': 'codigo_erp', 'OREFERENCIA': 'referencia',
-            'OCODBODEGA': 'cod_bodega_erp', 'OEXISTENCIA': 'cantidad_disponible'
-        })
-        columnas_finales = ['codigo_erp', 'referencia', 'empresa_erp', 'cod_bodega_erp', 'cantidad_disponible']
-        df_consolidado = df_consolidado[columnas_finales]
-        
         print(f"\nINFO: Extracción completada. Total de registros de inventario: {len(df_consolidado)}")
         return df_consolidado
     return None
 
-def cargar_inventario_db(df_inventario, conn):
-    """Carga el DataFrame de inventario en la tabla Inventario_Actual."""
+@instrumentar('inventario', 'carga')
+def cargar_inventario_db(df_inventario, conn, tabla_destino):
+    """
+    Enriquece el DataFrame de inventario con los FKs y lo copia (COPY) a la tabla destino,
+    que es la tabla sombra de Inventario_Actual durante la corrida.
+    """
     print("\nINFO: Iniciando carga de inventario en la base de datos...")
     if df_inventario is None or df_inventario.empty:
         print("ADVERTENCIA: No hay datos de inventario para cargar.")
@@ -85,7 +109,9 @@ def cargar_inventario_db(df_inventario, conn):
 
     try:
         # --- PASO 1: Crear mapas para buscar los FKs ---
-        mapa_productos = pd.read_sql("SELECT id_producto, codigo_erp, referencia, empresa_erp FROM dim_productos", conn)
+        # Solo los productos de las empresas presentes (en el pipeline llega una empresa a la vez)
+        empresas = (list(df_inventario['empresa_erp'].unique()),)
+        mapa_productos = pd.read_sql("SELECT id_producto, codigo_erp, referencia, empresa_erp FROM dim_productos WHERE empresa_erp = ANY(%s)", conn, params=empresas)
         mapa_productos_dict = {(row.codigo_erp, row.referencia, row.empresa_erp): row.id_producto for row in mapa_productos.itertuples(index=False)}
         
         mapa_bodegas = pd.read_sql("SELECT id_bodega, cod_bodega_erp FROM dim_bodegas", conn)
@@ -99,43 +125,71 @@ def cargar_inventario_db(df_inventario, conn):
         print(f"INFO: {len(df_para_carga)} registros de inventario válidos para cargar.")
         if df_para_carga.empty: return
 
-        # --- CORRECCIÓN DEFINITIVA para SettingWithCopyWarning ---
-        # Usamos .loc para asignar la nueva columna de forma explícita
-        df_para_carga.loc[:, 'fecha_ultima_actualizacion'] = datetime.now()
-        df_para_carga.loc[:, 'id_producto_fk'] = df_para_carga['id_producto_fk'].astype(int)
-        df_para_carga.loc[:, 'id_bodega_fk'] = df_para_carga['id_bodega_fk'].astype(int)
+        df_para_carga['fecha_ultima_actualizacion'] = datetime.now()
+        df_para_carga['id_producto_fk'] = df_para_carga['id_producto_fk'].astype(int)
+        df_para_carga['id_bodega_fk'] = df_para_carga['id_bodega_fk'].astype(int)
 
-        # --- PASO 3: Cargar los datos usando UPSERT ---
+        # --- PASO 3: Copiar a la tabla destino (sin índices: a velocidad de COPY) ---
         columnas_db = ['id_producto_fk', 'id_bodega_fk', 'empresa_erp', 'cantidad_disponible', 'fecha_ultima_actualizacion']
-        datos_para_upsert = [tuple(row) for row in df_para_carga[columnas_db].itertuples(index=False)]
-
-        query = f"""
-            INSERT INTO Inventario_Actual ({", ".join(columnas_db)}) VALUES %s
-            ON CONFLICT (id_producto_fk, id_bodega_fk, empresa_erp) DO UPDATE SET
-                cantidad_disponible = EXCLUDED.cantidad_disponible,
-                fecha_ultima_actualizacion = EXCLUDED.fecha_ultima_actualizacion;
-        """
-        
-        with conn.cursor() as cursor:
-            extras.execute_values(cursor, query, datos_para_upsert, page_size=1000)
-            conn.commit()
-            print(f"¡ÉXITO! La tabla 'Inventario_Actual' ha sido actualizada. {cursor.rowcount} filas afectadas.")
+        filas = copiar_dataframe(conn, tabla_destino, df_para_carga, columnas_db)
+        conn.commit()
+        registrar_metricas(filas_afectadas_bd=filas)
+        print(f"¡ÉXITO! {filas} registros de inventario copiados a '{tabla_destino}'.")
 
     except Exception as e:
         print(f"ERROR CRÍTICO durante la carga de inventario: {e}")
+        registrar_error(e)
         conn.rollback()
 
+@instrumentar('inventario', 'publicacion')
+def publicar_inventario(conn, sombra):
+    """
+    Completa la sombra con las filas de Inventario_Actual que la API no trajo en esta corrida
+    (conservan su cantidad y fecha, igual que con el UPSERT anterior, y cubren a las empresas que
+    fallaron) y la intercambia con la tabla viva.
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {sombra}
+                SELECT ia.* FROM Inventario_Actual ia
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {sombra} s
+                    WHERE s.id_producto_fk = ia.id_producto_fk
+                      AND s.id_bodega_fk = ia.id_bodega_fk
+                      AND s.empresa_erp = ia.empresa_erp);
+            """)
+            print(f"INFO: {cursor.rowcount} registros de inventario no reportados en esta corrida se conservan.")
+        conn.commit()
+        publicar_tabla_sombra(conn, 'Inventario_Actual', sombra)
+        print("¡ÉXITO! La tabla 'Inventario_Actual' ha sido actualizada.")
+    except Exception as e:
+        print(f"ERROR CRÍTICO al publicar el inventario: {e}")
+        registrar_error(e)
+        conn.rollback()
+        # La tabla viva queda como estaba; la sombra ya no sirve
+        execute_query(conn, f"DROP TABLE IF EXISTS {sombra};")
+
 def ejecutar_etl_inventario():
     print("=== INICIO DEL PROCESO ETL DE INVENTARIO ===")
-    df_inventario = extraer_y_transformar_inventario()
-
-    if df_inventario is not None and not df_inventario.empty:
-        conn = get_db_connection()
-        if conn:
-            try:
-                cargar_inventario_db(df_inventario, conn)
-            finally:
-                conn.close()
+    # Pipeline por empresa: la descarga de la siguiente empresa se solapa con la
+    # transformación y la carga de la anterior. Cada empresa se copia a una tabla sombra
+    # y, al final, la sombra reemplaza a Inventario_Actual en una transacción corta.
+    conn = get_db_connection()
+    if conn:
+        try:
+            sombra = preparar_tabla_sombra(conn, 'Inventario_Actual')
+            ejecutar_pipeline(
+                'inventario', config.API_CONFIG_TNS,
+                extraer=extraer_inventario_empresa,
+                transformar=transformar_inventario_empresa,
+                cargar=lambda empresa, df: cargar_inventario_db(df, conn, sombra),
+            )
+            publicar_inventario(conn, sombra)
+        except Exception as e:
+            print(f"ERROR CRÍTICO durante el ETL de inventario: {e}")
+        finally:
+            conn.close()
     print("\n=== FIN DEL PROCESO ETL DE INVENTARIO ===")
 
 if __name__ == '__main__':
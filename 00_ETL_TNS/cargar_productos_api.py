@@ -11,48 +11,32 @@ from psycopg2 import extras
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import config
 from db_utils import get_db_connection, execute_query
+from instrumentacion import instrumentar, registrar_metricas, registrar_error
+from huellas import RegistroHuellas
+from reglas_productos import cargar_reglas, aplicar_reglas
+from historia_productos import actualizar_historia_productos
+from historia_precios import actualizar_historia_precios
 
 def leer_mapeos():
     """
-    Carga todos los archivos CSV de mapeo y corrección en diccionarios para una búsqueda rápida.
+    Devuelve las reglas de corrección (líneas, grupos, departamentos y marcas) compiladas.
+    Los CSV solo se vuelven a leer si cambiaron desde la última compilación (ver reglas_productos.py).
     """
     print("INFO: Cargando archivos de mapeo y corrección...")
     try:
-        base_path = config.DATOS_ENTRADA_DIR
-
-        # Mapeos simples (código de producto -> código corregido)
-        df_lineas = pd.read_csv(os.path.join(base_path, 'mapeo_correccion_lineas.csv'), dtype=str)
-        mapa_lineas = df_lineas.set_index('codigo_erp')['cod_linea_erp_corregido'].to_dict()
-
-        df_grupos = pd.read_csv(os.path.join(base_path, 'mapeo_correccion_grupos.csv'), dtype=str)
-        mapa_grupos = df_grupos.set_index('codigo_erp')['cod_grupo_articulo_corregido'].to_dict()
-
-        df_dpto = pd.read_csv(os.path.join(base_path, 'mapeo_correccion_dpto.csv'), dtype=str)
-        mapa_dpto = df_dpto.set_index('codigo_erp')['cod_dpto_sku_corregido'].to_dict()
-
-        # Mapeo de marcas (nombre de marca + empresa -> código unificado)
-        df_marcas = pd.read_csv(os.path.join(base_path, 'mapeo_marcas.csv'), dtype=str)
-        # Creamos una llave compuesta para el diccionario: "nombre|empresa"
-        #df_marcas['llave_compuesta'] = df_marcas['nombre_marca_erp'] + '|' + df_marcas['empresa_erp']        
-        df_marcas['llave_compuesta'] = df_marcas['nombre_marca_erp'].fillna('') + ',' + df_marcas['empresa_erp'].fillna('')
-        mapa_marcas = df_marcas.set_index('llave_compuesta')['cod_marca_unificado'].to_dict()
-
-        mapeos = {
-            "lineas": mapa_lineas,
-            "grupos": mapa_grupos,
-            "dptos": mapa_dpto,
-            "marcas": mapa_marcas
-        }
+        mapeos = cargar_reglas()
         print("INFO: Mapeos cargados exitosamente.")
         return mapeos
     except Exception as e:
         print(f"ERROR CRÍTICO al cargar los mapeos {e}")
         return None
 
-def extraer_productos_api():
+@instrumentar('productos', 'extraccion')
+def extraer_productos_api(huellas=None):
     """
     Se conecta a la API de TNS para cada empresa configurada, extrae la lista
     detallada de productos y los consolida en un único DataFrame.
+    Con un RegistroHuellas, se omiten las empresas cuyo payload no cambió desde la última carga.
     """
     print("INFO: Iniciando extracción de productos desde la API de TNS...")
     
@@ -73,7 +57,9 @@ def extraer_productos_api():
         "OFACTOR": "factor_erp",
         "OPORIVA": "porcentaje_iva",
         "OULTIMOCOSTO": "costo_ult_erp",
-        "OCOSTOPROMEDIO": "costo_promedio_erp"
+        "OCOSTOPROMEDIO": "costo_promedio_erp",
+        # Precios por lista (OCODLISTA / OPRECIO), para la historia de precios
+        "Items": "items_precios"
     }
 
     for empresa_config in config.API_CONFIG_TNS:
@@ -93,6 +79,10 @@ def extraer_productos_api():
         try:
             response = requests.get(url_productos, params=params, timeout=300) # Timeout de 5 minutos
             response.raise_for_status()
+            registrar_metricas(bytes_descargados=len(response.content))
+            if huellas is not None and huellas.payload_sin_cambios(nombre_empresa, response.content):
+                print(f"INFO: El catálogo de {nombre_empresa} no cambió desde la última carga; se omite.")
+                continue
             
             # La lógica robusta de parseo de tu script original
             datos_api_raw = response.json()
@@ -131,6 +121,7 @@ def extraer_productos_api():
     return None
 
 
+@instrumentar('productos', 'transformacion')
 def transformar_productos(df_crudo, mapeos):
     """
     Aplica las correcciones de mapeo, sobreescribiendo los datos crudos.
@@ -154,22 +145,14 @@ def transformar_productos(df_crudo, mapeos):
     print("INFO: Aplicada la regla de negocio para referencias vacías.")
     # ------------------------------------------------
 
-    # Aplicamos las correcciones, SOBREESCRIBIENDO las columnas originales
+    # Aplicamos las correcciones, SOBREESCRIBIENDO las columnas originales (todas en una pasada por llave)
     print("INFO: Aplicando correcciones de mapeo...")
-    df['cod_linea_erp'] = df['codigo_erp'].map(mapeos['lineas']).fillna(df['cod_linea_erp'])
-    df['cod_grupo_erp'] = df['codigo_erp'].map(mapeos['grupos']).fillna(df['cod_grupo_erp'])
-    df['cod_dpto_sku_erp'] = df['codigo_erp'].map(mapeos['dptos']).fillna(df['cod_dpto_sku_erp'])
-
-    # Creamos una llave compuesta para buscar en el mapa de marcas
-    df['llave_marca'] = df['nombre_marca_erp'].fillna('') + '|' + df['empresa_erp'].fillna('')
-    # Usamos el mapa para rellenar la nueva columna cod_marca_erp
-    df['cod_marca_erp'] = df['llave_marca'].map(mapeos['marcas'])
-    # Eliminamos la columna auxiliar que ya no necesitamos
-    df.drop(columns=['llave_marca'], inplace=True)
-
+    df, reporte = aplicar_reglas(df, mapeos)
+    print(f"INFO: Aciertos de las reglas de mapeo (versión {mapeos['version']}):\n{reporte.to_string(index=False)}")
     print("INFO: Transformación completada.")
     return df
 
+@instrumentar('productos', 'carga')
 def cargar_productos_db(df_limpio, conn):
     """
     Carga el DataFrame limpio en la tabla dim_productos de forma masiva y segura.
@@ -207,34 +190,53 @@ def cargar_productos_db(df_limpio, conn):
             """
 
             # Convertimos el DataFrame a una lista de tuplas para la inserción
-            df_para_carga = df_limpio[columnas_db]
+            # Los vacíos (ej. marcas sin regla) van como NULL y no como el texto 'NaN'
+            df_para_carga = df_limpio[columnas_db].astype(object).where(df_limpio[columnas_db].notna(), None)
             datos_para_insertar = [tuple(row) for row in df_para_carga.itertuples(index=False)]
 
             print(f"INFO: Realizando UPSERT (INSERT/UPDATE) de {len(datos_para_insertar)} registros en 'dim_productos'...")
             extras.execute_values(cursor, query, datos_para_insertar, page_size=1000)
+            # Con ON CONFLICT DO UPDATE cada fila enviada se inserta o se actualiza
+            registrar_metricas(filas_afectadas_bd=len(datos_para_insertar))
             
             # No olvides hacer commit para guardar los cambios
             conn.commit()
             print("¡ÉXITO! La tabla 'dim_productos' ha sido actualizada.")
+            return len(datos_para_insertar)
 
         except Exception as e:
             print(f"ERROR CRÍTICO durante la carga a la base de datos: {e}")
+            registrar_error(e)
             conn.rollback() # Revertimos la transacción en caso de error
 
 def ejecutar_etl_productos():
     """
     Función principal que orquesta el proceso completo de ETL para productos.
+    Solo se transforman y cargan los productos nuevos o que cambiaron desde la última carga;
+    de esos mismos se actualiza la historia (SCD2) de atributos y costos y la de precios por lista.
     """
     print("=== INICIO DEL PROCESO ETL DE PRODUCTOS ===")
     mapeos = leer_mapeos()
     if mapeos:
-        df_crudo = extraer_productos_api()
-        if df_crudo is not None:
-            df_preparado = transformar_productos(df_crudo, mapeos)
+        # Si cambian los mapeos de corrección, todas las huellas cambian y se recarga todo
+        huellas = RegistroHuellas('productos', 'productos', contexto=mapeos['version'])
+        df_crudo = extraer_productos_api(huellas)
+        if df_crudo is None:
+            print("INFO: No hay catálogos nuevos que procesar.")
+        else:
             conn = get_db_connection()
             if conn:
                 try:
-                    cargar_productos_db(df_preparado, conn)
+                    df_cambiados = huellas.filtrar_cambiados(conn, df_crudo, ['codigo_erp', 'referencia', 'empresa_erp'], list(df_crudo.columns))
+                    if df_cambiados.empty:
+                        huellas.confirmar(conn)
+                    else:
+                        df_preparado = transformar_productos(df_cambiados, mapeos)
+                        # Si la historia falla, las huellas no se confirman y la próxima corrida lo reintenta
+                        if (cargar_productos_db(df_preparado, conn) is not None
+                                and actualizar_historia_productos(conn, df_preparado) is not None
+                                and actualizar_historia_precios(conn, df_preparado) is not None):
+                            huellas.confirmar(conn)
                 finally:
                     conn.close()
                     print("\nINFO: Conexión a la base de datos cerrada.")
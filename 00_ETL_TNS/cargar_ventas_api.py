@@ -1,6 +1,7 @@
 # 00_ETL_TNS/cargar_ventas_api.py
 
 import pandas as pd
+import numpy as np
 import requests
 import os
 import sys
@@ -11,69 +12,179 @@ from psycopg2 import extras
 # Añade la ruta raíz del proyecto al path de Python para poder importar nuestros módulos
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import config  # Importa nuestras configuraciones (URLs, credenciales)
-from db_utils import get_db_connection, execute_query # Importa nuestras funciones de base de datos
+from db_utils import get_db_connection # Importa nuestras funciones de base de datos
+from instrumentacion import instrumentar, registrar_metricas, registrar_error # Medición de cada etapa
+from pipeline import ejecutar_pipeline # Extracción, transformación y carga solapadas por empresa
+from historia_productos import mapa_historia_productos, asignar_version_producto, buscar_vigente
+from historia_clasificacion_clientes import mapa_clasificacion_clientes, asignar_clasificacion_cliente
+from resumen_margenes import refrescar_resumen_margenes, meses_entre
+from clasificacion_abc import refrescar_ventas_diarias
+
+# --- Esquema Tipado de las Líneas de Venta ---
+# Se aplica al leer cada respuesta de la API, para que la limpieza y los merges trabajen
+# sobre columnas compactas en vez de objetos de Python (texto en Arrow si pyarrow está instalado).
+try:
+    import pyarrow  # noqa: F401
+    TIPO_TEXTO = pd.StringDtype('pyarrow')
+except ImportError:
+    TIPO_TEXTO = pd.StringDtype('python')
+
+# Códigos con pocos valores distintos: se guardan como category
+COLUMNAS_CATEGORIA = ['empresa_erp', 'bodega_erp', 'forma_pago_erp', 'lista_precio_erp', 'cod_vendedor_erp', 'motivo_devolucion_erp']
+# Medidas que la API entrega como texto
+COLUMNAS_MEDIDAS = ['cantidad', 'valor_base', 'valor_descuento', 'valor_iva', 'valor_total', 'costo_total', 'precio_lista']
+# Llaves foráneas que se obtienen al enriquecer (INT en hechos_ventas)
+COLUMNAS_FK = ['id_producto_fk', 'id_cliente_empresa_fk', 'id_rol_historia_fk', 'id_bodega_fk']
+
+def tipar_ventas(df):
+    """Convierte las columnas de ventas (ya renombradas) a sus tipos compactos."""
+    for col in df.columns:
+        if col in COLUMNAS_MEDIDAS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        elif col == 'id_transaccion_erp':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+        elif col in COLUMNAS_CATEGORIA:
+            df[col] = df[col].astype(TIPO_TEXTO).astype('category')
+        else:
+            df[col] = df[col].astype(TIPO_TEXTO)
+    return df
+
+def concatenar_ventas(lista_dfs):
+    """Une los DataFrames de cada empresa conservando las columnas category (con categorías unificadas)."""
+    for col in COLUMNAS_CATEGORIA:
+        categorias = pd.api.types.union_categoricals([d[col] for d in lista_dfs]).categories
+        for d in lista_dfs:
+            d[col] = d[col].cat.set_categories(categorias)
+    return pd.concat(lista_dfs, ignore_index=True)
+
+def _alinear_mapa(mapa, df, llaves, columna_id):
+    """
+    Copia del mapa con las llaves del mismo tipo que en ventas (el merge no vuelve a object) y el id como Int32.
+    Se descartan las filas con llave vacía o con un valor que no aparece en las ventas: si quedaran
+    nulas, una venta con esa llave vacía se uniría con ellas.
+    """
+    mapa = mapa.copy()
+    for col_ventas, col_mapa in llaves.items():
+        tipo = df[col_ventas].dtype
+        if isinstance(tipo, pd.CategoricalDtype):
+            # Primero al tipo de las categorías: convertir directo a la categoría deja nulo lo que no está en ella
+            mapa[col_mapa] = mapa[col_mapa].astype(tipo.categories.dtype)
+            mapa = mapa[mapa[col_mapa].isin(tipo.categories)]
+        else:
+            mapa[col_mapa] = mapa[col_mapa].astype(tipo)
+        mapa = mapa[mapa[col_mapa].notna()]
+        mapa[col_mapa] = mapa[col_mapa].astype(tipo)
+    mapa[columna_id] = mapa[columna_id].astype('Int32')
+    return mapa
+
+# Diccionario "traductor". La clave es el nombre del campo en la API,
+# el valor es el nombre que le daremos temporalmente en nuestro script.
+MAPEO_COLUMNAS_API = {
+    'DEKARDEXID': 'id_transaccion_erp', 'NUMFACTURA': 'numero_factura_erp',
+    'FECHA': 'fecha_str', 'CODCLIENTE': 'cod_cliente_erp',
+    'CODIGO': 'codigo_producto_erp', 'REFERENCIA': 'referencia_erp',
+    'CODVENDEDOR': 'cod_vendedor_erp', 'CANT': 'cantidad',
+    'PREBASE': 'valor_base', 'DESCUENTO': 'valor_descuento',
+    'PREIVA': 'valor_iva', 'PRECIOTOT': 'valor_total',
+    'COSTOPROMEDIO': 'costo_total', 'PRECIOLISTA': 'precio_lista',
+    'FORMAPAGO': 'forma_pago_erp', 'CODBODEGA': 'bodega_erp',
+    'LISTAPRECIO': 'lista_precio_erp', 'OBSERV': 'observaciones_erp',
+    'MOTIVODEVOLUCION': 'motivo_devolucion_erp', 'PEDIDO': 'pedido_tiendapp'
+}
+
+# --- Cuarentena de Ventas ---
+# Columna que queda vacía al enriquecer -> motivo que se guarda en cuarentena_ventas
+MOTIVOS_RECHAZO = {
+    'fecha_sk': 'fecha', 'id_producto_fk': 'producto', 'id_cliente_empresa_fk': 'cliente',
+    'id_rol_historia_fk': 'rol_vendedor', 'id_bodega_fk': 'bodega'
+}
+# Línea tal como llegó de la API (más la fecha ya convertida) y el motivo del rechazo
+COLUMNAS_CUARENTENA = ['empresa_erp'] + list(MAPEO_COLUMNAS_API.values()) + ['fecha_sk', 'motivo_rechazo']
+
+# Contenido de la línea que entra en su huella (todo lo que trae la API salvo la llave)
+COLUMNAS_HUELLA_LINEA = [c for c in MAPEO_COLUMNAS_API.values() if c != 'id_transaccion_erp']
+
+def deduplicar_ventas(df):
+    """
+    Quita las líneas repetidas (misma empresa y DEKARDEXID) de una extracción, con una huella de
+    64 bits por línea: si el contenido es idéntico es un duplicado exacto; si difiere, queda la
+    última versión recibida. Las líneas sin DEKARDEXID no se pueden comparar y se conservan.
+    """
+    if df is None or df.empty or 'id_transaccion_erp' not in df.columns:
+        return df
+    huella = pd.util.hash_pandas_object(df[[c for c in COLUMNAS_HUELLA_LINEA if c in df.columns]], index=False)
+    claves = pd.DataFrame({'empresa_erp': df['empresa_erp'].to_numpy(), 'id': df['id_transaccion_erp'].to_numpy(),
+                           'huella': huella.to_numpy()})
+    con_llave = claves['id'].notna().to_numpy()
+    repetidas = claves.duplicated(['empresa_erp', 'id'], keep='last').to_numpy() & con_llave
+    if not repetidas.any():
+        return df
+    exactas = int((claves.duplicated(['empresa_erp', 'id', 'huella'], keep='last').to_numpy() & con_llave).sum())
+    print(f"ADVERTENCIA: {int(repetidas.sum())} líneas de ventas repetidas descartadas ({exactas} idénticas y "
+          f"{int(repetidas.sum()) - exactas} con otro contenido, de las que quedó la última).")
+    return df[~repetidas]
+
+@instrumentar('ventas', 'extraccion')
+def extraer_ventas_empresa(empresa_config, fecha_desde, fecha_hasta):
+    """
+    Paso 1: EXTRACCIÓN (una empresa)
+    Descarga las ventas de la empresa para el rango de fechas y las devuelve ya tipadas.
+    Devuelve None si la API no trae ventas. Los errores de red se propagan al llamador.
+    """
+    nombre_empresa = empresa_config["nombre_corto"]
+    url_ventas = config.API_URLS["ventas"]
+    print(f"--- Extrayendo para la empresa: {nombre_empresa} ---")
+    
+    # Preparamos los parámetros para la llamada a la API
+    params = {
+        "empresa": empresa_config["empresa_tns"],
+        "usuario": empresa_config["usuario_tns"],
+        "password": empresa_config["password_tns"],
+        "tnsapitoken": empresa_config["tnsapitoken"],
+        "CodSucursal": "00",
+        # La API espera el formato MM/DD/YYYY, así que lo convertimos
+        "fechaInicial": datetime.strptime(fecha_desde, "%Y-%m-%d").strftime("%m/%d/%Y"),
+        "fechaFin": datetime.strptime(fecha_hasta, "%Y-%m-%d").strftime("%m/%d/%Y"),
+    }
+    
+    # Hacemos la llamada a la API
+    response = requests.get(url_ventas, params=params, timeout=600)
+    response.raise_for_status() # Lanza un error si la respuesta no es exitosa (ej. 404, 500)
+    registrar_metricas(bytes_descargados=len(response.content))
+    datos_api_raw = response.json()
+    
+    # Verificamos que la respuesta tenga el formato esperado y extraemos la lista de ventas
+    if not (isinstance(datos_api_raw, dict) and (datos_api_raw.get("Data") or datos_api_raw.get("results"))):
+        print(f"INFO: No se encontraron ventas de {nombre_empresa} para el período.")
+        return None
+    lista_ventas = datos_api_raw.get("Data") or datos_api_raw.get("results")
+    # Solo construimos las columnas que usamos, ya renombradas y tipadas
+    df_empresa = pd.DataFrame.from_records(lista_ventas, columns=list(MAPEO_COLUMNAS_API))
+    df_empresa = df_empresa.rename(columns=MAPEO_COLUMNAS_API)
+    if df_empresa.empty:
+        return None
+
+    # Etiquetamos cada fila con el nombre de la empresa para poder identificarla
+    df_empresa['empresa_erp'] = nombre_empresa
+    print(f"¡ÉXITO! Se extrajeron {len(df_empresa)} registros de ventas de {nombre_empresa}.")
+    return tipar_ventas(df_empresa)
 
 def extraer_ventas_api(fecha_desde, fecha_hasta):
     """
-    Paso 1: EXTRACCIÓN
-    Se conecta a la API de TNS y extrae los datos de ventas crudos para un rango de fechas.
+    Extrae las ventas de todas las empresas y las consolida en un único DataFrame
+    (para usos puntuales; el proceso diario usa el pipeline por empresa).
     """
     print(f"INFO: Iniciando extracción de ventas desde {fecha_desde} hasta {fecha_hasta}...")
     
     # Creamos una lista vacía para guardar los datos de cada empresa
     lista_dfs_empresas = []
-    
-    # Diccionario "traductor". La clave es el nombre del campo en la API,
-    # el valor es el nombre que le daremos temporalmente en nuestro script.
-    MAPEO_COLUMNAS_API = {
-        'DEKARDEXID': 'id_transaccion_erp', 'NUMFACTURA': 'numero_factura_erp',
-        'FECHA': 'fecha_str', 'CODCLIENTE': 'cod_cliente_erp',
-        'CODIGO': 'codigo_producto_erp', 'REFERENCIA': 'referencia_erp',
-        'CODVENDEDOR': 'cod_vendedor_erp', 'CANT': 'cantidad',
-        'PREBASE': 'valor_base', 'DESCUENTO': 'valor_descuento',
-        'PREIVA': 'valor_iva', 'PRECIOTOT': 'valor_total',
-        'COSTOPROMEDIO': 'costo_total', 'PRECIOLISTA': 'precio_lista',
-        'FORMAPAGO': 'forma_pago_erp', 'CODBODEGA': 'bodega_erp',
-        'LISTAPRECIO': 'lista_precio_erp', 'OBSERV': 'observaciones_erp',
-        'MOTIVODEVOLUCION': 'motivo_devolucion_erp', 'PEDIDO': 'pedido_tiendapp'
-    }
-
-    # Hacemos un bucle para procesar cada empresa definida en nuestro config.py
     for empresa_config in config.API_CONFIG_TNS:
-        nombre_empresa = empresa_config["nombre_corto"]
-        url_ventas = config.API_URLS["ventas"]
-        print(f"--- Extrayendo para la empresa: {nombre_empresa} ---")
-        
-        # Preparamos los parámetros para la llamada a la API
-        params = {
-            "empresa": empresa_config["empresa_tns"],
-            "usuario": empresa_config["usuario_tns"],
-            "password": empresa_config["password_tns"],
-            "tnsapitoken": empresa_config["tnsapitoken"],
-            "CodSucursal": "00",
-            # La API espera el formato MM/DD/YYYY, así que lo convertimos
-            "fechaInicial": datetime.strptime(fecha_desde, "%Y-%m-%d").strftime("%m/%d/%Y"),
-            "fechaFin": datetime.strptime(fecha_hasta, "%Y-%m-%d").strftime("%m/%d/%Y"),
-        }
-        
         try:
-            # Hacemos la llamada a la API
-            response = requests.get(url_ventas, params=params, timeout=600)
-            response.raise_for_status() # Lanza un error si la respuesta no es exitosa (ej. 404, 500)
-            datos_api_raw = response.json()
-            
-            # Verificamos que la respuesta tenga el formato esperado y extraemos la lista de ventas
-            if isinstance(datos_api_raw, dict) and (datos_api_raw.get("Data") or datos_api_raw.get("results")):
-                lista_ventas = datos_api_raw.get("Data") or datos_api_raw.get("results")
-                df_empresa = pd.DataFrame(lista_ventas)
-                
-                if not df_empresa.empty:
-                    # Etiquetamos cada fila con el nombre de la empresa para poder identificarla
-                    df_empresa['empresa_erp'] = nombre_empresa
-                    lista_dfs_empresas.append(df_empresa)
-                    print(f"¡ÉXITO! Se extrajeron {len(df_empresa)} registros de ventas de {nombre_empresa}.")
+            df_empresa = extraer_ventas_empresa(empresa_config, fecha_desde, fecha_hasta)
+            if df_empresa is not None:
+                lista_dfs_empresas.append(df_empresa)
         except Exception as e:
-            print(f"ERROR al procesar {nombre_empresa}: {e}")
+            print(f"ERROR al procesar {empresa_config['nombre_corto']}: {e}")
 
     # Si no obtuvimos datos de ninguna empresa, terminamos el proceso
     if not lista_dfs_empresas:
@@ -81,20 +192,50 @@ def extraer_ventas_api(fecha_desde, fecha_hasta):
         return None
         
     # Unimos los datos de todas las empresas en una sola tabla grande
-    df_consolidado = pd.concat(lista_dfs_empresas, ignore_index=True)
-    # Aplicamos el renombrado de columnas que definimos en el diccionario
-    df_consolidado = df_consolidado.rename(columns=MAPEO_COLUMNAS_API)
+    df_consolidado = concatenar_ventas(lista_dfs_empresas)
     print(f"\nINFO: Extracción completada. Total de registros de ventas: {len(df_consolidado)}")
     
     return df_consolidado
 
+def leer_mapas_ventas(conn, empresas):
+    """
+    Lee de la BD los mapas de dimensiones que necesita enriquecer_ventas() para esas empresas
+    (solo sus filas). Se devuelven tal como vienen de la BD, en un dict {nombre: DataFrame}.
+    """
+    print("INFO: Creando mapas de dimensiones para el enriquecimiento...")
+    empresas = list(empresas)
+    return {
+        'productos': pd.read_sql("SELECT id_producto, codigo_erp, referencia, empresa_erp FROM dim_productos WHERE empresa_erp = ANY(%s)", conn, params=(empresas,)),
+        'clientes': pd.read_sql("SELECT id_cliente_empresa, cod_cliente_erp, empresa_erp FROM dim_clientes_empresa WHERE empresa_erp = ANY(%s)", conn, params=(empresas,)),
+        'roles': pd.read_sql("SELECT id_rol_historia, cod_rol_erp, empresa_erp, fecha_inicio_validez, fecha_fin_validez FROM dim_roles_comerciales_historia WHERE empresa_erp = ANY(%s)", conn, params=(empresas,)),
+        'bodegas': pd.read_sql("SELECT id_bodega, cod_bodega_erp FROM dim_bodegas", conn),
+        'historia_productos': mapa_historia_productos(conn, empresas),
+        'clasificacion_clientes': mapa_clasificacion_clientes(conn, empresas),
+    }
+
+@instrumentar('ventas', 'transformacion')
 def transformar_y_enriquecer_ventas(df_ventas, conn):
     """
     Paso 2: TRANSFORMACIÓN Y ENRIQUECIMIENTO
     Toma los datos crudos, los limpia y los enriquece con los IDs de las tablas de dimensión.
-    Toma el DF de ventas y lo enriquece con los Foreign Keys de las dimensiones.
+    Devuelve dos DataFrames: las líneas válidas (columnas de hechos_ventas) y las rechazadas
+    con su motivo (columnas de cuarentena_ventas).
     """
     print("\nINFO: Iniciando transformación y enriquecimiento de datos de ventas...")
+    # Una misma línea puede llegar dos veces (ventanas que se solapan); se descarta antes de los merges
+    df = deduplicar_ventas(df_ventas)
+    # Solo las filas de las empresas presentes (en el pipeline llega una empresa a la vez)
+    mapas = leer_mapas_ventas(conn, df['empresa_erp'].dropna().unique())
+    df_final, df_rechazadas = enriquecer_ventas(df, mapas)
+    registrar_metricas(filas_salida=len(df_final))
+    return df_final, df_rechazadas
+
+def enriquecer_ventas(df_ventas, mapas):
+    """
+    Limpieza y enriquecimiento de las ventas con los mapas de leer_mapas_ventas(), sin tocar la BD
+    (por eso se puede ejecutar en otro proceso sobre un fragmento de las ventas).
+    Devuelve (líneas válidas con las columnas de hechos_ventas, líneas rechazadas para cuarentena).
+    """
     df = df_ventas.copy() # Hacemos una copia para no modificar el DataFrame original
 
     # --- 1. Limpieza y Aplicación de Reglas de Negocio ---
@@ -105,16 +246,10 @@ def transformar_y_enriquecer_ventas(df_ventas, conn):
     # Aplicamos la regla de negocio: si la referencia está vacía, usamos el código del producto
     df.loc[df['referencia_erp'] == '', 'referencia_erp'] = df['codigo_producto_erp']
     
-    # --- 2. Creación de Mapas de Búsqueda desde las Dimensiones ---
-    print("INFO: Creando mapas de dimensiones para el enriquecimiento...")
-    mapa_productos = pd.read_sql("SELECT id_producto, codigo_erp, referencia, empresa_erp FROM dim_productos", conn)
-    mapa_clientes = pd.read_sql("SELECT id_cliente_empresa, cod_cliente_erp, empresa_erp FROM dim_clientes_empresa", conn)
-    mapa_roles = pd.read_sql("SELECT id_rol_historia, cod_rol_erp, empresa_erp, fecha_inicio_validez, fecha_fin_validez FROM dim_roles_comerciales_historia", conn)
-    
-    
-    ############## mapeo bodegas ###########
-    mapa_bodegas = pd.read_sql("SELECT id_bodega, cod_bodega_erp FROM dim_bodegas", conn)
-    ############# -------------  ###########
+    # --- 2. Mapas de Búsqueda con los mismos tipos compactos de las ventas ---
+    mapa_productos = _alinear_mapa(mapas['productos'], df, {'codigo_producto_erp': 'codigo_erp', 'referencia_erp': 'referencia', 'empresa_erp': 'empresa_erp'}, 'id_producto')
+    mapa_clientes = _alinear_mapa(mapas['clientes'], df, {'cod_cliente_erp': 'cod_cliente_erp', 'empresa_erp': 'empresa_erp'}, 'id_cliente_empresa')
+    mapa_bodegas = _alinear_mapa(mapas['bodegas'], df, {'bodega_erp': 'cod_bodega_erp'}, 'id_bodega')
     
     # --- 3. Enriquecimiento del DataFrame con los Foreign Keys (FKs) ---
     print("INFO: Uniendo ventas con dimensiones para obtener los IDs...")
@@ -131,20 +266,35 @@ def transformar_y_enriquecer_ventas(df_ventas, conn):
     df = pd.merge(df, mapa_bodegas, left_on='bodega_erp', right_on='cod_bodega_erp', how='left')
     df.rename(columns={'id_bodega': 'id_bodega_fk'}, inplace=True)
 
-    # Unimos con roles para obtener el id_rol_historia (este es el más complejo por las fechas)
-    df = pd.merge(df, mapa_roles, left_on=['cod_vendedor_erp', 'empresa_erp'], right_on=['cod_rol_erp', 'empresa_erp'], how='left')
-    # Después de unir, filtramos para quedarnos solo con el rol que estaba activo en la fecha de la venta
-    df['id_rol_historia_fk'] = df.apply(
-        lambda row: row['id_rol_historia'] if pd.notnull(row['id_rol_historia']) and row['fecha_inicio_validez'] <= row['fecha_sk'] <= row['fecha_fin_validez'] else None,
-        axis=1
-    )
+    # Rol del vendedor vigente en la fecha de la venta: búsqueda as-of vectorizada, sin multiplicar
+    # las líneas por cada vigencia del vendedor. Si ninguna estaba vigente, queda vacío (cuarentena).
+    versiones_roles = mapas['roles'].rename(columns={'cod_rol_erp': 'cod_vendedor_erp'})
+    df['id_rol_historia_fk'] = buscar_vigente(df, versiones_roles, ['cod_vendedor_erp', 'empresa_erp'], ['id_rol_historia'])['id_rol_historia']
+    df['cod_rol_erp'] = df['cod_vendedor_erp']
+
+    # Versión del producto vigente en la fecha de la venta (no es motivo de rechazo si falta)
+    df['id_producto_historia_fk'] = asignar_version_producto(df, mapas['historia_productos'])
+    # Clasificación comercial (canal/subcanal) del cliente vigente en la fecha de la venta (tampoco es motivo de rechazo)
+    df['id_clasificacion_historia_fk'] = asignar_clasificacion_cliente(df, mapas['clasificacion_clientes'])
 
     # --- 4. Preparación Final ---
-    # Eliminamos las filas que no pudieron ser enriquecidas (ej. una venta de un producto que no existe)
+    # Separamos las filas que no pudieron ser enriquecidas (ej. una venta de un producto que no existe)
     ############### SE AGREGA id_bodega_fk ###########
-    fks_a_validar = ['id_producto_fk', 'id_cliente_empresa_fk', 'id_rol_historia_fk', 'id_bodega_fk']
-    df_final = df.dropna(subset=fks_a_validar)
+    fks_a_validar = list(MOTIVOS_RECHAZO)
+    validas = df[fks_a_validar].notna().all(axis=1)
+    df_final = df[validas].astype({col: 'Int32' for col in COLUMNAS_FK})
     print(f"INFO: {len(df_final)} filas de ventas enriquecidas y válidas para la carga.")
+
+    # Las rechazadas van a cuarentena con las dimensiones que les faltaron
+    df_rechazadas = df[~validas].copy()
+    motivo = np.full(len(df_rechazadas), '', dtype=object)
+    for col, etiqueta in MOTIVOS_RECHAZO.items():
+        motivo = np.where(df_rechazadas[col].isna(), motivo + etiqueta + ',', motivo)
+    df_rechazadas['motivo_rechazo'] = pd.Series(motivo, index=df_rechazadas.index, dtype=object).str.rstrip(',')
+    df_rechazadas = df_rechazadas[COLUMNAS_CUARENTENA]
+    if not df_rechazadas.empty:
+        print(f"ADVERTENCIA: {len(df_rechazadas)} filas de ventas irán a cuarentena. Motivos: "
+              f"{df_rechazadas['motivo_rechazo'].value_counts().to_dict()}")
     
     # Seleccionamos y ordenamos las columnas finales para que coincidan con la tabla hechos_ventas
     columnas_hechos = [
@@ -153,44 +303,149 @@ def transformar_y_enriquecer_ventas(df_ventas, conn):
         'cantidad', 'valor_base','valor_descuento', 'valor_iva', 'valor_total',
         'costo_total', 'precio_lista', 'id_transaccion_erp', 'numero_factura_erp',
         'forma_pago_erp', 'id_bodega_fk', 'bodega_erp', 'lista_precio_erp',
-        'observaciones_erp', 'motivo_devolucion_erp', 'pedido_tiendapp'
+        'observaciones_erp', 'motivo_devolucion_erp', 'pedido_tiendapp', 'id_producto_historia_fk',
+        'id_clasificacion_historia_fk'
     ]
     
     # Aseguramos que solo seleccionamos las columnas que realmente existen en el DataFrame
     columnas_presentes = [col for col in columnas_hechos if col in df_final.columns]
     
-    return df_final[columnas_presentes]
+    return df_final[columnas_presentes], df_rechazadas
+
+def _a_tuplas(df):
+    """Filas del DataFrame como tuplas para execute_values (pd.NA -> None, que psycopg2 sí entiende)."""
+    df_para_carga = df.astype(object).where(df.notna(), None)
+    return [tuple(row) for row in df_para_carga.itertuples(index=False)]
+
+def verificar_indice_transaccion(cursor):
+    """
+    Falla si hechos_ventas no tiene el índice único (empresa_erp, id_transaccion_erp) que usan los
+    ON CONFLICT de la carga. Una base creada antes de ese índice lo recibe con sql/migracion_esquema.sql.
+    """
+    cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass('uq_hechos_ventas_transaccion');")
+    fila = cursor.fetchone()
+    if not fila or not fila[0]:
+        raise ValueError("hechos_ventas no tiene un índice único válido uq_hechos_ventas_transaccion (empresa_erp, "
+                         "id_transaccion_erp). Ejecuta sql/migracion_esquema.sql antes de cargar ventas.")
+
+# Las líneas que vuelven a llegar (misma empresa y DEKARDEXID) reemplazan a su versión anterior,
+# aunque esté fuera del rango borrado (la línea cambió de fecha) o siga en cuarentena. Retorna la
+# fecha de cada venta borrada, para recalcular también los resúmenes de esos días.
+QUERY_REEMPLAZAR_LINEAS = """
+    WITH entrantes (empresa_erp, id_transaccion_erp) AS ({entrantes}),
+    cuarentena AS (
+        DELETE FROM cuarentena_ventas c USING entrantes e
+        WHERE c.empresa_erp = e.empresa_erp AND c.id_transaccion_erp = e.id_transaccion_erp
+    )
+    DELETE FROM hechos_ventas h USING entrantes e
+    WHERE h.empresa_erp = e.empresa_erp AND h.id_transaccion_erp = e.id_transaccion_erp
+    RETURNING h.fecha_sk;
+"""
 
-def cargar_ventas_db(df_enriquecido, fecha_desde, fecha_hasta, conn):
+def insertar_hechos_ventas(cursor, df_enriquecido):
+    """
+    Inserta las líneas enriquecidas en hechos_ventas (sin confirmar la transacción). Una línea que
+    ya está cargada (misma empresa y DEKARDEXID, ej. fuera del rango borrado) se reemplaza por la
+    nueva, como en deduplicar_ventas. Retorna las líneas insertadas y los días de las reemplazadas.
+    """
+    verificar_indice_transaccion(cursor)
+    llaves = df_enriquecido[['empresa_erp', 'id_transaccion_erp']].dropna()
+    reemplazadas = extras.execute_values(
+        cursor, QUERY_REEMPLAZAR_LINEAS.format(entrantes='VALUES %s'),
+        [(e, int(i)) for e, i in llaves.itertuples(index=False)], page_size=1000, fetch=True)
+    dias_reemplazados = sorted({fila[0] for fila in reemplazadas})
+
+    columnas_db = list(df_enriquecido.columns)
+    datos_para_insertar = _a_tuplas(df_enriquecido)
+    columnas_sql = ', '.join(f'"{c}"' for c in columnas_db)
+    extras.execute_values(cursor, f"INSERT INTO hechos_ventas ({columnas_sql}) VALUES %s;", datos_para_insertar, page_size=1000)
+    if reemplazadas:
+        print(f"INFO: {len(reemplazadas)} líneas de ventas ya cargadas (ej. con otra fecha) se reemplazaron por su versión nueva.")
+    return len(datos_para_insertar), dias_reemplazados
+
+def guardar_en_cuarentena(cursor, df_rechazadas):
+    """
+    Guarda (o actualiza) las líneas rechazadas en cuarentena_ventas, sin confirmar la transacción.
+    Si la línea ya estaba, se actualiza el motivo y se cuenta un intento más.
+    """
+    df_rechazadas = df_rechazadas.dropna(subset=['id_transaccion_erp']).drop_duplicates(['empresa_erp', 'id_transaccion_erp'])
+    if df_rechazadas.empty:
+        return 0
+    columnas = list(df_rechazadas.columns)
+    update_sql = ", ".join(f"{c} = EXCLUDED.{c}" for c in columnas if c not in ('empresa_erp', 'id_transaccion_erp'))
+    query = f"""
+        INSERT INTO cuarentena_ventas ({", ".join(columnas)}) VALUES %s
+        ON CONFLICT (empresa_erp, id_transaccion_erp) DO UPDATE SET
+            {update_sql},
+            intentos = cuarentena_ventas.intentos + 1,
+            fecha_ultimo_intento = NOW();
+    """
+    datos = _a_tuplas(df_rechazadas)
+    extras.execute_values(cursor, query, datos, page_size=1000)
+    return len(datos)
+
+def verificar_rango_no_archivado(cursor, fecha_desde, fecha_hasta):
+    """
+    Falla si el rango toca meses archivados en frío (archivo_hechos_ventas). Sus ventas ya no están
+    en hechos_ventas: el DELETE del rango no las encontraría y el INSERT las volvería a cargar,
+    así que quedarían dos veces (en la BD y en el archivo).
+    """
+    cursor.execute("""
+        SELECT DISTINCT mes FROM archivo_hechos_ventas
+        WHERE mes BETWEEN date_trunc('month', %s::date) AND %s::date ORDER BY mes;
+    """, (fecha_desde, fecha_hasta))
+    archivados = [f"{fila[0]:%Y-%m}" for fila in cursor.fetchall()]
+    if archivados:
+        raise ValueError(f"El rango {fecha_desde} a {fecha_hasta} incluye meses archivados en frío {archivados}. "
+                         "Sus ventas no se recargan: quedarían duplicadas con las del archivo.")
+
+@instrumentar('ventas', 'carga')
+def cargar_ventas_db(df_enriquecido, fecha_desde, fecha_hasta, conn, empresa=None, df_rechazadas=None):
     """
     Paso 3: CARGA
-    Implementa la estrategia de 'Borrar y Cargar' para sincronizar los datos.
+    Implementa la estrategia de 'Borrar y Cargar' para sincronizar los datos, tanto en
+    hechos_ventas como en cuarentena_ventas (las líneas rechazadas del mismo periodo).
+    Con 'empresa' solo se reemplazan las ventas de esa empresa. Todo va en una sola transacción,
+    junto con el resumen de márgenes y las ventas diarias (ABC) del periodo.
     """
     print("\nINFO: Iniciando carga de ventas en la base de datos...")
-    if df_enriquecido is None or df_enriquecido.empty:
+    if df_rechazadas is None:
+        df_rechazadas = pd.DataFrame(columns=COLUMNAS_CUARENTENA)
+    if (df_enriquecido is None or df_enriquecido.empty) and df_rechazadas.empty:
         print("ADVERTENCIA: No hay datos de ventas para cargar.")
         return
 
     try:
-        # Paso 1: Borrar los datos existentes para el rango de fechas
-        delete_query = "DELETE FROM hechos_ventas WHERE fecha_sk BETWEEN %s AND %s;"
-        execute_query(conn, delete_query, params=(fecha_desde, fecha_hasta))
-        print(f"INFO: Registros de ventas eliminados para el período {fecha_desde} a {fecha_hasta}.")
-
-        # Paso 2: Cargar los nuevos datos
-        columnas_db = list(df_enriquecido.columns)
-        datos_para_insertar = [tuple(row) for row in df_enriquecido.itertuples(index=False)]
-        
-        query_insert = f"INSERT INTO hechos_ventas ({', '.join(f'\"{c}\"' for c in columnas_db)}) VALUES %s;"
-        #query_insert = f"INSERT INTO hechos_ventas ({', '.join(columnas_db)}) VALUES %s;"
-        
+        # Paso 1: Borrar los datos existentes para el rango de fechas (y la empresa, si se indicó)
+        params_delete = {'desde': fecha_desde, 'hasta': fecha_hasta, 'empresa': empresa}
         with conn.cursor() as cursor:
-            extras.execute_values(cursor, query_insert, datos_para_insertar, page_size=1000)
+            verificar_rango_no_archivado(cursor, fecha_desde, fecha_hasta)
+            cursor.execute("""
+                DELETE FROM hechos_ventas
+                WHERE fecha_sk BETWEEN %(desde)s AND %(hasta)s AND (%(empresa)s::text IS NULL OR empresa_erp = %(empresa)s);
+            """, params_delete)
+            print(f"INFO: {cursor.rowcount} registros de ventas {empresa or ''} eliminados para el período {fecha_desde} a {fecha_hasta}.")
+            # La cuarentena del mismo periodo también se reemplaza (las líneas vuelven a evaluarse hoy)
+            cursor.execute("""
+                DELETE FROM cuarentena_ventas
+                WHERE fecha_sk BETWEEN %(desde)s AND %(hasta)s AND (%(empresa)s::text IS NULL OR empresa_erp = %(empresa)s);
+            """, params_delete)
+
+            # Paso 2: Cargar los nuevos datos
+            insertadas, dias_reemplazados = 0, []
+            if df_enriquecido is not None and not df_enriquecido.empty:
+                insertadas, dias_reemplazados = insertar_hechos_ventas(cursor, df_enriquecido)
+            en_cuarentena = guardar_en_cuarentena(cursor, df_rechazadas)
+            # Los días de las líneas que cambiaron de fecha también cambian
+            refrescar_resumen_margenes(cursor, meses_entre(fecha_desde, fecha_hasta) + [d.replace(day=1) for d in dias_reemplazados], empresa)
+            refrescar_ventas_diarias(cursor, list(pd.date_range(fecha_desde, fecha_hasta).date) + dias_reemplazados, empresa)
             conn.commit()
-            print(f"¡ÉXITO! Se han insertado {cursor.rowcount} nuevos registros en 'hechos_ventas'.")
+            registrar_metricas(filas_afectadas_bd=insertadas + en_cuarentena)
+            print(f"¡ÉXITO! Se han insertado {insertadas} nuevos registros {empresa or ''} en 'hechos_ventas' y {en_cuarentena} en 'cuarentena_ventas'.")
 
     except Exception as e:
         print(f"ERROR CRÍTICO durante la carga de ventas: {e}")
+        registrar_error(e)
         conn.rollback() # Revertimos cualquier cambio si hay un error
 
 def ejecutar_etl_ventas():
@@ -203,18 +458,25 @@ def ejecutar_etl_ventas():
     fecha_fin_str = fecha_fin.strftime('%Y-%m-%d')
 
     # --- Orquestación del Proceso ---
-    # 1. Extraer
-    df_ventas_crudo = extraer_ventas_api(fecha_inicio_str, fecha_fin_str)
-
-    # 2. Transformar y Cargar (solo si la extracción fue exitosa)
-    if df_ventas_crudo is not None and not df_ventas_crudo.empty:
-        conn = get_db_connection()
-        if conn:
-            try:
-                df_ventas_enriquecido = transformar_y_enriquecer_ventas(df_ventas_crudo, conn)
-                cargar_ventas_db(df_ventas_enriquecido, fecha_inicio_str, fecha_fin_str, conn)
-            finally:
-                conn.close()
+    # Pipeline por empresa: mientras una empresa se carga, la siguiente se transforma y la otra
+    # se descarga. Transformación y carga usan conexiones separadas (corren en hilos distintos).
+    conn_lectura = get_db_connection()
+    conn_carga = get_db_connection()
+    if conn_lectura and conn_carga:
+        try:
+            ejecutar_pipeline(
+                'ventas', config.API_CONFIG_TNS,
+                extraer=lambda empresa: extraer_ventas_empresa(empresa, fecha_inicio_str, fecha_fin_str),
+                transformar=lambda empresa, df: transformar_y_enriquecer_ventas(df, conn_lectura),
+                cargar=lambda empresa, resultado: cargar_ventas_db(resultado[0], fecha_inicio_str, fecha_fin_str, conn_carga,
+                                                                   empresa=empresa['nombre_corto'], df_rechazadas=resultado[1]),
+            )
+        finally:
+            conn_lectura.close()
+            conn_carga.close()
+    else:
+        for conn in (conn_lectura, conn_carga):
+            if conn: conn.close()
     print("\n=== FIN DEL PROCESO ETL DE VENTAS ===")
 
 if __name__ == '__main__':
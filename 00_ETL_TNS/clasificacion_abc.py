@@ -0,0 +1,275 @@
+# 00_ETL_TNS/clasificacion_abc.py
+# Clasificación ABC (Pareto) de productos y clientes por venta neta y por utilidad en ventanas
+# móviles de 3, 6 y 12 meses.
+#
+# - ventas_diarias_entidad: venta neta y utilidad por día, empresa y entidad (producto o
+#   cliente_empresa). La carga de ventas la recalcula para los días que recarga.
+# - acumulado_abc: la suma de cada ventana a su fecha de corte. Avanzar el corte suma los días que
+#   entran y resta los que salen; los días recargados dentro de la ventana se ajustan por diferencia.
+# - dim_clasificacion_abc_historia: la clase de cada entidad con vigencia; solo cambia si cambia la clase.
+#
+#   python 00_ETL_TNS/clasificacion_abc.py                  # corte: ayer
+#   python 00_ETL_TNS/clasificacion_abc.py --reconstruir    # recalcula ventas_diarias_entidad desde hechos_ventas
+
+import os
+import sys
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_utils import get_db_connection, copiar_dataframe, leer_dataframe
+from instrumentacion import medir_etapa, registrar_metricas
+from historia_productos import FIN_VIGENCIA, construir_query_historia
+
+VENTANAS_MESES = (3, 6, 12)
+# Participación acumulada (antes de la entidad) por debajo de la cual es A o B; el resto es C
+UMBRAL_A = 0.80
+UMBRAL_B = 0.95
+
+# --- Agregado diario ---
+# Las filas anteriores y las nuevas de los días recargados quedan en tmp_cambios_diarios con
+# signo opuesto: su suma por día y entidad es la diferencia que se aplica a los acumulados.
+QUERY_DIARIAS_BORRAR = """
+    WITH anteriores AS (
+        DELETE FROM ventas_diarias_entidad
+        WHERE fecha_sk = ANY(%(dias)s) AND (%(empresa)s::text IS NULL OR empresa_erp = %(empresa)s)
+        RETURNING fecha_sk, tipo_entidad, id_entidad, valor_neto, utilidad
+    )
+    INSERT INTO tmp_cambios_diarios SELECT fecha_sk, tipo_entidad, id_entidad, -valor_neto, -utilidad FROM anteriores;
+"""
+
+QUERY_DIARIAS_INSERTAR = """
+    WITH nuevas AS (
+        INSERT INTO ventas_diarias_entidad (fecha_sk, empresa_erp, tipo_entidad, id_entidad, lineas, facturas, valor_neto, utilidad)
+        SELECT v.fecha_sk, v.empresa_erp, e.tipo_entidad, e.id_entidad,
+               COUNT(*), COUNT(DISTINCT v.numero_factura_erp),
+               SUM(v.valor_base - COALESCE(v.valor_descuento, 0)),
+               COALESCE(SUM(v.valor_base - COALESCE(v.valor_descuento, 0) - v.costo_total), 0)
+        FROM hechos_ventas v
+        CROSS JOIN LATERAL (VALUES ('producto', v.id_producto_fk), ('cliente', v.id_cliente_empresa_fk)) AS e(tipo_entidad, id_entidad)
+        WHERE v.fecha_sk = ANY(%(dias)s) AND (%(empresa)s::text IS NULL OR v.empresa_erp = %(empresa)s)
+        GROUP BY 1, 2, 3, 4
+        RETURNING fecha_sk, tipo_entidad, id_entidad, valor_neto, utilidad
+    )
+    INSERT INTO tmp_cambios_diarios SELECT * FROM nuevas;
+"""
+
+# Solo los días que caen dentro de la ventana vigente de cada acumulado: (corte - N meses, corte]
+QUERY_AJUSTAR_ACUMULADOS = """
+    INSERT INTO acumulado_abc (ventana_meses, tipo_entidad, id_entidad, valor_neto, utilidad)
+    SELECT k.ventana_meses, c.tipo_entidad, c.id_entidad, SUM(c.valor_neto), SUM(c.utilidad)
+    FROM tmp_cambios_diarios c
+    JOIN control_abc k ON c.fecha_sk <= k.fecha_corte
+                      AND c.fecha_sk > (k.fecha_corte - make_interval(months => k.ventana_meses))::date
+    GROUP BY 1, 2, 3
+    ON CONFLICT (ventana_meses, tipo_entidad, id_entidad) DO UPDATE SET
+        valor_neto = acumulado_abc.valor_neto + EXCLUDED.valor_neto,
+        utilidad = acumulado_abc.utilidad + EXCLUDED.utilidad;
+"""
+
+# --- Acumulados por ventana ---
+_INICIO_VENTANA = "(%(corte)s::date - make_interval(months => %(meses)s))::date"
+_INICIO_VENTANA_ANTERIOR = "(%(corte_anterior)s::date - make_interval(months => %(meses)s))::date"
+
+QUERY_ACUMULADO_COMPLETO = f"""
+    INSERT INTO acumulado_abc (ventana_meses, tipo_entidad, id_entidad, valor_neto, utilidad)
+    SELECT %(meses)s, tipo_entidad, id_entidad, SUM(valor_neto), SUM(utilidad)
+    FROM ventas_diarias_entidad
+    WHERE fecha_sk > {_INICIO_VENTANA} AND fecha_sk <= %(corte)s
+    GROUP BY 2, 3;
+"""
+
+# Suma los días que entran, (corte anterior, corte], y resta los que salen por el inicio de la ventana
+QUERY_ACUMULADO_AVANCE = f"""
+    INSERT INTO acumulado_abc (ventana_meses, tipo_entidad, id_entidad, valor_neto, utilidad)
+    SELECT %(meses)s, tipo_entidad, id_entidad,
+           SUM(CASE WHEN fecha_sk > %(corte_anterior)s THEN valor_neto ELSE -valor_neto END),
+           SUM(CASE WHEN fecha_sk > %(corte_anterior)s THEN utilidad ELSE -utilidad END)
+    FROM ventas_diarias_entidad
+    WHERE (fecha_sk > %(corte_anterior)s AND fecha_sk <= %(corte)s)
+       OR (fecha_sk > {_INICIO_VENTANA_ANTERIOR} AND fecha_sk <= {_INICIO_VENTANA})
+    GROUP BY 2, 3
+    ON CONFLICT (ventana_meses, tipo_entidad, id_entidad) DO UPDATE SET
+        valor_neto = acumulado_abc.valor_neto + EXCLUDED.valor_neto,
+        utilidad = acumulado_abc.utilidad + EXCLUDED.utilidad;
+"""
+
+# Entidades que se clasifican: productos por empresa; clientes por su maestro (o por sí mismos si
+# todavía no tienen maestro), compitiendo entre las tres empresas.
+QUERY_ENTIDADES = """
+    SELECT a.ventana_meses,
+           CASE WHEN a.tipo_entidad = 'producto' THEN 'producto'
+                WHEN c.id_maestro_cliente_fk IS NOT NULL THEN 'maestro' ELSE 'cliente_empresa' END AS tipo_entidad,
+           CASE WHEN a.tipo_entidad = 'producto' THEN a.id_entidad
+                ELSE COALESCE(c.id_maestro_cliente_fk, a.id_entidad) END AS id_entidad,
+           CASE WHEN a.tipo_entidad = 'producto' THEN p.empresa_erp ELSE 'CLIENTES' END AS grupo,
+           SUM(a.valor_neto)::float8 AS valor_neto, SUM(a.utilidad)::float8 AS utilidad
+    FROM acumulado_abc a
+    LEFT JOIN dim_productos p ON a.tipo_entidad = 'producto' AND p.id_producto = a.id_entidad
+    LEFT JOIN dim_clientes_empresa c ON a.tipo_entidad = 'cliente' AND c.id_cliente_empresa = a.id_entidad
+    GROUP BY 1, 2, 3, 4;
+"""
+
+COLUMNAS_CLASES = ['tipo_entidad', 'id_entidad', 'ventana_meses', 'clase_venta', 'clase_utilidad']
+
+# La clasificación es completa: una entidad que ya no tiene ventas en la ventana cierra su versión vigente
+QUERY_HISTORIA_ABC = construir_query_historia(
+    'dim_clasificacion_abc_historia', 'id_clasificacion_abc', ['tipo_entidad', 'id_entidad', 'ventana_meses'],
+    ['clase_venta', 'clase_utilidad'],
+    entrantes="SELECT * FROM tmp_clases_abc",
+)
+
+
+def refrescar_ventas_diarias(cursor, dias, empresa=None):
+    """
+    Recalcula ventas_diarias_entidad para esos días (y esa empresa, si se indica) y aplica la
+    diferencia a los acumulados ABC cuya ventana los contiene. No confirma la transacción: se llama
+    dentro de la carga que cambió las ventas. Los meses archivados en frío no se tocan.
+    Retorna las filas diarias escritas.
+    """
+    dias = sorted(set(dias))
+    if not dias:
+        return 0
+    with medir_etapa('ventas', 'ventas_diarias', en_transaccion=True):
+        cursor.execute("SELECT mes FROM archivo_hechos_ventas WHERE mes = ANY(%s);",
+                       (sorted({d.replace(day=1) for d in dias}),))
+        archivados = {fila[0] for fila in cursor.fetchall()}
+        dias = [d for d in dias if d.replace(day=1) not in archivados]
+        if not dias:
+            return 0
+
+        params = {'dias': dias, 'empresa': empresa}
+        cursor.execute("""
+            CREATE TEMP TABLE tmp_cambios_diarios (
+                fecha_sk DATE, tipo_entidad VARCHAR(20), id_entidad INT, valor_neto NUMERIC, utilidad NUMERIC
+            ) ON COMMIT DROP;
+        """)
+        cursor.execute(QUERY_DIARIAS_BORRAR, params)
+        cursor.execute(QUERY_DIARIAS_INSERTAR, params)
+        escritas = cursor.rowcount
+        cursor.execute(QUERY_AJUSTAR_ACUMULADOS)
+        cursor.execute("DROP TABLE tmp_cambios_diarios;")
+        registrar_metricas(filas_afectadas_bd=escritas)
+    return escritas
+
+
+def _avanzar_acumulado(cursor, meses, corte):
+    """Lleva el acumulado de la ventana hasta `corte`: por diferencia si es posible, completo si no."""
+    cursor.execute("SELECT fecha_corte FROM control_abc WHERE ventana_meses = %s;", (meses,))
+    fila = cursor.fetchone()
+    corte_anterior = fila[0] if fila else None
+    params = {'meses': meses, 'corte': corte, 'corte_anterior': corte_anterior}
+    inicio_ventana = (pd.Timestamp(corte) - pd.DateOffset(months=meses)).date()
+
+    if corte_anterior == corte:
+        modo = 'sin cambios'
+    elif corte_anterior is None or corte < corte_anterior or inicio_ventana >= corte_anterior:
+        # Sin corte previo, hacia atrás o con una ventana que ya no se solapa: se suma completa
+        cursor.execute("DELETE FROM acumulado_abc WHERE ventana_meses = %s;", (meses,))
+        cursor.execute(QUERY_ACUMULADO_COMPLETO, params)
+        modo = 'completo'
+    else:
+        cursor.execute(QUERY_ACUMULADO_AVANCE, params)
+        modo = 'por diferencia'
+    # Las entidades que salieron de la ventana quedan en cero
+    cursor.execute("DELETE FROM acumulado_abc WHERE ventana_meses = %s AND valor_neto = 0 AND utilidad = 0;", (meses,))
+    cursor.execute("""
+        INSERT INTO control_abc (ventana_meses, fecha_corte) VALUES (%s, %s)
+        ON CONFLICT (ventana_meses) DO UPDATE SET fecha_corte = EXCLUDED.fecha_corte;
+    """, (meses, corte))
+    print(f"INFO: Acumulado de {meses} meses al {corte}: {modo}.")
+
+
+def asignar_clases(df, columna, grupos):
+    """
+    Clase ABC de cada fila según la participación acumulada de `columna` dentro de sus `grupos`,
+    con sumas acumuladas vectorizadas. Los valores negativos o cero son C.
+    """
+    # astype: si no hay entidades, la consulta vacía llega con tipo object
+    positivo = df[columna].astype('float64').clip(lower=0)
+    ordenado = df.assign(_valor=positivo).sort_values(grupos + ['_valor', 'id_entidad'],
+                                                      ascending=[True] * len(grupos) + [False, True])
+    por_grupo = ordenado.groupby(grupos, sort=False)['_valor']
+    total = por_grupo.transform('sum')
+    # Participación acumulada de las entidades anteriores: la que cruza el umbral todavía es A
+    previo = (por_grupo.cumsum() - ordenado['_valor']) / total.where(total > 0)
+    clase = np.select(
+        [ordenado['_valor'].to_numpy() <= 0, (previo < UMBRAL_A).to_numpy(), (previo < UMBRAL_B).to_numpy()],
+        ['C', 'A', 'B'], default='C')
+    return pd.Series(clase, index=ordenado.index).reindex(df.index)
+
+
+def actualizar_clasificacion_abc(fecha_corte=None):
+    """
+    Avanza los acumulados de cada ventana hasta la fecha de corte (por defecto ayer), clasifica
+    productos y clientes y registra en la historia solo las clases que cambiaron.
+    """
+    print("=== INICIO DE LA CLASIFICACIÓN ABC ===")
+    corte = fecha_corte or date.today() - timedelta(days=1)
+    conn = get_db_connection()
+    if not conn: return
+
+    try:
+        with medir_etapa('clasificacion_abc', 'clasificacion') as etapa:
+            with conn.cursor() as cursor:
+                for meses in VENTANAS_MESES:
+                    _avanzar_acumulado(cursor, meses, corte)
+
+            entidades = leer_dataframe(conn, QUERY_ENTIDADES)
+            etapa['filas_entrada'] = len(entidades)
+            entidades['clase_venta'] = asignar_clases(entidades, 'valor_neto', ['ventana_meses', 'grupo'])
+            entidades['clase_utilidad'] = asignar_clases(entidades, 'utilidad', ['ventana_meses', 'grupo'])
+
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TEMP TABLE tmp_clases_abc (
+                        tipo_entidad VARCHAR(20), id_entidad INT, ventana_meses SMALLINT, clase_venta CHAR(1), clase_utilidad CHAR(1)
+                    ) ON COMMIT DROP;
+                """)
+                copiar_dataframe(conn, 'tmp_clases_abc', entidades, COLUMNAS_CLASES)
+                cursor.execute(QUERY_HISTORIA_ABC, {'hoy': corte, 'fin': FIN_VIGENCIA})
+                abiertas, cerradas, corregidas = cursor.fetchone()
+            conn.commit()
+            registrar_metricas(filas_afectadas_bd=abiertas + cerradas + corregidas)
+            etapa['filas_salida'] = len(entidades)
+
+        resumen = entidades.groupby(['ventana_meses', 'tipo_entidad', 'clase_venta']).size().unstack(fill_value=0)
+        print(f"INFO: Entidades por clase de venta:\n{resumen.to_string()}")
+        print(f"\n¡ÉXITO! Clasificación ABC al {corte}: {abiertas} versiones nuevas, {cerradas} cerradas y {corregidas} corregidas del mismo día.")
+
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante la clasificación ABC: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def reconstruir_ventas_diarias():
+    """Recalcula ventas_diarias_entidad con todos los días en línea de hechos_ventas (una sola pasada)."""
+    print("=== RECONSTRUCCIÓN DE LAS VENTAS DIARIAS POR ENTIDAD ===")
+    conn = get_db_connection()
+    if not conn: return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT fecha_sk FROM hechos_ventas;")
+            dias = [fila[0] for fila in cursor.fetchall()]
+            escritas = refrescar_ventas_diarias(cursor, dias)
+        conn.commit()
+        print(f"\n¡ÉXITO! {escritas} filas diarias recalculadas para {len(dias)} días.")
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante la reconstrucción de las ventas diarias: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Clasificación ABC de productos y clientes en ventanas móviles.')
+    parser.add_argument('--corte', type=date.fromisoformat, help='Fecha de corte (AAAA-MM-DD). Por defecto, ayer.')
+    parser.add_argument('--reconstruir', action='store_true', help='Recalcula primero ventas_diarias_entidad desde hechos_ventas.')
+    args = parser.parse_args()
+    if args.reconstruir:
+        reconstruir_ventas_diarias()
+    actualizar_clasificacion_abc(args.corte)
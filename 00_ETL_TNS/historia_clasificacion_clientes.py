@@ -0,0 +1,71 @@
+# 00_ETL_TNS/historia_clasificacion_clientes.py
+# Clasificación comercial (canal, subcanal, sucursal, día de visita) vigente en la fecha de cada venta.
+# El ETL de ventas la resuelve al cargar y la guarda en hechos_ventas.id_clasificacion_historia_fk,
+# así los reportes por canal son un simple JOIN por llave y no un cruce por rango de fechas.
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from instrumentacion import medir_etapa, registrar_metricas
+from historia_productos import buscar_vigente
+
+# Recalcula la clasificación de las ventas ya cargadas de esos maestros (o de todos) con la historia
+# actual. Si dos versiones se solapan gana la que empezó más tarde, igual que en buscar_vigente().
+# Solo se escriben las líneas cuya clasificación cambia.
+QUERY_REASIGNAR = """
+    UPDATE hechos_ventas v SET id_clasificacion_historia_fk = n.id_clasificacion_historia
+    FROM (
+        SELECT DISTINCT ON (v.id_venta) v.id_venta, ch.id_clasificacion_historia
+        FROM hechos_ventas v
+        JOIN dim_clientes_empresa c ON c.id_cliente_empresa = v.id_cliente_empresa_fk
+        LEFT JOIN dim_clientes_clasificacion_historia ch
+          ON ch.id_maestro_cliente_fk = c.id_maestro_cliente_fk
+         AND v.fecha_sk BETWEEN ch.fecha_inicio_validez AND ch.fecha_fin_validez
+         AND ch.id_clasificacion_historia <> ALL(%(excluir)s::int[])
+        WHERE %(maestros)s::int[] IS NULL OR c.id_maestro_cliente_fk = ANY(%(maestros)s::int[])
+        ORDER BY v.id_venta, ch.fecha_inicio_validez DESC NULLS LAST
+    ) n
+    WHERE v.id_venta = n.id_venta AND v.id_clasificacion_historia_fk IS DISTINCT FROM n.id_clasificacion_historia;
+"""
+
+
+def mapa_clasificacion_clientes(conn, empresas):
+    """Versiones de clasificación de los clientes de esas empresas (por su maestro), para asignar_clasificacion_cliente()."""
+    return pd.read_sql("""
+        SELECT c.id_cliente_empresa AS id_cliente_empresa_fk, ch.id_clasificacion_historia,
+               ch.fecha_inicio_validez, ch.fecha_fin_validez
+        FROM dim_clientes_empresa c
+        JOIN dim_clientes_clasificacion_historia ch ON ch.id_maestro_cliente_fk = c.id_maestro_cliente_fk
+        WHERE c.empresa_erp = ANY(%s);
+    """, conn, params=(list(empresas),))
+
+
+def asignar_clasificacion_cliente(df, mapa):
+    """
+    Para cada fila (id_cliente_empresa_fk, fecha_sk) devuelve el id_clasificacion_historia vigente
+    en esa fecha (Int32, alineado con df.index; nulo si el cliente no tiene maestro o clasificación).
+    """
+    vigentes = buscar_vigente(df, mapa, ['id_cliente_empresa_fk'], ['id_clasificacion_historia'])
+    return vigentes['id_clasificacion_historia'].astype('Int32')
+
+
+def reasignar_clasificacion_ventas(cursor, maestros=None, excluir=()):
+    """
+    Vuelve a resolver la clasificación de las ventas ya cargadas de `maestros` (todos si es None),
+    ignorando las versiones de `excluir` (las que se van a borrar). Se usa cuando cambia la historia
+    o el enlace cliente-maestro. No confirma la transacción. Retorna las líneas actualizadas.
+    """
+    if maestros is not None and len(maestros) == 0:
+        return 0
+    with medir_etapa('clasificacion_clientes', 'reasignacion_ventas', en_transaccion=True):
+        cursor.execute(QUERY_REASIGNAR, {
+            'maestros': None if maestros is None else [int(m) for m in maestros],
+            'excluir': [int(i) for i in excluir],
+        })
+        actualizadas = cursor.rowcount
+        registrar_metricas(filas_afectadas_bd=actualizadas)
+    print(f"INFO: Clasificación de clientes recalculada en {actualizadas} líneas de ventas.")
+    return actualizadas
@@ -0,0 +1,148 @@
+# 00_ETL_TNS/historia_precios.py
+# Historia de precios por lista (Items de Material/Listar: OCODLISTA / OPRECIO). Solo se guarda una
+# fila cuando el precio de un producto en una lista cambia, con su vigencia (desde / hasta).
+
+import os
+import sys
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+from db_utils import get_db_connection, copiar_dataframe, leer_dataframe
+from instrumentacion import instrumentar, registrar_metricas, registrar_error
+from historia_productos import FIN_VIGENCIA, buscar_vigente, construir_query_historia
+
+COLUMNAS_PRECIOS = ['codigo_erp', 'referencia', 'empresa_erp', 'cod_lista_erp', 'precio']
+
+# Los precios recibidos contra los vigentes de los mismos productos: una lista que desaparece del
+# producto cierra su versión.
+QUERY_PRECIOS = construir_query_historia(
+    'dim_precios_lista_historia', 'id_precio_historia', ['id_producto_fk', 'cod_lista_erp'], ['precio'],
+    entrantes="""
+        SELECT p.id_producto AS id_producto_fk, t.cod_lista_erp, t.precio
+        FROM tmp_precios_lista t
+        JOIN dim_productos p ON p.codigo_erp = t.codigo_erp AND p.referencia = t.referencia AND p.empresa_erp = t.empresa_erp
+    """,
+    alcance="""h.id_producto_fk IN (
+        SELECT p.id_producto FROM dim_productos p
+        JOIN unnest(%(codigos)s::text[], %(referencias)s::text[], %(empresas)s::text[]) AS e(codigo_erp, referencia, empresa_erp)
+          ON e.codigo_erp = p.codigo_erp AND e.referencia = p.referencia AND e.empresa_erp = p.empresa_erp
+    )""",
+)
+
+
+def aplanar_precios(df_productos, columna_items='items_precios'):
+    """
+    Un precio por fila (producto, empresa, lista) a partir del arreglo Items de cada producto,
+    con un solo explode. Se descartan precios no numéricos y, si una lista se repite, queda la última.
+    """
+    items = df_productos[['codigo_erp', 'referencia', 'empresa_erp', columna_items]].explode(columna_items, ignore_index=True)
+    items = items.dropna(subset=[columna_items])
+    detalle = pd.DataFrame.from_records(items[columna_items].tolist(), columns=['OCODLISTA', 'OPRECIO'])
+    precios = pd.DataFrame({
+        'codigo_erp': items['codigo_erp'].to_numpy(),
+        'referencia': items['referencia'].to_numpy(),
+        'empresa_erp': items['empresa_erp'].to_numpy(),
+        'cod_lista_erp': detalle['OCODLISTA'].astype('string').str.strip().to_numpy(),
+        'precio': pd.to_numeric(detalle['OPRECIO'], errors='coerce').to_numpy(),
+    })
+    precios = precios.dropna(subset=['cod_lista_erp', 'precio'])
+    precios = precios[precios['cod_lista_erp'] != '']
+    return precios.drop_duplicates(subset=['codigo_erp', 'referencia', 'empresa_erp', 'cod_lista_erp'], keep='last')
+
+
+@instrumentar('productos', 'precios')
+def actualizar_historia_precios(conn, df_productos, fecha=None):
+    """
+    Registra los cambios de precio de los productos recién cargados (df_productos, ya transformado y
+    con la columna items_precios). Solo escribe las listas cuyo precio cambió, apareció o desapareció.
+    Retorna las versiones nuevas, o None si falla.
+    """
+    if df_productos is None or df_productos.empty or 'items_precios' not in df_productos.columns:
+        return 0
+    precios = aplanar_precios(df_productos)
+    params = {
+        'codigos': df_productos['codigo_erp'].astype(str).tolist(),
+        'referencias': df_productos['referencia'].astype(str).tolist(),
+        'empresas': df_productos['empresa_erp'].astype(str).tolist(),
+        'hoy': fecha or date.today(), 'fin': FIN_VIGENCIA,
+    }
+    try:
+        with conn.cursor() as cursor:
+            # Con la misma precisión de la tabla, para no ver como "cambio" un simple redondeo
+            cursor.execute("""
+                CREATE TEMP TABLE tmp_precios_lista (
+                    codigo_erp TEXT, referencia TEXT, empresa_erp TEXT, cod_lista_erp TEXT, precio NUMERIC(18, 4)
+                ) ON COMMIT DROP;
+            """)
+            copiar_dataframe(conn, 'tmp_precios_lista', precios, COLUMNAS_PRECIOS)
+            cursor.execute(QUERY_PRECIOS, params)
+            abiertas, cerradas, corregidas = cursor.fetchone()
+        conn.commit()
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante la actualización de la historia de precios: {e}")
+        registrar_error(e)
+        conn.rollback()
+        return None
+    registrar_metricas(filas_entrada=len(precios), filas_afectadas_bd=abiertas + cerradas + corregidas)
+    print(f"INFO: Historia de precios ({len(precios)} precios recibidos): {abiertas} versiones nuevas, "
+          f"{cerradas} cerradas y {corregidas} corregidas del mismo día.")
+    return abiertas
+
+
+def mapa_precios_lista(conn, empresas):
+    """Versiones de precio de los productos de esas empresas, para precio_lista_vigente()."""
+    return pd.read_sql("""
+        SELECT h.id_producto_fk, h.cod_lista_erp, h.precio, h.fecha_inicio_validez, h.fecha_fin_validez
+        FROM dim_precios_lista_historia h JOIN dim_productos p ON p.id_producto = h.id_producto_fk
+        WHERE p.empresa_erp = ANY(%s);
+    """, conn, params=(list(empresas),))
+
+
+def precio_lista_vigente(df, mapa, columna_lista='lista_precio_erp', columna_fecha='fecha_sk'):
+    """
+    Búsqueda as-of: precio oficial de cada fila (id_producto_fk, lista, fecha) según la historia.
+    Retorna una Serie float alineada con df.index (NaN si no había precio vigente).
+    """
+    versiones = mapa.rename(columns={'cod_lista_erp': columna_lista})
+    vigentes = buscar_vigente(df, versiones, ['id_producto_fk', columna_lista], ['precio'], columna_fecha)
+    return pd.to_numeric(vigentes['precio'], errors='coerce').astype('float64')
+
+
+def comparar_precios_ventas(fecha_desde, fecha_hasta, tolerancia_pct=0.5):
+    """
+    Compara el precio_lista de las ventas del periodo con el precio oficial vigente en su fecha y
+    guarda en informes_generados/ las líneas que se apartan más de `tolerancia_pct` % o no tienen
+    precio oficial. Retorna el DataFrame de diferencias.
+    """
+    print("=== COMPARACIÓN DE PRECIOS DE VENTA CONTRA LA LISTA OFICIAL ===")
+    conn = get_db_connection()
+    if not conn: return None
+    try:
+        ventas = leer_dataframe(conn, """
+            SELECT id_venta, fecha_sk, empresa_erp, id_producto_fk, codigo_producto_erp, numero_factura_erp,
+                   lista_precio_erp, precio_lista::float8 AS precio_lista
+            FROM hechos_ventas WHERE fecha_sk BETWEEN %s AND %s AND lista_precio_erp IS NOT NULL;
+        """, (fecha_desde, fecha_hasta))
+        if ventas.empty:
+            print("INFO: No hay ventas con lista de precio en el periodo.")
+            return ventas
+        ventas['precio_oficial'] = precio_lista_vigente(ventas, mapa_precios_lista(conn, ventas['empresa_erp'].unique()))
+    finally:
+        conn.close()
+
+    ventas['diferencia'] = ventas['precio_lista'] - ventas['precio_oficial']
+    ventas['diferencia_%'] = (ventas['diferencia'] / ventas['precio_oficial'] * 100).round(2)
+    diferencias = ventas[ventas['precio_oficial'].isna() | (ventas['diferencia_%'].abs() > tolerancia_pct)]
+    print(f"INFO: {len(diferencias)} de {len(ventas)} líneas difieren de la lista oficial (o no tienen precio oficial).")
+    if not diferencias.empty:
+        ruta = os.path.join(config.INFORMES_GENERADOS_DIR, 'diferencias_precio_lista.csv')
+        diferencias.to_csv(ruta, index=False, encoding='utf-8-sig')
+        print(f"¡ÉXITO! Reporte guardado en '{ruta}'.")
+    return diferencias
+
+if __name__ == '__main__':
+    hoy = date.today()
+    comparar_precios_ventas(hoy - timedelta(days=30), hoy)
@@ -0,0 +1,184 @@
+# 00_ETL_TNS/historia_productos.py
+# Historia (SCD Tipo 2) de los atributos y costos de dim_productos. dim_productos guarda solo el
+# valor actual; aquí queda cada versión con su vigencia, para analizar márgenes y categorías con
+# los valores que tenía el producto en la fecha de la venta.
+
+import os
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from instrumentacion import instrumentar, registrar_metricas, registrar_error
+
+# Atributos versionados: un cambio en cualquiera abre una versión nueva
+ATRIBUTOS_HISTORIA = [
+    'descripcion_erp', 'cod_grupo_erp', 'cod_linea_erp', 'cod_dpto_sku_erp', 'cod_marca_erp',
+    'costo_promedio_erp', 'costo_ult_erp',
+]
+# La primera versión de un producto cubre también las ventas anteriores a su primera carga
+INICIO_HISTORIA = date(1900, 1, 1)
+FIN_VIGENCIA = date(9999, 12, 31)
+
+
+def construir_query_historia(tabla, id_historia, llaves, columnas, entrantes, comparar=None, alcance='TRUE',
+                             inicio_primera='%(hoy)s'):
+    """
+    Sentencia única de una historia SCD Tipo 2 (`tabla`, con fecha_inicio_validez/fecha_fin_validez):
+    compara `entrantes` (un SELECT con `llaves` y `columnas`) con las versiones vigentes dentro de
+    `alcance` (condición sobre h), cierra las que cambiaron o ya no llegan y abre las nuevas. Solo
+    abre versión si cambia alguna de `comparar` (por defecto, todas las columnas). Una versión abierta
+    hoy mismo se corrige (o se elimina) en su lugar, porque la vigencia es por día. La primera versión
+    de una llave empieza en `inicio_primera`. Parámetros: %(hoy)s y %(fin)s (más los de entrantes).
+    Retorna una fila: (abiertas, cerradas, corregidas + eliminadas).
+    """
+    comparar = comparar or columnas
+    return f"""
+        WITH entrantes AS ({entrantes}),
+        vigentes AS (
+            SELECT * FROM {tabla} h WHERE h.fecha_fin_validez = %(fin)s AND {alcance}
+        ),
+        cambios AS (
+            SELECT {", ".join(f"COALESCE(e.{c}, v.{c}) AS {c}" for c in llaves)}, {", ".join(f"e.{c}" for c in columnas)},
+                   e.{llaves[0]} IS NOT NULL AS presente, v.{id_historia} AS id_vigente, v.fecha_inicio_validez AS inicio_vigente
+            FROM entrantes e
+            FULL JOIN vigentes v ON {" AND ".join(f"v.{c} = e.{c}" for c in llaves)}
+            WHERE ({", ".join(f"v.{c}" for c in comparar)}) IS DISTINCT FROM ({", ".join(f"e.{c}" for c in comparar)})
+        ),
+        cerradas AS (
+            UPDATE {tabla} h SET fecha_fin_validez = %(hoy)s::date - 1
+            FROM cambios c
+            WHERE h.{id_historia} = c.id_vigente AND c.inicio_vigente < %(hoy)s
+            RETURNING 1
+        ),
+        corregidas AS (
+            UPDATE {tabla} h SET {", ".join(f"{c} = c.{c}" for c in columnas)}
+            FROM cambios c
+            WHERE h.{id_historia} = c.id_vigente AND c.inicio_vigente >= %(hoy)s AND c.presente
+            RETURNING 1
+        ),
+        eliminadas AS (
+            DELETE FROM {tabla} h
+            USING cambios c
+            WHERE h.{id_historia} = c.id_vigente AND c.inicio_vigente >= %(hoy)s AND NOT c.presente
+            RETURNING 1
+        ),
+        abiertas AS (
+            INSERT INTO {tabla} ({", ".join(llaves + columnas)}, fecha_inicio_validez, fecha_fin_validez)
+            SELECT {", ".join(f"c.{c}" for c in llaves + columnas)},
+                   CASE WHEN c.inicio_vigente IS NULL THEN {inicio_primera} ELSE %(hoy)s END, %(fin)s
+            FROM cambios c
+            WHERE c.presente AND (c.inicio_vigente IS NULL OR c.inicio_vigente < %(hoy)s)
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM abiertas), (SELECT COUNT(*) FROM cerradas),
+               (SELECT COUNT(*) FROM corregidas) + (SELECT COUNT(*) FROM eliminadas);
+    """
+
+
+# Los productos recién cargados y los que aún no tienen historia, con la huella de sus atributos:
+# solo se abre versión si cambia la huella.
+QUERY_SCD2 = construir_query_historia(
+    'dim_productos_historia', 'id_producto_historia', ['id_producto_fk'], ATRIBUTOS_HISTORIA + ['huella_atributos'],
+    entrantes=f"""
+        SELECT p.id_producto AS id_producto_fk, {", ".join(f"p.{a}" for a in ATRIBUTOS_HISTORIA)},
+               md5(ROW({", ".join(f"p.{a}" for a in ATRIBUTOS_HISTORIA)})::text) AS huella_atributos
+        FROM dim_productos p
+        WHERE EXISTS (SELECT 1 FROM unnest(%(codigos)s::text[], %(referencias)s::text[], %(empresas)s::text[])
+                                 AS e(codigo_erp, referencia, empresa_erp)
+                      WHERE e.codigo_erp = p.codigo_erp AND e.referencia = p.referencia AND e.empresa_erp = p.empresa_erp)
+           OR NOT EXISTS (SELECT 1 FROM dim_productos_historia h WHERE h.id_producto_fk = p.id_producto)
+    """,
+    comparar=['huella_atributos'],
+    alcance='h.id_producto_fk IN (SELECT id_producto_fk FROM entrantes)',
+    inicio_primera='%(inicio)s',
+)
+
+
+@instrumentar('productos', 'historia')
+def actualizar_historia_productos(conn, df_productos, fecha=None):
+    """
+    Mantiene dim_productos_historia para los productos recién cargados (df_productos, con
+    codigo_erp/referencia/empresa_erp) y para los que aún no tienen historia. Solo escribe
+    los productos cuyos atributos cambiaron. Retorna las versiones nuevas, o None si falla.
+    """
+    if df_productos is None or df_productos.empty:
+        return 0
+    params = {
+        'codigos': df_productos['codigo_erp'].astype(str).tolist(),
+        'referencias': df_productos['referencia'].astype(str).tolist(),
+        'empresas': df_productos['empresa_erp'].astype(str).tolist(),
+        'hoy': fecha or date.today(), 'inicio': INICIO_HISTORIA, 'fin': FIN_VIGENCIA,
+    }
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(QUERY_SCD2, params)
+            abiertas, cerradas, corregidas = cursor.fetchone()
+        conn.commit()
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante la actualización de la historia de productos: {e}")
+        registrar_error(e)
+        conn.rollback()
+        return None
+    registrar_metricas(filas_afectadas_bd=abiertas + cerradas + corregidas)
+    print(f"INFO: Historia de productos: {abiertas} versiones nuevas, {cerradas} cerradas y {corregidas} corregidas del mismo día.")
+    return abiertas
+
+
+def mapa_historia_productos(conn, empresas):
+    """Versiones de los productos de esas empresas, para asignar_version_producto()."""
+    return pd.read_sql("""
+        SELECT h.id_producto_historia, h.id_producto_fk, h.fecha_inicio_validez, h.fecha_fin_validez
+        FROM dim_productos_historia h JOIN dim_productos p ON p.id_producto = h.id_producto_fk
+        WHERE p.empresa_erp = ANY(%s);
+    """, conn, params=(list(empresas),))
+
+
+def _a_dias(fechas):
+    """Fechas (date o datetime) como número de días, sin pasar por nanosegundos (9999-12-31 no cabe)."""
+    return np.asarray(pd.Series(fechas).to_numpy(), dtype='datetime64[D]').astype('int64')
+
+
+def _llave_normalizada(valores):
+    """Misma representación de la llave en ambos lados del cruce (enteros o texto)."""
+    return valores.astype('int64').to_numpy() if pd.api.types.is_numeric_dtype(valores) else valores.astype(str).to_numpy(dtype=object)
+
+
+def buscar_vigente(df, versiones, llaves, columnas, columna_fecha='fecha_sk'):
+    """
+    Búsqueda as-of vectorizada: para cada fila de df (llaves + fecha) toma `columnas` de la versión
+    de `versiones` (mismas llaves, fecha_inicio_validez y fecha_fin_validez) vigente en esa fecha.
+    Retorna un DataFrame alineado con df.index, con nulos donde no hay versión vigente.
+    """
+    resultado = pd.DataFrame({c: pd.Series(pd.NA, index=df.index, dtype=object) for c in columnas})
+    validas = df[llaves + [columna_fecha]].notna().all(axis=1).to_numpy()
+    if not validas.any() or versiones.empty:
+        return resultado
+
+    filas = pd.DataFrame({'_pos': np.flatnonzero(validas), '_dia': _a_dias(df[columna_fecha].to_numpy()[validas])})
+    vigencias = pd.DataFrame({'_dia': _a_dias(versiones['fecha_inicio_validez']), '_dia_fin': _a_dias(versiones['fecha_fin_validez'])})
+    for llave in llaves:
+        filas[llave] = _llave_normalizada(df[llave][validas])
+        vigencias[llave] = _llave_normalizada(versiones[llave])
+    for columna in columnas:
+        vigencias[columna] = versiones[columna].to_numpy()
+
+    # La última versión que empezó en o antes de la fecha, y que todavía no había terminado
+    cruce = pd.merge_asof(filas.sort_values('_dia'), vigencias.sort_values('_dia'), on='_dia', by=llaves, direction='backward')
+    cruce = cruce[(cruce['_dia'] <= cruce['_dia_fin']).to_numpy()]
+    for columna in columnas:
+        valores = resultado[columna].to_numpy(copy=True)
+        valores[cruce['_pos'].to_numpy()] = cruce[columna].to_numpy()
+        resultado[columna] = valores
+    return resultado
+
+
+def asignar_version_producto(df, mapa):
+    """
+    Para cada fila (id_producto_fk, fecha_sk) devuelve el id_producto_historia vigente en esa
+    fecha (Int32, alineado con df.index; nulo si el producto no tiene versión).
+    """
+    vigentes = buscar_vigente(df, mapa, ['id_producto_fk'], ['id_producto_historia'])
+    return vigentes['id_producto_historia'].astype('Int32')
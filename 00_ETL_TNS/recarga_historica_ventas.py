@@ -0,0 +1,186 @@
+# 00_ETL_TNS/recarga_historica_ventas.py
+# Recarga de ventas de un rango largo (backfill). La transformación se reparte por empresa y mes
+# entre varios procesos: los mapas de dimensiones de cada empresa se escriben una sola vez en
+# Arrow IPC y cada proceso los abre con memory-map, en vez de recibir una copia serializada
+# con cada fragmento. La carga copia las líneas por varias conexiones a la vez a una tabla UNLOGGED
+# y las publica en hechos_ventas en una sola transacción: el rango queda completo o no cambia.
+#
+#   python 00_ETL_TNS/recarga_historica_ventas.py --desde 2023-01-01 --hasta 2023-12-31 --procesos 8 --conexiones 4
+
+import os
+import sys
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_utils import get_db_connection, crear_tabla_carga, copiar_en_paralelo, CONEXIONES_CARGA
+from instrumentacion import medir_etapa, registrar_metricas
+from cargar_ventas_api import (
+    extraer_ventas_api, deduplicar_ventas, leer_mapas_ventas, enriquecer_ventas, guardar_en_cuarentena,
+    verificar_rango_no_archivado, verificar_indice_transaccion, QUERY_REEMPLAZAR_LINEAS
+)
+from resumen_margenes import refrescar_resumen_margenes, meses_entre
+from clasificacion_abc import refrescar_ventas_diarias
+
+PROCESOS_TRANSFORMACION = int(os.getenv('ETL_PROCESOS_TRANSFORMACION', str(os.cpu_count() or 1)))
+# Por debajo de estas líneas no compensa levantar procesos: se transforma en el mismo proceso
+FILAS_MINIMAS_PARALELO = 50_000
+# Líneas por COPY en la carga en paralelo (rangos de fechas contiguos)
+FILAS_POR_PIEZA = 100_000
+
+# Mapas ya abiertos en este proceso (trabajador), por carpeta de empresa
+_MAPAS_PROCESO = {}
+
+
+def _guardar_mapas(mapas, carpeta):
+    """Escribe cada mapa de la empresa como archivo Arrow IPC (sin compresión, para abrirlo con memory-map)."""
+    os.makedirs(carpeta, exist_ok=True)
+    for nombre, mapa in mapas.items():
+        tabla = pa.Table.from_pandas(mapa, preserve_index=False)
+        with pa.OSFile(os.path.join(carpeta, f"{nombre}.arrow"), 'wb') as archivo:
+            with pa.ipc.new_file(archivo, tabla.schema) as escritor:
+                escritor.write_table(tabla)
+
+
+def _abrir_mapas(carpeta):
+    """Mapas de la empresa leídos con memory-map; se abren una vez por proceso y se reutilizan."""
+    if carpeta not in _MAPAS_PROCESO:
+        mapas = {}
+        for archivo in os.listdir(carpeta):
+            with pa.memory_map(os.path.join(carpeta, archivo)) as fuente:
+                mapas[os.path.splitext(archivo)[0]] = pa.ipc.open_file(fuente).read_all().to_pandas()
+        _MAPAS_PROCESO[carpeta] = mapas
+    return _MAPAS_PROCESO[carpeta]
+
+
+def _enriquecer_fragmento(carpeta, fragmento):
+    """Trabajo de cada proceso: enriquece un fragmento (empresa y mes) con los mapas de su empresa."""
+    return enriquecer_ventas(fragmento, _abrir_mapas(carpeta))
+
+
+def fragmentar_ventas(df):
+    """Parte las ventas por empresa y mes de la fecha ('dd/mm/aaaa'). Retorna [(empresa, fragmento)]."""
+    mes = df['fecha_str'].astype(str).str.slice(3)
+    grupos = df.groupby([df['empresa_erp'].astype(str), mes], sort=False, dropna=False, observed=True)
+    return [(empresa, fragmento) for (empresa, _), fragmento in grupos]
+
+
+def transformar_ventas_paralelo(df_ventas, conn, procesos=PROCESOS_TRANSFORMACION):
+    """
+    Igual que transformar_y_enriquecer_ventas(), pero reparte los fragmentos (empresa y mes) entre
+    `procesos` procesos. Con un solo proceso o pocas líneas, transforma en este mismo proceso.
+    Devuelve (líneas válidas, líneas rechazadas).
+    """
+    with medir_etapa('ventas', 'transformacion') as etapa:
+        df = deduplicar_ventas(df_ventas)
+        etapa['filas_entrada'] = len(df)
+        empresas = list(df['empresa_erp'].dropna().astype(str).unique())
+        if procesos <= 1 or len(df) < FILAS_MINIMAS_PARALELO:
+            validas, rechazadas = enriquecer_ventas(df, leer_mapas_ventas(conn, empresas))
+        else:
+            fragmentos = fragmentar_ventas(df)
+            print(f"INFO: Transformando {len(df)} líneas en {len(fragmentos)} fragmentos con {procesos} procesos...")
+            with tempfile.TemporaryDirectory(prefix='mapas_ventas_') as carpeta:
+                for empresa in empresas:
+                    _guardar_mapas(leer_mapas_ventas(conn, [empresa]), os.path.join(carpeta, empresa))
+                # 'spawn': los procesos no heredan las conexiones abiertas de este
+                contexto = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+                    futuros = [pool.submit(_enriquecer_fragmento, os.path.join(carpeta, empresa), fragmento)
+                               for empresa, fragmento in fragmentos]
+                    resultados = [futuro.result() for futuro in futuros]
+            validas = pd.concat([r[0] for r in resultados], ignore_index=True)
+            rechazadas = pd.concat([r[1] for r in resultados], ignore_index=True)
+        etapa['filas_salida'] = len(validas)
+    print(f"INFO: {len(validas)} líneas válidas y {len(rechazadas)} para cuarentena.")
+    return validas, rechazadas
+
+
+def cargar_ventas_paralelo(conn, validas, rechazadas, fecha_desde, fecha_hasta, empresas, conexiones=CONEXIONES_CARGA):
+    """
+    Reemplaza las ventas (y la cuarentena) de esas empresas en el rango. Las líneas válidas se
+    copian en piezas de fechas contiguas, por `conexiones` conexiones a la vez, a una tabla de carga
+    UNLOGGED. Luego se publican en una sola transacción, junto con el borrado del rango, la
+    cuarentena, el resumen de márgenes y las ventas diarias. Si algo falla, hechos_ventas no cambia.
+    Retorna las líneas insertadas.
+    """
+    print(f"\nINFO: Cargando {len(validas)} líneas de ventas con {conexiones} conexiones...")
+    with medir_etapa('ventas', 'carga') as etapa:
+        etapa['filas_entrada'] = len(validas) + len(rechazadas)
+        columnas = list(validas.columns)
+        carga = crear_tabla_carga(conn, 'hechos_ventas')
+        try:
+            ordenadas = validas.sort_values('fecha_sk', kind='stable')
+            piezas = [ordenadas.iloc[i:i + FILAS_POR_PIEZA] for i in range(0, len(ordenadas), FILAS_POR_PIEZA)]
+            copiadas = copiar_en_paralelo(carga, piezas, columnas, conexiones)
+            print(f"INFO: {copiadas} líneas copiadas a '{carga}' en {len(piezas)} piezas.")
+
+            # Publicación: todo el rango en una transacción
+            params = (fecha_desde, fecha_hasta, list(empresas))
+            with conn.cursor() as cursor:
+                verificar_rango_no_archivado(cursor, fecha_desde, fecha_hasta)
+                verificar_indice_transaccion(cursor)
+                cursor.execute("DELETE FROM hechos_ventas WHERE fecha_sk BETWEEN %s AND %s AND empresa_erp = ANY(%s);", params)
+                print(f"INFO: {cursor.rowcount} registros de ventas eliminados para el período {fecha_desde} a {fecha_hasta}.")
+                cursor.execute("DELETE FROM cuarentena_ventas WHERE fecha_sk BETWEEN %s AND %s AND empresa_erp = ANY(%s);", params)
+                cursor.execute(QUERY_REEMPLAZAR_LINEAS.format(entrantes=f"SELECT empresa_erp, id_transaccion_erp FROM {carga}"))
+                reemplazadas = cursor.fetchall()
+                dias_reemplazados = sorted({fila[0] for fila in reemplazadas})
+                if reemplazadas:
+                    print(f"INFO: {len(reemplazadas)} líneas de ventas ya cargadas (ej. con otra fecha) se reemplazaron por su versión nueva.")
+                cursor.execute(f"INSERT INTO hechos_ventas ({', '.join(columnas)}) SELECT {', '.join(columnas)} FROM {carga};")
+                insertadas = cursor.rowcount
+                en_cuarentena = guardar_en_cuarentena(cursor, rechazadas)
+                refrescar_resumen_margenes(cursor, meses_entre(fecha_desde, fecha_hasta) + [d.replace(day=1) for d in dias_reemplazados])
+                refrescar_ventas_diarias(cursor, list(pd.date_range(fecha_desde, fecha_hasta).date) + dias_reemplazados)
+            conn.commit()
+            registrar_metricas(filas_afectadas_bd=insertadas + en_cuarentena)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {carga};")
+            conn.commit()
+    print(f"¡ÉXITO! Se han insertado {insertadas} registros en 'hechos_ventas' y {en_cuarentena} en 'cuarentena_ventas'.")
+    return insertadas
+
+
+def recargar_ventas(fecha_desde, fecha_hasta, procesos=PROCESOS_TRANSFORMACION, conexiones=CONEXIONES_CARGA):
+    """Descarga, transforma en paralelo y recarga en paralelo las ventas del rango 'AAAA-MM-DD'."""
+    print(f"=== INICIO DE LA RECARGA HISTÓRICA DE VENTAS ({fecha_desde} a {fecha_hasta}) ===")
+    conn = get_db_connection()
+    if not conn: return
+
+    try:
+        # Antes de descargar: un rango con meses archivados o una BD sin migrar se rechazan (la carga lo vuelve a verificar)
+        with conn.cursor() as cursor:
+            verificar_rango_no_archivado(cursor, fecha_desde, fecha_hasta)
+            verificar_indice_transaccion(cursor)
+        conn.rollback()
+        df_ventas = extraer_ventas_api(fecha_desde, fecha_hasta)
+        if df_ventas is None:
+            return
+        validas, rechazadas = transformar_ventas_paralelo(df_ventas, conn, procesos)
+        empresas = df_ventas['empresa_erp'].dropna().astype(str).unique()
+        cargar_ventas_paralelo(conn, validas, rechazadas, fecha_desde, fecha_hasta, empresas, conexiones)
+        print("\n=== FIN DE LA RECARGA HISTÓRICA DE VENTAS ===")
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante la recarga histórica de ventas: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recarga de ventas de un rango de fechas con transformación en paralelo.')
+    parser.add_argument('--desde', required=True, help='Fecha inicial (AAAA-MM-DD).')
+    parser.add_argument('--hasta', required=True, help='Fecha final (AAAA-MM-DD).')
+    parser.add_argument('--procesos', type=int, default=PROCESOS_TRANSFORMACION, help='Procesos de transformación.')
+    parser.add_argument('--conexiones', type=int, default=CONEXIONES_CARGA, help='Conexiones simultáneas de la carga.')
+    args = parser.parse_args()
+    recargar_ventas(args.desde, args.hasta, args.procesos, args.conexiones)
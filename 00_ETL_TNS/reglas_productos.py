@@ -0,0 +1,144 @@
+# 00_ETL_TNS/reglas_productos.py
+# Reglas de corrección de productos (líneas, grupos, departamentos y marcas) compiladas en una
+# sola estructura de búsqueda, versionada por el contenido de los CSV y guardada en caché.
+
+import os
+import sys
+import pickle
+import hashlib
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+
+# (nombre, archivo en datos_entrada, llaves, columna con el valor corregido, columna del producto que corrige)
+# Si la columna del producto ya trae un valor, la regla lo sobreescribe; si no hay regla, se conserva.
+REGLAS = [
+    ('lineas', 'mapeo_correccion_lineas.csv', ('codigo_erp',), 'cod_linea_erp_corregido', 'cod_linea_erp'),
+    ('grupos', 'mapeo_correccion_grupos.csv', ('codigo_erp',), 'cod_grupo_articulo_corregido', 'cod_grupo_erp'),
+    ('dptos', 'mapeo_correccion_dpto.csv', ('codigo_erp',), 'cod_dpto_sku_corregido', 'cod_dpto_sku_erp'),
+    ('marcas', 'mapeo_marcas.csv', ('nombre_marca_erp', 'empresa_erp'), 'cod_marca_unificado', 'cod_marca_erp'),
+]
+
+RUTA_CACHE = os.path.join(config.CACHE_DIR, 'reglas_productos.pkl')
+
+# Última compilación usada en este proceso (evita releer el pickle en la misma corrida)
+_compiladas = None
+
+
+def _archivos():
+    return sorted({archivo for _, archivo, _, _, _ in REGLAS})
+
+
+def _firmas(base_path):
+    """(archivo, mtime, tamaño) de cada CSV de reglas: si no cambian, no hace falta ni leerlos."""
+    firmas = []
+    for archivo in _archivos():
+        estado = os.stat(os.path.join(base_path, archivo))
+        firmas.append((archivo, estado.st_mtime_ns, estado.st_size))
+    return tuple(firmas)
+
+
+def _version(base_path):
+    """Hash del contenido de todos los CSV de reglas y de su definición (la versión de las reglas)."""
+    h = hashlib.sha256(repr(REGLAS).encode('utf-8'))
+    for archivo in _archivos():
+        with open(os.path.join(base_path, archivo), 'rb') as f:
+            h.update(archivo.encode('utf-8') + b'\0' + f.read())
+    return h.hexdigest()[:16]
+
+
+def _validar_colisiones(nombre, df, llaves, columna_valor):
+    """
+    Una llave repetida con el mismo valor se descarta en silencio; con valores distintos la regla es
+    ambigua (antes ganaba la última fila del CSV sin avisar) y se rechaza la compilación.
+    """
+    df = df.drop_duplicates(subset=list(llaves) + [columna_valor])
+    repetidas = df[df.duplicated(subset=list(llaves), keep=False)]
+    if not repetidas.empty:
+        ejemplos = repetidas.sort_values(list(llaves)).head(10).to_dict('records')
+        raise ValueError(f"Reglas de '{nombre}' con llaves repetidas y valores distintos ({repetidas[list(llaves)].drop_duplicates().shape[0]} llaves). Ej: {ejemplos}")
+    return df
+
+
+def compilar_reglas(base_path):
+    """
+    Lee los CSV de mapeo y arma una tabla por cada juego de llaves (todas las reglas por
+    codigo_erp en una misma tabla, las de marca en otra), indexada para buscar en bloque.
+    """
+    tablas = {}
+    for nombre, archivo, llaves, columna_valor, _ in REGLAS:
+        df = pd.read_csv(os.path.join(base_path, archivo), dtype=str)
+        df = df[list(llaves) + [columna_valor]].dropna(subset=list(llaves))
+        df = _validar_colisiones(nombre, df, llaves, columna_valor)
+        serie = df.set_index(list(llaves))[columna_valor].rename(nombre)
+        tablas[llaves] = serie.to_frame() if llaves not in tablas else tablas[llaves].join(serie, how='outer')
+    return tablas
+
+
+def cargar_reglas(base_path=None):
+    """
+    Devuelve las reglas compiladas ({'version', 'firmas', 'tablas'}). Se reutiliza la caché mientras
+    los CSV no cambien (primero por fecha/tamaño y, si esos cambiaron, por el hash del contenido).
+    """
+    global _compiladas
+    base_path = base_path or config.DATOS_ENTRADA_DIR
+    firmas = _firmas(base_path)
+    if _compiladas is not None and _compiladas['firmas'] == firmas:
+        return _compiladas
+
+    en_cache = None
+    if os.path.exists(RUTA_CACHE):
+        try:
+            with open(RUTA_CACHE, 'rb') as f:
+                en_cache = pickle.load(f)
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudo leer la caché de reglas, se recompilan: {e}")
+
+    if en_cache is not None and en_cache['firmas'] == firmas:
+        _compiladas = en_cache
+        print(f"INFO: Reglas de productos tomadas de la caché (versión {en_cache['version']}).")
+        return _compiladas
+
+    version = _version(base_path)
+    if en_cache is not None and en_cache['version'] == version:
+        # Los archivos se tocaron pero su contenido es el mismo
+        en_cache['firmas'] = firmas
+        print(f"INFO: Reglas de productos sin cambios de contenido (versión {version}).")
+    else:
+        print(f"INFO: Compilando reglas de productos (versión {version})...")
+        en_cache = {'version': version, 'firmas': firmas, 'tablas': compilar_reglas(base_path)}
+
+    try:
+        os.makedirs(config.CACHE_DIR, exist_ok=True)
+        with open(RUTA_CACHE, 'wb') as f:
+            pickle.dump(en_cache, f)
+    except OSError as e:
+        print(f"ADVERTENCIA: No se pudo guardar la caché de reglas: {e}")
+    _compiladas = en_cache
+    return _compiladas
+
+
+def aplicar_reglas(df, reglas):
+    """
+    Aplica todas las correcciones con una búsqueda vectorizada por juego de llaves y retorna
+    (df corregido, reporte) con los aciertos y fallos de cada regla en esta corrida.
+    """
+    df = df.copy()
+    reporte = []
+    for llaves, tabla in reglas['tablas'].items():
+        if len(llaves) == 1:
+            buscar = pd.Index(df[llaves[0]])
+        else:
+            buscar = pd.MultiIndex.from_arrays([df[c] for c in llaves])
+        encontrados = tabla.reindex(buscar)
+        for nombre, _, _, _, destino in (r for r in REGLAS if r[2] == llaves):
+            valores = pd.Series(encontrados[nombre].to_numpy(), index=df.index)
+            aciertos = int(valores.notna().sum())
+            reporte.append({'regla': nombre, 'filas': len(df), 'aciertos': aciertos, 'fallos': len(df) - aciertos,
+                            'reglas_disponibles': int(tabla[nombre].notna().sum())})
+            df[destino] = valores.fillna(df[destino]) if destino in df.columns else valores
+    reporte = pd.DataFrame(reporte)
+    reporte['tasa_acierto_%'] = (reporte['aciertos'] / reporte['filas'].where(reporte['filas'] > 0) * 100).round(1)
+    return df, reporte
@@ -0,0 +1,183 @@
+# 00_ETL_TNS/resumen_margenes.py
+# Resumen mensual de márgenes, descuentos y realización de precio sobre hechos_ventas.
+# resumen_margenes_mes guarda solo sumas (por mes, empresa y miembro de cada eje) y se recalcula
+# únicamente para los meses que el ETL acaba de recargar; los indicadores salen de esas sumas,
+# así un reporte mensual nunca vuelve a recorrer toda la historia de ventas.
+#
+#   python 00_ETL_TNS/resumen_margenes.py --reconstruir          # todos los meses en línea
+#   python 00_ETL_TNS/resumen_margenes.py --desde 2024-01-01     # reporte por producto desde esa fecha
+
+import os
+import sys
+import argparse
+from datetime import date
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+from db_utils import get_db_connection, leer_dataframe
+from instrumentacion import medir_etapa, registrar_metricas
+
+# Eje -> (columna de hechos_ventas que identifica al miembro, unión y columnas descriptivas del reporte)
+EJES = {
+    'producto': ('v.id_producto_fk', "LEFT JOIN dim_productos d ON d.id_producto = r.id_miembro",
+                 ["d.codigo_erp", "d.descripcion_erp", "d.cod_linea_erp", "d.cod_marca_erp"]),
+    'cliente': ('v.id_cliente_empresa_fk', "LEFT JOIN dim_clientes_empresa d ON d.id_cliente_empresa = r.id_miembro",
+                ["d.cod_cliente_erp", "d.nombre_erp"]),
+    'rol': ('v.id_rol_historia_fk', "LEFT JOIN dim_roles_comerciales_historia d ON d.id_rol_historia = r.id_miembro",
+            ["d.cod_rol_erp", "d.cargo"]),
+    # Las líneas sin bodega enlazada quedan en el miembro 0
+    'bodega': ('COALESCE(v.id_bodega_fk, 0)', "LEFT JOIN dim_bodegas d ON d.id_bodega = r.id_miembro",
+               ["d.cod_bodega_erp", "d.nombre_bodega"]),
+    # Total de la empresa en el mes (miembro 0)
+    'empresa': (None, "", []),
+}
+
+SUMAS = ['lineas', 'cantidad', 'valor_base', 'valor_descuento', 'costo_total',
+         'valor_neto_con_costo', 'valor_lista', 'valor_neto_con_lista']
+
+_EJES_AGRUPADOS = [eje for eje, (columna, _, _) in EJES.items() if columna]
+
+# Un solo recorrido por los meses recargados: GROUPING SETS produce a la vez las sumas de cada eje.
+# valor_base es el valor bruto de la línea (precio de lista x cantidad) y el descuento se resta aparte.
+QUERY_REFRESCO = f"""
+    INSERT INTO resumen_margenes_mes (mes, empresa_erp, eje, id_miembro, {", ".join(SUMAS)})
+    SELECT date_trunc('month', v.fecha_sk)::date, v.empresa_erp,
+           CASE {" ".join(f"WHEN GROUPING({EJES[e][0]}) = 0 THEN '{e}'" for e in _EJES_AGRUPADOS)} ELSE 'empresa' END,
+           COALESCE({", ".join(EJES[e][0] for e in _EJES_AGRUPADOS)}, 0),
+           COUNT(*),
+           SUM(v.cantidad),
+           SUM(v.valor_base),
+           SUM(COALESCE(v.valor_descuento, 0)),
+           COALESCE(SUM(v.costo_total), 0),
+           COALESCE(SUM(v.valor_base - COALESCE(v.valor_descuento, 0)) FILTER (WHERE v.costo_total IS NOT NULL), 0),
+           COALESCE(SUM(v.precio_lista * v.cantidad) FILTER (WHERE v.precio_lista > 0), 0),
+           COALESCE(SUM(v.valor_base - COALESCE(v.valor_descuento, 0)) FILTER (WHERE v.precio_lista > 0), 0)
+    FROM hechos_ventas v
+    WHERE v.fecha_sk >= %(desde)s AND v.fecha_sk < %(hasta)s
+      AND date_trunc('month', v.fecha_sk)::date = ANY(%(meses)s)
+      AND (%(empresa)s::text IS NULL OR v.empresa_erp = %(empresa)s)
+    GROUP BY 1, 2, GROUPING SETS ({", ".join(f"({EJES[e][0]})" for e in _EJES_AGRUPADOS)}, ());
+"""
+
+
+def meses_entre(fecha_desde, fecha_hasta):
+    """Primer día de cada mes que toca el rango (inclusive)."""
+    return [p.to_timestamp().date() for p in pd.period_range(pd.Timestamp(fecha_desde), pd.Timestamp(fecha_hasta), freq='M')]
+
+
+def refrescar_resumen_margenes(cursor, meses, empresa=None):
+    """
+    Recalcula resumen_margenes_mes para esos meses (date del primer día) y, si se indica, solo para
+    esa empresa. No confirma la transacción: se llama dentro de la misma carga que cambió las ventas.
+    Los meses ya archivados en frío no se tocan (sus ventas ya no están en hechos_ventas).
+    Retorna las filas del resumen escritas.
+    """
+    meses = sorted(set(meses))
+    if not meses:
+        return 0
+    with medir_etapa('ventas', 'resumen_margenes', en_transaccion=True):
+        cursor.execute("SELECT DISTINCT mes FROM archivo_hechos_ventas WHERE mes = ANY(%s);", (meses,))
+        archivados = {fila[0] for fila in cursor.fetchall()}
+        if archivados:
+            print(f"ADVERTENCIA: Los meses {sorted(m.strftime('%Y-%m') for m in archivados)} están archivados; su resumen de márgenes no se recalcula.")
+            meses = [m for m in meses if m not in archivados]
+            if not meses:
+                return 0
+
+        params = {'meses': meses, 'empresa': empresa, 'desde': meses[0],
+                  'hasta': (pd.Timestamp(meses[-1]) + pd.offsets.MonthBegin(1)).date()}
+        cursor.execute("""
+            DELETE FROM resumen_margenes_mes
+            WHERE mes = ANY(%(meses)s) AND (%(empresa)s::text IS NULL OR empresa_erp = %(empresa)s);
+        """, params)
+        cursor.execute(QUERY_REFRESCO, params)
+        escritas = cursor.rowcount
+        registrar_metricas(filas_afectadas_bd=escritas)
+    print(f"INFO: Resumen de márgenes recalculado para {len(meses)} meses {empresa or ''} ({escritas} filas).")
+    return escritas
+
+
+def calcular_indicadores(df):
+    """
+    Agrega a un DataFrame con las SUMAS los indicadores derivados (vectorizado, NaN si el denominador es 0):
+    valor_neto, utilidad_bruta, margen_pct, descuento_pct y realizacion_precio_pct.
+    """
+    df = df.copy()
+    df['lineas'] = df['lineas'].astype('int64')
+    for columna in SUMAS[1:]:
+        df[columna] = df[columna].astype('float64')
+
+    def _pct(numerador, denominador):
+        return (100 * numerador / denominador.where(denominador != 0)).round(2)
+
+    df['valor_neto'] = (df['valor_base'] - df['valor_descuento']).round(2)
+    df['utilidad_bruta'] = (df['valor_neto_con_costo'] - df['costo_total']).round(2)
+    df['margen_pct'] = _pct(df['utilidad_bruta'], df['valor_neto_con_costo'])
+    df['descuento_pct'] = _pct(df['valor_descuento'], df['valor_base'])
+    df['realizacion_precio_pct'] = _pct(df['valor_neto_con_lista'], df['valor_lista'])
+    return df
+
+
+def margenes_por(conn, eje, fecha_desde, fecha_hasta, empresa=None, por_mes=False):
+    """
+    Márgenes por miembro del eje ('producto', 'cliente', 'rol', 'bodega' o 'empresa') para los meses
+    entre las dos fechas, leyendo solo resumen_margenes_mes. Retorna un DataFrame ordenado por utilidad.
+    """
+    if eje not in EJES:
+        raise ValueError(f"Eje no soportado: '{eje}'. Disponibles: {sorted(EJES)}")
+    _, union, descripcion = EJES[eje]
+    grupo = ["r.empresa_erp", "r.id_miembro"] + descripcion + (["r.mes"] if por_mes else [])
+    df = leer_dataframe(conn, f"""
+        SELECT {", ".join(grupo)}, {", ".join(f"SUM(r.{s}) AS {s}" for s in SUMAS)}
+        FROM resumen_margenes_mes r {union}
+        WHERE r.eje = %s AND r.mes BETWEEN date_trunc('month', %s::date) AND %s
+          AND (%s::text IS NULL OR r.empresa_erp = %s)
+        GROUP BY {", ".join(grupo)};
+    """, (eje, fecha_desde, fecha_hasta, empresa, empresa))
+    return calcular_indicadores(df).sort_values('utilidad_bruta', ascending=False, ignore_index=True)
+
+
+def reconstruir_resumen_margenes(fecha_desde=None, fecha_hasta=None):
+    """Recalcula el resumen de todos los meses en línea de hechos_ventas (o de los del rango)."""
+    print("=== RECONSTRUCCIÓN DEL RESUMEN DE MÁRGENES ===")
+    conn = get_db_connection()
+    if not conn: return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT date_trunc('month', fecha_sk)::date FROM hechos_ventas
+                WHERE (%s::date IS NULL OR fecha_sk >= %s) AND (%s::date IS NULL OR fecha_sk <= %s);
+            """, (fecha_desde, fecha_desde, fecha_hasta, fecha_hasta))
+            meses = [fila[0] for fila in cursor.fetchall()]
+            escritas = refrescar_resumen_margenes(cursor, meses)
+        conn.commit()
+        print(f"\n¡ÉXITO! Resumen de márgenes reconstruido: {len(meses)} meses, {escritas} filas.")
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante la reconstrucción del resumen de márgenes: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resumen mensual de márgenes, descuentos y realización de precio.')
+    parser.add_argument('--reconstruir', action='store_true', help='Recalcula el resumen (todos los meses o los del rango).')
+    parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD).')
+    parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD). Por defecto, hoy.')
+    parser.add_argument('--eje', default='producto', choices=sorted(EJES), help='Eje del reporte.')
+    args = parser.parse_args()
+    if args.reconstruir:
+        reconstruir_resumen_margenes(args.desde, args.hasta)
+    else:
+        conn = get_db_connection()
+        if conn:
+            try:
+                # Por defecto, el mes en curso
+                desde = args.desde or date.today().replace(day=1).isoformat()
+                reporte = margenes_por(conn, args.eje, desde, args.hasta or date.today().isoformat())
+            finally:
+                conn.close()
+            ruta = os.path.join(config.INFORMES_GENERADOS_DIR, f"margenes_por_{args.eje}.csv")
+            reporte.to_csv(ruta, index=False, encoding='utf-8-sig')
+            print(f"¡ÉXITO! {len(reporte)} filas guardadas en '{ruta}'.")
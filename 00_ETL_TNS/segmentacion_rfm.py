@@ -0,0 +1,134 @@
+# 00_ETL_TNS/segmentacion_rfm.py
+# Segmentación RFM (recencia, frecuencia y valor) de clientes por maestro_clientes, o por
+# dim_clientes_empresa si el cliente todavía no tiene maestro. Lee solo ventas_diarias_entidad
+# (una fila por cliente y día), así que su costo crece con los días con compra y no con las líneas.
+#
+#   python 00_ETL_TNS/segmentacion_rfm.py                 # corte: ayer
+#   python 00_ETL_TNS/segmentacion_rfm.py --corte 2024-06-30
+
+import os
+import sys
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+from db_utils import get_db_connection, copiar_dataframe, leer_dataframe
+from instrumentacion import medir_etapa, registrar_metricas
+from historia_productos import FIN_VIGENCIA, construir_query_historia
+
+VENTANA_RFM_MESES = 12
+QUINTILES = 5
+
+# Segmento según el puntaje de recencia (R) y el promedio de frecuencia y valor (FM), de 1 a 5.
+# Se evalúan en orden; el primero que cumple asigna el segmento.
+SEGMENTOS = [
+    ('Campeones', lambda r, fm: (r >= 4) & (fm >= 4)),
+    ('Leales', lambda r, fm: (r == 3) & (fm >= 4)),
+    ('Potenciales', lambda r, fm: (r >= 4) & (fm >= 2)),
+    ('Nuevos', lambda r, fm: r >= 4),
+    ('Requieren atención', lambda r, fm: r == 3),
+    ('En riesgo', lambda r, fm: fm >= 4),
+    ('Hibernando', lambda r, fm: fm >= 2),
+]
+SEGMENTO_POR_DEFECTO = 'Perdidos'
+
+# Una sola pasada agrupada por la ventana de ventas_diarias_entidad
+QUERY_RFM = """
+    SELECT CASE WHEN c.id_maestro_cliente_fk IS NOT NULL THEN 'maestro' ELSE 'cliente_empresa' END AS tipo_entidad,
+           COALESCE(c.id_maestro_cliente_fk, d.id_entidad) AS id_entidad,
+           MAX(d.fecha_sk) AS ultima_compra,
+           SUM(d.facturas)::int AS frecuencia,
+           SUM(d.valor_neto)::float8 AS valor,
+           COUNT(DISTINCT d.empresa_erp)::int AS empresas
+    FROM ventas_diarias_entidad d
+    JOIN dim_clientes_empresa c ON c.id_cliente_empresa = d.id_entidad
+    WHERE d.tipo_entidad = 'cliente'
+      AND d.fecha_sk > (%(corte)s::date - make_interval(months => %(meses)s))::date AND d.fecha_sk <= %(corte)s
+    GROUP BY 1, 2;
+"""
+
+COLUMNAS_SEGMENTOS = ['tipo_entidad', 'id_entidad', 'segmento']
+
+# Solo se abre versión si cambia el segmento, y un cliente sin compras en la ventana cierra la suya
+QUERY_HISTORIA_RFM = construir_query_historia(
+    'dim_segmento_rfm_historia', 'id_segmento_rfm', ['tipo_entidad', 'id_entidad'], ['segmento'],
+    entrantes="SELECT * FROM tmp_segmentos_rfm",
+)
+
+
+def puntaje_quintil(valores, ascendente=True):
+    """
+    Puntaje de 1 a 5 por quintil de rango (vectorizado). Los empates comparten puntaje y funciona
+    con cualquier número de clientes. Con ascendente=False, el valor más bajo obtiene 5.
+    """
+    percentil = valores.rank(method='average', ascending=ascendente, pct=True)
+    return np.clip(np.ceil(percentil * QUINTILES), 1, QUINTILES).astype('int8')
+
+
+def calcular_rfm(df, corte):
+    """Agrega recencia_dias, los puntajes R, F y M y el segmento a un DataFrame de QUERY_RFM."""
+    df = df.copy()
+    df['recencia_dias'] = (pd.Timestamp(corte) - pd.to_datetime(df['ultima_compra'])).dt.days
+    df['puntaje_r'] = puntaje_quintil(df['recencia_dias'], ascendente=False)
+    df['puntaje_f'] = puntaje_quintil(df['frecuencia'])
+    df['puntaje_m'] = puntaje_quintil(df['valor'])
+    r = df['puntaje_r'].to_numpy()
+    fm = np.floor((df['puntaje_f'].to_numpy() + df['puntaje_m'].to_numpy()) / 2)
+    df['segmento'] = np.select([condicion(r, fm) for _, condicion in SEGMENTOS],
+                               [nombre for nombre, _ in SEGMENTOS], default=SEGMENTO_POR_DEFECTO)
+    return df
+
+
+def actualizar_segmentacion_rfm(fecha_corte=None, meses=VENTANA_RFM_MESES):
+    """
+    Calcula el RFM de los clientes con compras en los últimos `meses` al corte (por defecto ayer),
+    registra en la historia los cambios de segmento (los clientes sin compras cierran el suyo) y
+    guarda el detalle en informes_generados/.
+    """
+    print("=== INICIO DE LA SEGMENTACIÓN RFM ===")
+    corte = fecha_corte or date.today() - timedelta(days=1)
+    conn = get_db_connection()
+    if not conn: return
+
+    try:
+        with medir_etapa('segmentacion_rfm', 'segmentacion') as etapa:
+            clientes = leer_dataframe(conn, QUERY_RFM, {'corte': corte, 'meses': meses})
+            etapa['filas_entrada'] = len(clientes)
+            if clientes.empty:
+                # Sin ventas en la ventana la historia igual se actualiza: se cierran todos los segmentos vigentes
+                print("INFO: No hay ventas de clientes en la ventana.")
+            clientes = calcular_rfm(clientes, corte)
+
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TEMP TABLE tmp_segmentos_rfm (tipo_entidad VARCHAR(20), id_entidad INT, segmento VARCHAR(30)) ON COMMIT DROP;
+                """)
+                copiar_dataframe(conn, 'tmp_segmentos_rfm', clientes, COLUMNAS_SEGMENTOS)
+                cursor.execute(QUERY_HISTORIA_RFM, {'hoy': corte, 'fin': FIN_VIGENCIA})
+                abiertas, cerradas, corregidas = cursor.fetchone()
+            conn.commit()
+            registrar_metricas(filas_afectadas_bd=abiertas + cerradas + corregidas)
+            etapa['filas_salida'] = len(clientes)
+
+        ruta = os.path.join(config.INFORMES_GENERADOS_DIR, 'segmentacion_rfm_clientes.csv')
+        clientes.to_csv(ruta, index=False, encoding='utf-8-sig')
+        print(f"INFO: Clientes por segmento:\n{clientes['segmento'].value_counts().to_string()}")
+        print(f"\n¡ÉXITO! RFM al {corte} de {len(clientes)} clientes: {abiertas} versiones nuevas, {cerradas} cerradas "
+              f"y {corregidas} corregidas del mismo día. Detalle en '{ruta}'.")
+
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante la segmentación RFM: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Segmentación RFM de clientes por maestro.')
+    parser.add_argument('--corte', type=date.fromisoformat, help='Fecha de corte (AAAA-MM-DD). Por defecto, ayer.')
+    parser.add_argument('--meses', type=int, default=VENTANA_RFM_MESES, help='Meses de historia considerados.')
+    args = parser.parse_args()
+    actualizar_segmentacion_rfm(args.corte, args.meses)
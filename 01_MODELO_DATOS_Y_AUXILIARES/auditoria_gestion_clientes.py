@@ -6,7 +6,19 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import config
-from db_utils import get_db_connection
+from db_utils import get_db_connection, leer_por_bloques, escribir_csv_por_bloques
+
+def _a_lista_de_trabajo(df_pendientes):
+    """Da a un bloque de pendientes el formato del CSV maestro de clientes."""
+    df_salida = pd.DataFrame()
+    df_salida['cod_cliente_maestro'] = df_pendientes['cod_cliente_erp']
+    df_salida['nit'] = df_pendientes['nit']
+    df_salida['nombre_unificado'] = df_pendientes['nombre_erp']
+    df_salida['canal'] = ''
+    df_salida['subcanal'] = ''
+    df_salida['cod_cliente_erp_origen'] = df_pendientes['cod_cliente_erp']
+    df_salida['empresa_erp_origen'] = df_pendientes['empresa_erp']
+    return df_salida
 
 def auditar_clientes_sin_gestion():
     """
@@ -22,29 +34,24 @@ def auditar_clientes_sin_gestion():
         # Ahora solo trae clientes con ventas en los últimos 24 meses.
         # Puedes ajustar el intervalo '24 months' según tus necesidades.
         query_pendientes = """
-            SELECT DISTINCT dce.nit, dce.nombre_erp, dce.cod_cliente_erp, dce.empresa_erp
+            -- EXISTS en vez de JOIN + DISTINCT: se detiene en la primera venta de cada cliente
+            SELECT dce.nit, dce.nombre_erp, dce.cod_cliente_erp, dce.empresa_erp
             FROM dim_clientes_empresa dce
-            JOIN hechos_ventas hv ON dce.id_cliente_empresa = hv.id_cliente_empresa_fk
             WHERE dce.id_maestro_cliente_fk IS NULL
-              AND hv.fecha_sk >= NOW() - INTERVAL '24 months';
+              AND EXISTS (
+                  SELECT 1 FROM hechos_ventas hv
+                  WHERE hv.id_cliente_empresa_fk = dce.id_cliente_empresa
+                    AND hv.fecha_sk >= NOW() - INTERVAL '24 months');
         """
-        df_pendientes = pd.read_sql_query(query_pendientes, conn)
-        
-        if not df_pendientes.empty:
-            print(f"\nALERTA: Se encontraron {len(df_pendientes)} clientes con ventas recientes pendientes por enlazar al maestro.")
-            
-            df_salida = pd.DataFrame()
-            df_salida['cod_cliente_maestro'] = df_pendientes['cod_cliente_erp']
-            df_salida['nit'] = df_pendientes['nit']
-            df_salida['nombre_unificado'] = df_pendientes['nombre_erp']
-            df_salida['canal'] = ''
-            df_salida['subcanal'] = ''
-            df_salida['cod_cliente_erp_origen'] = df_pendientes['cod_cliente_erp']
-            df_salida['empresa_erp_origen'] = df_pendientes['empresa_erp']
-
-            ruta_salida = os.path.join(config.INFORMES_GENERADOS_DIR, 'clientes_pendientes_por_clasificar.csv')
-            df_salida.to_csv(ruta_salida, index=False)
-            
+        ruta_salida = os.path.join(config.INFORMES_GENERADOS_DIR, 'clientes_pendientes_por_clasificar.csv')
+        # Se lee con un cursor del lado del servidor y se escribe bloque a bloque:
+        # la memoria no depende del tamaño de hechos_ventas.
+        total_pendientes = escribir_csv_por_bloques(
+            leer_por_bloques(conn, query_pendientes), ruta_salida, transformar=_a_lista_de_trabajo
+        )
+
+        if total_pendientes:
+            print(f"\nALERTA: Se encontraron {total_pendientes} clientes con ventas recientes pendientes por enlazar al maestro.")
             print(f"\n¡ÉXITO! Se ha generado tu 'lista de trabajo' en: {ruta_salida}")
         else:
             print("\n¡EXCELENTE! Todos los clientes con actividad reciente ya están enlazados a un registro maestro.")
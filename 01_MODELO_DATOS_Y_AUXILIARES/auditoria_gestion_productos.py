@@ -6,7 +6,64 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import config
-from db_utils import get_db_connection
+from db_utils import get_db_connection, escribir_csv_por_bloques, ITERSIZE
+from definicion_auditorias import ejecutar_auditoria
+
+COLUMNAS_SALIDA_CSV = ['codigo_erp', 'referencia', 'categoria_gestion', 'subcategoria_1_gestion','subcategoria_2_gestion', 'descripcion_guia', 'clasificacion_py','equivalencia_py', 'peso_neto']
+
+# Productos con actividad reciente (ventas O inventario) frente a los ya clasificados en
+# gestion_productos_aux. Los intervalos ('12 months', '3 months') son ajustables.
+AUDITORIA_PRODUCTOS = {
+    'izquierda': ('activos', """
+        SELECT DISTINCT dp.codigo_erp, dp.referencia, dp.descripcion_erp
+        FROM dim_productos AS dp
+        WHERE EXISTS (
+                -- Con ventas en los últimos 12 meses
+                SELECT 1 FROM hechos_ventas AS hv
+                WHERE hv.id_producto_fk = dp.id_producto
+                  AND hv.fecha_sk >= NOW() - INTERVAL '12 months')
+           OR EXISTS (
+                -- Con movimiento de inventario en los últimos 3 meses
+                SELECT 1 FROM Inventario_Actual AS ia
+                WHERE ia.id_producto_fk = dp.id_producto
+                  AND ia.fecha_ultima_actualizacion >= NOW() - INTERVAL '3 months')
+    """),
+    'derecha': ('gestionados', """
+        SELECT dp.codigo_erp, dp.referencia
+        FROM gestion_productos_aux gpa
+        JOIN dim_productos dp ON gpa.id_producto_fk = dp.id_producto
+    """),
+    'llaves': ['codigo_erp', 'referencia'],
+    'llaves_con_nulos': ['referencia'],
+    'estados': {'solo_izquierda': 'PENDIENTE'},
+}
+
+def iterar_productos_pendientes(conn, tamano_bloque=ITERSIZE):
+    """
+    Entrega por bloques los productos con actividad reciente (ventas o inventario) que aún
+    no tienen registro en gestion_productos_aux. El cruce (NOT EXISTS) se hace en la BD y
+    solo llegan los pendientes.
+    """
+    print("INFO: Buscando productos con actividad reciente (ventas o inventario) sin clasificar...")
+    return ejecutar_auditoria(conn, AUDITORIA_PRODUCTOS, tamano_bloque=tamano_bloque)
+
+def obtener_productos_pendientes(conn):
+    """
+    Devuelve en un solo DataFrame los productos con actividad reciente (ventas o inventario)
+    que aún no tienen registro en gestion_productos_aux.
+    """
+    return pd.concat(iterar_productos_pendientes(conn), ignore_index=True)
+
+def _a_lista_de_trabajo(df_pendientes):
+    """Da a un bloque de pendientes el formato del CSV de gestión de productos."""
+    df_salida = pd.DataFrame()
+    df_salida['codigo_erp'] = df_pendientes['codigo_erp']
+    df_salida['referencia'] = df_pendientes['referencia']
+    df_salida['descripcion_guia'] = df_pendientes['descripcion_erp']
+    for col in COLUMNAS_SALIDA_CSV:
+        if col not in df_salida.columns:
+            df_salida[col] = ''
+    return df_salida[COLUMNAS_SALIDA_CSV]
 
 def auditar_productos_sin_gestion():
     """
@@ -20,61 +77,12 @@ def auditar_productos_sin_gestion():
         return
 
     try:
-        # --- PASO 1: Obtener productos con actividad reciente (Ventas O Inventario) ---
-        # Los intervalos ('12 months', '3 months') son ajustables.
-        print("INFO: Buscando productos con actividad reciente (ventas o inventario)...")
-        query_activos = """
-            -- Productos con ventas en los últimos 12 meses
-            SELECT DISTINCT dp.codigo_erp, dp.referencia, dp.descripcion_erp
-            FROM dim_productos AS dp
-            JOIN hechos_ventas AS hv ON dp.id_producto = hv.id_producto_fk
-            WHERE hv.fecha_sk >= NOW() - INTERVAL '12 months'
-
-            UNION
-
-            -- Productos con movimiento de inventario en los últimos 3 meses
-            SELECT DISTINCT dp.codigo_erp, dp.referencia, dp.descripcion_erp
-            FROM dim_productos AS dp
-            JOIN Inventario_Actual AS ia ON dp.id_producto = ia.id_producto_fk
-            WHERE ia.fecha_ultima_actualizacion >= NOW() - INTERVAL '3 months';
-        """
-        df_activos = pd.read_sql_query(query_activos, conn)
-        print(f"INFO: Se encontraron {len(df_activos)} productos únicos con actividad reciente.")
-
-        # --- El resto del script se mantiene sin cambios ---
-        query_gestionados = """
-            SELECT DISTINCT dp.codigo_erp, dp.referencia
-            FROM gestion_productos_aux gpa
-            JOIN dim_productos dp ON gpa.id_producto_fk = dp.id_producto;
-        """
-        df_gestionados = pd.read_sql_query(query_gestionados, conn)
-        print(f"INFO: Se encontraron {len(df_gestionados)} productos ya clasificados.")
-
-        if df_gestionados.empty:
-            df_pendientes = df_activos
-        else:
-            df_merged = pd.merge(
-                df_activos, df_gestionados,
-                on=['codigo_erp', 'referencia'],
-                how='left', indicator=True
-            )
-            df_pendientes = df_merged[df_merged['_merge'] == 'left_only'].drop(columns=['_merge'])
+        ruta_salida = os.path.join(config.INFORMES_GENERADOS_DIR, 'productos_pendientes_por_clasificar.csv')
+        # El CSV se escribe a medida que llegan los bloques (no se arma el resultado completo en memoria)
+        total_pendientes = escribir_csv_por_bloques(iterar_productos_pendientes(conn), ruta_salida, transformar=_a_lista_de_trabajo)
 
-        if not df_pendientes.empty:
-            print(f"\nALERTA: Se encontraron {len(df_pendientes)} productos activos pendientes por clasificar.")
-            
-            # (El resto del código para generar el CSV se mantiene igual)
-            columnas_finales_csv = ['codigo_erp', 'referencia', 'categoria_gestion', 'subcategoria_1_gestion','subcategoria_2_gestion', 'descripcion_guia', 'clasificacion_py','equivalencia_py', 'peso_neto']
-            df_salida = pd.DataFrame()
-            df_salida['codigo_erp'] = df_pendientes['codigo_erp']
-            df_salida['referencia'] = df_pendientes['referencia']
-            df_salida['descripcion_guia'] = df_pendientes['descripcion_erp']
-            for col in columnas_finales_csv:
-                if col not in df_salida.columns:
-                    df_salida[col] = ''
-            df_salida = df_salida[columnas_finales_csv]
-            ruta_salida = os.path.join(config.INFORMES_GENERADOS_DIR, 'productos_pendientes_por_clasificar.csv')
-            df_salida.to_csv(ruta_salida, index=False)
+        if total_pendientes:
+            print(f"\nALERTA: Se encontraron {total_pendientes} productos activos pendientes por clasificar.")
             print(f"\n¡ÉXITO! Se ha generado tu 'lista de trabajo' en: {ruta_salida}")
 
         else:
@@ -0,0 +1,95 @@
+# 01_MODELO_DATOS_Y_AUXILIARES/definicion_auditorias.py
+# Auditorías declarativas: dos conjuntos de llaves y las columnas a comparar. Las diferencias
+# se calculan en PostgreSQL (NOT EXISTS / FULL JOIN) y solo viajan las filas que difieren.
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_utils import leer_por_bloques, ITERSIZE
+
+# Estados que puede devolver una auditoría, en el orden en que se listan en el reporte.
+ESTADOS = ('solo_derecha', 'solo_izquierda', 'diferente')
+
+# Ejemplo de definición (ver auditoria_gestion_vendedores.py y auditoria_gestion_productos.py):
+#
+#   {
+#       'izquierda': ('gestion', "SELECT cod_rol_erp, empresa_erp, numero_documento FROM ..."),
+#       'derecha':   ('api', "SELECT cod_cliente_erp AS cod_rol_erp, empresa_erp, nit_documento AS numero_documento FROM ..."),
+#       'llaves': ['cod_rol_erp', 'empresa_erp'],
+#       'llaves_con_nulos': [],              # llaves que pueden venir NULL y deben emparejarse igual
+#       'comparar': ['numero_documento'],    # columnas que deben coincidir cuando la llave está en ambos lados
+#       'normalizar': 'TRIM({})',            # plantilla SQL aplicada a cada columna antes de comparar
+#       'estados': {'solo_derecha': 'NUEVO EN API', 'solo_izquierda': 'FALTA EN API', 'diferente': 'INCONSISTENCIA'},
+#   }
+#
+# Si 'estados' solo pide 'solo_izquierda', la auditoría es un anti-join (NOT EXISTS) y devuelve
+# todas las columnas de la consulta izquierda. En otro caso es un FULL JOIN que devuelve:
+# estado, las llaves y cada columna comparada con el sufijo de su lado (numero_documento_gestion, ...).
+
+
+def _sin_punto_y_coma(consulta):
+    return consulta.strip().rstrip(';')
+
+
+def _condicion_llaves(definicion, izq, der):
+    """Condición de emparejamiento por llaves. Las llaves con nulos se comparan como texto con COALESCE."""
+    con_nulos = set(definicion.get('llaves_con_nulos', []))
+    condiciones = []
+    for llave in definicion['llaves']:
+        if llave in con_nulos:
+            condiciones.append(f"COALESCE({izq}.{llave}::text, '') = COALESCE({der}.{llave}::text, '')")
+        else:
+            condiciones.append(f"{izq}.{llave} = {der}.{llave}")
+    return " AND ".join(condiciones)
+
+
+def construir_consulta(definicion):
+    """Arma la consulta SQL que devuelve únicamente las diferencias de la auditoría."""
+    alias_izq, consulta_izq = definicion['izquierda']
+    alias_der, consulta_der = definicion['derecha']
+    estados = definicion['estados']
+    no_soportados = set(estados) - set(ESTADOS)
+    if no_soportados:
+        raise ValueError(f"Estados de auditoría no soportados: {sorted(no_soportados)}")
+
+    # Solo interesa lo que falta del lado derecho: anti-join
+    if set(estados) == {'solo_izquierda'}:
+        return (f"WITH {alias_izq} AS ({_sin_punto_y_coma(consulta_izq)}),\n"
+                f"     {alias_der} AS ({_sin_punto_y_coma(consulta_der)})\n"
+                f"SELECT {alias_izq}.* FROM {alias_izq}\n"
+                f"WHERE NOT EXISTS (SELECT 1 FROM {alias_der} WHERE {_condicion_llaves(definicion, alias_der, alias_izq)})\n"
+                f"ORDER BY {', '.join(f'{alias_izq}.{l}' for l in definicion['llaves'])};")
+
+    normalizar = definicion.get('normalizar', '{}')
+    comparar = definicion.get('comparar', [])
+    diferente = " OR ".join(
+        f"{normalizar.format(f'{alias_izq}.{c}')} IS DISTINCT FROM {normalizar.format(f'{alias_der}.{c}')}"
+        for c in comparar
+    ) or 'FALSE'
+    # La columna _existe distingue "no hay fila de ese lado" de "la fila tiene una llave en NULL"
+    columnas = [f"CASE WHEN {alias_izq}._existe IS NULL THEN 'solo_derecha' "
+                f"WHEN {alias_der}._existe IS NULL THEN 'solo_izquierda' "
+                f"WHEN {diferente} THEN 'diferente' END AS estado"]
+    columnas += [f"COALESCE({alias_izq}.{l}, {alias_der}.{l}) AS {l}" for l in definicion['llaves']]
+    for c in comparar:
+        columnas += [f"{alias_izq}.{c} AS {c}_{alias_izq}", f"{alias_der}.{c} AS {c}_{alias_der}"]
+
+    pedidos = [e for e in ESTADOS if e in estados]
+    etiqueta = "CASE estado " + " ".join(f"WHEN '{e}' THEN '{estados[e]}'" for e in pedidos) + " END"
+    orden = "CASE estado " + " ".join(f"WHEN '{e}' THEN {i}" for i, e in enumerate(pedidos)) + " END"
+    return (f"WITH {alias_izq} AS (SELECT q.*, TRUE AS _existe FROM ({_sin_punto_y_coma(consulta_izq)}) AS q),\n"
+            f"     {alias_der} AS (SELECT q.*, TRUE AS _existe FROM ({_sin_punto_y_coma(consulta_der)}) AS q)\n"
+            f"SELECT {etiqueta} AS estado, {', '.join(definicion['llaves'])}"
+            f"{''.join(f', {c}_{alias_izq}, {c}_{alias_der}' for c in comparar)}\n"
+            f"FROM (\n"
+            f"    SELECT {', '.join(columnas)}\n"
+            f"    FROM {alias_izq} FULL JOIN {alias_der} ON {_condicion_llaves(definicion, alias_izq, alias_der)}\n"
+            f") AS diferencias\n"
+            f"WHERE estado IN ({', '.join(repr(e) for e in pedidos)})\n"
+            f"ORDER BY {orden}, {', '.join(definicion['llaves'])};")
+
+
+def ejecutar_auditoria(conn, definicion, tamano_bloque=ITERSIZE):
+    """Ejecuta la auditoría y entrega las diferencias por bloques (DataFrames) con un cursor del servidor."""
+    return leer_por_bloques(conn, construir_consulta(definicion), tamano_bloque=tamano_bloque)
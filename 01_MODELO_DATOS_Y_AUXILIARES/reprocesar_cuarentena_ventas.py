@@ -0,0 +1,70 @@
+# 01_MODELO_DATOS_Y_AUXILIARES/reprocesar_cuarentena_ventas.py
+
+import pandas as pd
+import sys
+import os
+
+RAIZ_PROYECTO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(RAIZ_PROYECTO)
+sys.path.append(os.path.join(RAIZ_PROYECTO, '00_ETL_TNS'))
+from db_utils import get_db_connection
+from instrumentacion import medir_etapa, registrar_metricas
+from cargar_ventas_api import (
+    MAPEO_COLUMNAS_API, tipar_ventas, deduplicar_ventas, leer_mapas_ventas, enriquecer_ventas,
+    insertar_hechos_ventas, guardar_en_cuarentena
+)
+from resumen_margenes import refrescar_resumen_margenes
+from clasificacion_abc import refrescar_ventas_diarias
+
+def reprocesar_cuarentena_ventas():
+    """
+    Vuelve a enriquecer, en bloque y sin llamar a la API, las líneas de venta en cuarentena.
+    Las que ya encuentran todas sus dimensiones (producto, cliente, vendedor, bodega) pasan a
+    hechos_ventas; las demás se quedan con el motivo actualizado y un intento más.
+    """
+    print("=== INICIO DEL REPROCESO DE VENTAS EN CUARENTENA ===")
+    conn = get_db_connection()
+    if not conn: return
+
+    try:
+        with medir_etapa('cuarentena_ventas', 'reproceso') as etapa:
+            columnas_linea = ['empresa_erp'] + list(MAPEO_COLUMNAS_API.values())
+            df_cuarentena = pd.read_sql_query(f"SELECT {', '.join(columnas_linea)} FROM cuarentena_ventas;", conn)
+            etapa['filas_entrada'] = len(df_cuarentena)
+            if df_cuarentena.empty:
+                print("INFO: No hay ventas en cuarentena.")
+                return
+            print(f"INFO: Se reprocesarán {len(df_cuarentena)} líneas en cuarentena.")
+
+            # Mismo enriquecimiento del ETL diario (sin registrarlo como etapa de 'ventas')
+            df = deduplicar_ventas(tipar_ventas(df_cuarentena))
+            mapas = leer_mapas_ventas(conn, list(df['empresa_erp'].dropna().astype(str).unique()))
+            df_validas, df_rechazadas = enriquecer_ventas(df, mapas)
+            etapa['filas_salida'] = len(df_validas)
+
+            with conn.cursor() as cursor:
+                promovidas = 0
+                if not df_validas.empty:
+                    # insertar_hechos_ventas también las saca de la cuarentena (y reemplaza una versión anterior ya cargada)
+                    promovidas, dias_reemplazados = insertar_hechos_ventas(cursor, df_validas)
+                    # Las líneas promovidas cambian el resumen de márgenes y las ventas diarias de sus fechas
+                    dias = set(pd.to_datetime(df_validas['fecha_sk']).dt.date) | set(dias_reemplazados)
+                    refrescar_resumen_margenes(cursor, {d.replace(day=1) for d in dias})
+                    refrescar_ventas_diarias(cursor, dias)
+                # Las que siguen sin dimensiones: se actualiza el motivo y se suma el intento
+                pendientes = guardar_en_cuarentena(cursor, df_rechazadas)
+                conn.commit()
+            registrar_metricas(filas_afectadas_bd=promovidas + pendientes)
+
+        print(f"\n¡ÉXITO! {promovidas} líneas promovidas a 'hechos_ventas'. {pendientes} siguen en cuarentena.")
+        if pendientes:
+            print(f"INFO: Motivos pendientes: {df_rechazadas['motivo_rechazo'].value_counts().to_dict()}")
+
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante el reproceso de la cuarentena de ventas: {e}")
+        conn.rollback()
+    finally:
+        if conn: conn.close()
+
+if __name__ == '__main__':
+    reprocesar_cuarentena_ventas()
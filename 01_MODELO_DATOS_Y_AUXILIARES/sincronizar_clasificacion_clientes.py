@@ -5,15 +5,24 @@ import sys
 import os
 from io import StringIO
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+RAIZ_PROYECTO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(RAIZ_PROYECTO)
+sys.path.append(os.path.join(RAIZ_PROYECTO, '00_ETL_TNS'))
 import config
-from db_utils import get_db_connection, execute_query
+from db_utils import get_db_connection
+from historia_clasificacion_clientes import reasignar_clasificacion_ventas
+
+COLUMNAS_CLASIFICACION = [
+    'id_maestro_cliente_fk', 'canal', 'subcanal', 'sucursal',
+    'dia_visita', 'fecha_inicio_validez', 'fecha_fin_validez'
+]
 
 def sincronizar_clasificacion_clientes():
     """
     Lee el CSV de clasificación histórica y lo carga en la tabla
     dim_clientes_clasificacion_historia.
-    Este método TRUNCATE e INSERT asume que el CSV es la fuente de verdad completa.
+    Asume que el CSV es la fuente de verdad completa: inserta las versiones nuevas, borra las
+    que ya no están y recalcula la clasificación de las ventas de los clientes afectados.
     """
     print("=== INICIO DE LA SINCRONIZACIÓN DE CLASIFICACIÓN DE CLIENTES ===")
     
@@ -46,33 +55,45 @@ def sincronizar_clasificacion_clientes():
         df_para_carga['id_maestro_cliente_fk'] = df_para_carga['id_maestro_cliente_fk'].astype(int)
 
         # --- PASO 4: Cargar los datos en la tabla ---
-        # Para tablas de gestión como esta, un método simple y robusto es borrar y recargar.
-        # Esto asegura que la tabla sea siempre un reflejo exacto de tu CSV.
-        
-        # 4.1: Vaciar la tabla
-        execute_query(conn, 'TRUNCATE TABLE dim_clientes_clasificacion_historia RESTART IDENTITY;')
-        print("INFO: La tabla 'dim_clientes_clasificacion_historia' ha sido vaciada.")
-
-        # 4.2: Cargar los nuevos datos
-        columnas_db = [
-            'id_maestro_cliente_fk', 'canal', 'subcanal', 'sucursal', 
-            'dia_visita', 'fecha_inicio_validez', 'fecha_fin_validez'
-        ]
-        
+        # La tabla queda como reflejo exacto del CSV, pero las versiones que no cambiaron conservan su
+        # id: hechos_ventas apunta a ellas (id_clasificacion_historia_fk) y así no hay que tocar sus ventas.
         # Asegurarnos de que solo usamos las columnas que existen
-        columnas_presentes = [col for col in columnas_db if col in df_para_carga.columns]
+        columnas_presentes = [col for col in COLUMNAS_CLASIFICACION if col in df_para_carga.columns]
         df_final = df_para_carga[columnas_presentes]
+        coincide = " AND ".join(f"t.{c} IS NOT DISTINCT FROM h.{c}" for c in columnas_presentes)
         
         buffer = StringIO()
         df_final.to_csv(buffer, index=False, header=False, sep=',')
         buffer.seek(0)
         
         with conn.cursor() as cursor:
-            copy_sql = f'COPY dim_clientes_clasificacion_historia ({",".join(columnas_presentes)}) FROM STDIN WITH (FORMAT CSV, DELIMITER \',\')'
+            cursor.execute("CREATE TEMP TABLE tmp_clasificacion (LIKE dim_clientes_clasificacion_historia INCLUDING DEFAULTS) ON COMMIT DROP;")
+            copy_sql = f'COPY tmp_clasificacion ({",".join(columnas_presentes)}) FROM STDIN WITH (FORMAT CSV, DELIMITER \',\')'
             cursor.copy_expert(copy_sql, buffer)
+
+            # 4.1: Versiones que ya no están en el CSV
+            cursor.execute(f"""
+                SELECT h.id_clasificacion_historia, h.id_maestro_cliente_fk FROM dim_clientes_clasificacion_historia h
+                WHERE NOT EXISTS (SELECT 1 FROM tmp_clasificacion t WHERE {coincide});
+            """)
+            obsoletas = cursor.fetchall()
+            # 4.2: Versiones nuevas del CSV
+            cursor.execute(f"""
+                INSERT INTO dim_clientes_clasificacion_historia ({",".join(columnas_presentes)})
+                SELECT {",".join(f"t.{c}" for c in columnas_presentes)} FROM tmp_clasificacion t
+                WHERE NOT EXISTS (SELECT 1 FROM dim_clientes_clasificacion_historia h WHERE {coincide})
+                RETURNING id_maestro_cliente_fk;
+            """)
+            nuevas = cursor.fetchall()
+            # 4.3: Las ventas de los maestros afectados se reasignan antes de borrar las versiones obsoletas
+            maestros = {m for _, m in obsoletas} | {m for (m,) in nuevas}
+            reasignar_clasificacion_ventas(cursor, maestros, excluir=[i for i, _ in obsoletas])
+            cursor.execute("DELETE FROM dim_clientes_clasificacion_historia WHERE id_clasificacion_historia = ANY(%s);",
+                           ([i for i, _ in obsoletas],))
         
         conn.commit()
-        print(f"¡ÉXITO! Se han cargado {len(df_final)} registros en 'dim_clientes_clasificacion_historia'.")
+        print(f"¡ÉXITO! 'dim_clientes_clasificacion_historia' sincronizada con {len(df_final)} registros: "
+              f"{len(nuevas)} nuevos y {len(obsoletas)} eliminados.")
 
     except Exception as e:
         print(f"ERROR CRÍTICO durante la sincronización: {e}")
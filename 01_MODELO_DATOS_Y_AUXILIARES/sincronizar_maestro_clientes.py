@@ -5,9 +5,12 @@ import sys
 import os
 from psycopg2 import extras
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+RAIZ_PROYECTO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(RAIZ_PROYECTO)
+sys.path.append(os.path.join(RAIZ_PROYECTO, '00_ETL_TNS'))
 import config
 from db_utils import get_db_connection
+from historia_clasificacion_clientes import reasignar_clasificacion_ventas
 
 def sincronizar_maestro_clientes():
     """
@@ -58,12 +61,16 @@ def sincronizar_maestro_clientes():
             SET id_maestro_cliente_fk = mc.id_maestro_cliente
             FROM maestro_clientes mc
             WHERE dce.cod_cliente_erp = mc.cod_cliente_maestro 
-              AND dce.id_maestro_cliente_fk IS NULL;
+              AND dce.id_maestro_cliente_fk IS NULL
+            RETURNING dce.id_maestro_cliente_fk;
         """
         with conn.cursor() as cursor:
             cursor.execute(link_query)
             # cursor.rowcount nos dirá cuántos "espacios en blanco" se rellenaron.
             print(f"INFO: {cursor.rowcount} registros de 'dim_clientes_empresa' fueron enlazados al maestro.")
+            # Las ventas ya cargadas de los clientes recién enlazados toman la clasificación de su maestro
+            maestros_enlazados = {fila[0] for fila in cursor.fetchall()}
+            reasignar_clasificacion_ventas(cursor, maestros_enlazados)
         
         # Guardamos todos los cambios en la base de datos.
         conn.commit()
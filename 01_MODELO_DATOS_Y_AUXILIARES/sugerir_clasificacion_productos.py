@@ -0,0 +1,199 @@
+# 01_MODELO_DATOS_Y_AUXILIARES/sugerir_clasificacion_productos.py
+
+import pandas as pd
+import numpy as np
+import sys
+import os
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+from db_utils import get_db_connection
+from auditoria_gestion_productos import obtener_productos_pendientes
+
+# --- Parámetros del motor de sugerencias ---
+# Número de vecinos que votan la clasificación sugerida.
+K_VECINOS = 5
+# Peso relativo de cada bloque de atributos en el vector del producto.
+PESO_DESCRIPCION = 1.0
+PESO_ATRIBUTOS = 0.5
+# Filas pendientes que se multiplican a la vez contra toda la referencia (controla la memoria).
+TAMANO_LOTE = 2000
+
+# Columnas de gestion_productos_aux que se sugieren por votación entre vecinos.
+COLUMNAS_CATEGORICAS = ['categoria_gestion', 'subcategoria_1_gestion', 'subcategoria_2_gestion', 'clasificacion_py']
+# Mismo orden que la lista de trabajo (y gestion_productos_aux.csv) para poder copiar las filas directamente.
+COLUMNAS_LISTA_TRABAJO = [
+    'codigo_erp', 'referencia', 'categoria_gestion', 'subcategoria_1_gestion', 'subcategoria_2_gestion',
+    'descripcion_guia', 'clasificacion_py', 'equivalencia_py', 'peso_neto'
+]
+
+
+def _texto_atributos(df):
+    """Convierte marca, línea y grupo en tokens con prefijo para que no se mezclen entre sí."""
+    return (
+        'M_' + df['cod_marca_erp'].fillna('').astype(str) + ' '
+        + 'L_' + df['cod_linea_erp'].fillna('').astype(str) + ' '
+        + 'G_' + df['cod_grupo_erp'].fillna('').astype(str)
+    )
+
+
+def vectorizar_productos(df_pendientes, df_referencia):
+    """
+    Construye las matrices dispersas (CSR) de ambos conjuntos con el mismo vocabulario:
+    n-gramas de caracteres TF-IDF de la descripción más los tokens de marca, línea y grupo.
+    Cada fila queda normalizada (L2), por lo que el producto punto es la similitud coseno.
+    """
+    descripciones = pd.concat([df_pendientes['descripcion_erp'], df_referencia['descripcion_erp']]).fillna('').str.upper()
+    atributos = pd.concat([_texto_atributos(df_pendientes), _texto_atributos(df_referencia)])
+
+    vect_descripcion = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4), sublinear_tf=True, dtype=np.float32)
+    vect_atributos = TfidfVectorizer(analyzer='word', token_pattern=r'\S+', lowercase=False, dtype=np.float32)
+
+    matriz = sparse.hstack([
+        PESO_DESCRIPCION * vect_descripcion.fit_transform(descripciones),
+        PESO_ATRIBUTOS * vect_atributos.fit_transform(atributos),
+    ]).tocsr()
+    matriz = normalize(matriz, norm='l2', copy=False)
+
+    n = len(df_pendientes)
+    return matriz[:n], matriz[n:]
+
+
+def buscar_vecinos(matriz_pendientes, matriz_referencia, k=K_VECINOS):
+    """
+    Busca los k productos de referencia más parecidos a cada pendiente.
+    La similitud se calcula por lotes como un producto de matrices dispersas (pendientes x referencia^T).
+    """
+    k = min(k, matriz_referencia.shape[0])
+    referencia_t = matriz_referencia.T.tocsc()
+    indices = np.empty((matriz_pendientes.shape[0], k), dtype=np.int64)
+    similitudes = np.empty((matriz_pendientes.shape[0], k), dtype=np.float32)
+
+    for inicio in range(0, matriz_pendientes.shape[0], TAMANO_LOTE):
+        fin = inicio + TAMANO_LOTE
+        bloque = (matriz_pendientes[inicio:fin] @ referencia_t).toarray()
+        # argpartition deja los k mayores al final sin ordenar toda la fila
+        top = np.argpartition(bloque, -k, axis=1)[:, -k:]
+        top_sim = np.take_along_axis(bloque, top, axis=1)
+        orden = np.argsort(-top_sim, axis=1)
+        indices[inicio:fin] = np.take_along_axis(top, orden, axis=1)
+        similitudes[inicio:fin] = np.take_along_axis(top_sim, orden, axis=1)
+
+    return indices, similitudes
+
+
+def votar_columna(valores_referencia, indices, similitudes):
+    """
+    Elige, para cada pendiente, el valor con mayor similitud acumulada entre sus vecinos.
+    Devuelve el valor sugerido y la fracción del voto que obtuvo (0 a 1).
+    """
+    codigos, categorias = pd.factorize(valores_referencia)
+    n, k = indices.shape
+    votos = pd.DataFrame({
+        'fila': np.repeat(np.arange(n), k),
+        'codigo': codigos[indices.ravel()],
+        'peso': similitudes.ravel(),
+    })
+    votos = votos[votos['codigo'] >= 0]
+    total = votos.groupby('fila')['peso'].sum()
+    por_valor = votos.groupby(['fila', 'codigo'], as_index=False)['peso'].sum()
+    ganador = por_valor.sort_values('peso', ascending=False).drop_duplicates('fila').set_index('fila')
+
+    sugerido = pd.Series(pd.NA, index=range(n), dtype=object)
+    proporcion = pd.Series(0.0, index=range(n))
+    sugerido.loc[ganador.index] = categorias[ganador['codigo'].to_numpy()]
+    proporcion.loc[ganador.index] = (ganador['peso'] / total.loc[ganador.index]).to_numpy()
+    return sugerido, proporcion
+
+
+def sugerir_clasificaciones(df_pendientes, df_referencia):
+    """
+    Rellena la lista de trabajo de productos pendientes con la clasificación de sus
+    vecinos más cercanos entre los productos ya clasificados, junto con un puntaje de confianza.
+    """
+    df_pendientes = df_pendientes.reset_index(drop=True)
+    df_referencia = df_referencia.reset_index(drop=True)
+
+    matriz_pend, matriz_ref = vectorizar_productos(df_pendientes, df_referencia)
+    indices, similitudes = buscar_vecinos(matriz_pend, matriz_ref)
+
+    df_salida = df_pendientes[['codigo_erp', 'referencia']].copy()
+    proporciones = []
+    for col in COLUMNAS_CATEGORICAS:
+        df_salida[col], proporcion = votar_columna(df_referencia[col], indices, similitudes)
+        proporciones.append(proporcion)
+
+    # La descripción guía se deja con la del ERP; el peso y la equivalencia se toman del vecino más parecido.
+    df_salida['descripcion_guia'] = df_pendientes['descripcion_erp']
+    vecino = indices[:, 0]
+    df_salida['equivalencia_py'] = df_referencia['equivalencia_py'].to_numpy()[vecino]
+    df_salida['peso_neto'] = df_referencia['peso_neto'].to_numpy()[vecino]
+
+    # Confianza: similitud con el vecino más cercano por el acuerdo promedio entre los vecinos.
+    acuerdo = np.mean(np.vstack([p.to_numpy() for p in proporciones]), axis=0)
+    df_salida['confianza_sugerencia'] = np.round(similitudes[:, 0] * acuerdo, 4)
+    df_salida['codigo_erp_similar'] = df_referencia['codigo_erp'].to_numpy()[vecino]
+    df_salida['descripcion_similar'] = df_referencia['descripcion_erp'].to_numpy()[vecino]
+
+    columnas = COLUMNAS_LISTA_TRABAJO + ['confianza_sugerencia', 'codigo_erp_similar', 'descripcion_similar']
+    return df_salida[columnas].sort_values('confianza_sugerencia', ascending=False)
+
+
+def sugerir_clasificacion_productos():
+    """
+    Genera la lista de trabajo de productos pendientes por clasificar con los
+    valores sugeridos a partir de los productos ya clasificados más parecidos.
+    """
+    print("=== INICIO DE LA SUGERENCIA DE CLASIFICACIÓN DE PRODUCTOS ===")
+    conn = get_db_connection()
+    if not conn: return
+
+    try:
+        df_pendientes = obtener_productos_pendientes(conn)
+        if df_pendientes.empty:
+            print("\n¡EXCELENTE! No hay productos pendientes por clasificar.")
+            return
+
+        # Atributos del ERP de cada producto (la clasificación es global, así que basta una empresa)
+        query_atributos = """
+            SELECT DISTINCT ON (codigo_erp, referencia)
+                codigo_erp, referencia, cod_marca_erp, cod_linea_erp, cod_grupo_erp
+            FROM dim_productos
+            ORDER BY codigo_erp, referencia, empresa_erp;
+        """
+        df_atributos = pd.read_sql_query(query_atributos, conn)
+        df_pendientes = pd.merge(df_pendientes, df_atributos, on=['codigo_erp', 'referencia'], how='left')
+
+        query_referencia = f"""
+            SELECT DISTINCT ON (dp.codigo_erp, dp.referencia)
+                dp.codigo_erp, dp.referencia, dp.descripcion_erp,
+                dp.cod_marca_erp, dp.cod_linea_erp, dp.cod_grupo_erp,
+                {", ".join(f"gpa.{col}" for col in COLUMNAS_CATEGORICAS)},
+                gpa.equivalencia_py, gpa.peso_neto
+            FROM gestion_productos_aux gpa
+            JOIN dim_productos dp ON gpa.id_producto_fk = dp.id_producto
+            ORDER BY dp.codigo_erp, dp.referencia;
+        """
+        df_referencia = pd.read_sql_query(query_referencia, conn)
+        print(f"INFO: Se usarán {len(df_referencia)} productos clasificados como referencia.")
+        if df_referencia.empty:
+            print("ADVERTENCIA: No hay productos clasificados que sirvan de referencia.")
+            return
+
+        df_salida = sugerir_clasificaciones(df_pendientes, df_referencia)
+
+        ruta_salida = os.path.join(config.INFORMES_GENERADOS_DIR, 'sugerencias_clasificacion_productos.csv')
+        df_salida.to_csv(ruta_salida, index=False)
+        print(f"\n¡ÉXITO! Se sugirió la clasificación de {len(df_salida)} productos.")
+        print(f"Se ha generado un reporte en: {ruta_salida}")
+
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante la sugerencia de clasificación de productos: {e}")
+    finally:
+        if conn: conn.close()
+
+if __name__ == '__main__':
+    sugerir_clasificacion_productos()
@@ -0,0 +1,258 @@
+# 01_MODELO_DATOS_Y_AUXILIARES/sugerir_enlaces_clientes.py
+
+import pandas as pd
+import numpy as np
+import sys
+import os
+import unicodedata
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+from db_utils import get_db_connection
+
+# --- Parámetros del emparejador ---
+# Pesos de cada componente en el puntaje final (deben sumar 1).
+PESOS_PUNTAJE = {'nit': 0.5, 'nombre': 0.35, 'direccion': 0.15}
+# Longitud del prefijo de NIT que se usa como bloque.
+LONGITUD_PREFIJO_NIT = 6
+# Cada registro se indexa solo por sus N tokens de nombre más raros.
+MAX_TOKENS_POR_REGISTRO = 3
+# Bloques (prefijos de NIT o tokens) con más registros de referencia que este límite no se usan.
+MAX_TAMANO_BLOQUE = 500
+# Cuántas sugerencias se entregan por cliente pendiente y puntaje mínimo para reportarlas.
+MAX_SUGERENCIAS_POR_CLIENTE = 3
+PUNTAJE_MINIMO = 0.45
+# Tamaño de los lotes de pares al calcular la similitud (controla la memoria).
+TAMANO_LOTE_PARES = 500_000
+
+# Palabras que no aportan a la identidad del cliente (formas societarias, conectores).
+PALABRAS_VACIAS_NOMBRE = {
+    'SAS', 'SA', 'LTDA', 'CIA', 'Y', 'DE', 'DEL', 'LA', 'LAS', 'EL', 'LOS',
+    'E', 'EU', 'SC', 'SCA', 'EN', 'C', 'S', 'A'
+}
+# Abreviaturas estándar de nomenclatura de direcciones en Colombia.
+ABREVIATURAS_DIRECCION = {
+    'CALLE': 'CL', 'CLL': 'CL', 'CARRERA': 'KR', 'CRA': 'KR', 'CR': 'KR', 'KRA': 'KR',
+    'AVENIDA': 'AV', 'AVDA': 'AV', 'DIAGONAL': 'DG', 'DIAG': 'DG', 'TRANSVERSAL': 'TV',
+    'TRANS': 'TV', 'TR': 'TV', 'MANZANA': 'MZ', 'MZA': 'MZ', 'BARRIO': 'BR', 'BRR': 'BR',
+    'NUMERO': '', 'NO': '', 'NRO': '', 'N': ''
+}
+
+
+def _quitar_tildes(serie):
+    """Pasa a mayúsculas y elimina tildes y caracteres especiales de una serie de texto."""
+    serie = serie.fillna('').astype(str).str.upper()
+    return serie.map(lambda s: unicodedata.normalize('NFKD', s).encode('ascii', 'ignore').decode('ascii'))
+
+
+def normalizar_nit(serie):
+    """Deja solo los dígitos del NIT, sin dígito de verificación ni ceros a la izquierda."""
+    serie = serie.fillna('').astype(str).str.split('-').str[0]
+    return serie.str.replace(r'\D', '', regex=True).str.lstrip('0')
+
+
+def normalizar_nombre(serie):
+    """Nombre en mayúsculas, sin tildes, sin puntuación ni formas societarias."""
+    serie = _quitar_tildes(serie).str.replace(r'[^A-Z0-9 ]', ' ', regex=True)
+    return serie.map(lambda s: ' '.join(t for t in s.split() if t not in PALABRAS_VACIAS_NOMBRE))
+
+
+def normalizar_direccion(serie):
+    """Dirección en mayúsculas, sin tildes y con la nomenclatura abreviada de forma estándar."""
+    serie = _quitar_tildes(serie).str.replace(r'[^A-Z0-9 ]', ' ', regex=True)
+    # Separamos números pegados a letras (ej. "CL45A" -> "CL 45A") para que las abreviaturas coincidan
+    serie = serie.str.replace(r'^([A-Z]+)(\d)', r'\1 \2', regex=True)
+    return serie.map(lambda s: ' '.join(filter(None, (ABREVIATURAS_DIRECCION.get(t, t) for t in s.split()))))
+
+
+def preparar_registros(df):
+    """Añade a un DataFrame de clientes las columnas normalizadas usadas para bloquear y puntuar."""
+    df = df.copy()
+    df['nit_norm'] = normalizar_nit(df['nit'])
+    df['nombre_norm'] = normalizar_nombre(df['nombre'])
+    df['direccion_norm'] = normalizar_direccion(df['direccion'])
+    return df.reset_index(drop=True)
+
+
+def _llaves_nit(nits):
+    """Llave de bloque por NIT: su prefijo; el NIT completo se usa cuando el prefijo es muy común."""
+    nits = nits[nits.str.len() >= LONGITUD_PREFIJO_NIT]
+    return pd.DataFrame({'pos': nits.index, 'prefijo': 'N:' + nits.str[:LONGITUD_PREFIJO_NIT], 'completo': 'N:' + nits})
+
+
+def _frecuencia_nits(df_referencia):
+    """Registros de referencia por llave de NIT (prefijos y NIT completos)."""
+    llaves = _llaves_nit(df_referencia['nit_norm'])
+    return pd.concat([llaves['prefijo'], llaves['completo']]).value_counts()
+
+
+def _llaves_de_bloque(df, frecuencia_tokens, frecuencia_nits):
+    """
+    Construye el índice invertido (posición del registro -> llave de bloque).
+    Cada registro aporta su prefijo de NIT y sus tokens de nombre más raros.
+    """
+    # Bloque 1: prefijo del NIT normalizado. En rangos densos (ej. 900xxx) se pasa al NIT completo, y
+    # los NIT genéricos (ej. 222222222) se descartan: bloques de miles volverían a la comparación cuadrática
+    llaves = _llaves_nit(df['nit_norm'])
+    prefijo_grande = llaves['prefijo'].map(frecuencia_nits).fillna(0) > MAX_TAMANO_BLOQUE
+    llaves['llave'] = llaves['prefijo'].where(~prefijo_grande, llaves['completo'])
+    llaves = llaves[llaves['llave'].map(frecuencia_nits).fillna(0) <= MAX_TAMANO_BLOQUE]
+    bloques_nit = llaves[['pos', 'llave']]
+
+    # Bloque 2: tokens del nombre (solo los más discriminantes de cada registro)
+    tokens = df['nombre_norm'].str.split().explode().dropna()
+    tokens = tokens[tokens.str.len() >= 3]
+    tokens = tokens.to_frame('token').reset_index(names='pos').drop_duplicates()
+    tokens['frecuencia'] = tokens['token'].map(frecuencia_tokens).fillna(0)
+    tokens = tokens[tokens['frecuencia'].between(1, MAX_TAMANO_BLOQUE)]
+    tokens = tokens.sort_values(['pos', 'frecuencia']).groupby('pos').head(MAX_TOKENS_POR_REGISTRO)
+    bloques_nombre = pd.DataFrame({'pos': tokens['pos'], 'llave': 'T:' + tokens['token']})
+
+    return pd.concat([bloques_nit, bloques_nombre], ignore_index=True)
+
+
+def generar_pares_candidatos(df_pendientes, df_referencia):
+    """
+    Cruza los índices de bloque de ambos conjuntos. Solo se comparan los pares
+    que comparten al menos un bloque, evitando la comparación cuadrática.
+    """
+    tokens_ref = df_referencia['nombre_norm'].str.split().explode().dropna()
+    frecuencia_tokens = tokens_ref.groupby(tokens_ref).size()
+
+    frecuencia_nits = _frecuencia_nits(df_referencia)
+
+    bloques_pend = _llaves_de_bloque(df_pendientes, frecuencia_tokens, frecuencia_nits)
+    bloques_ref = _llaves_de_bloque(df_referencia, frecuencia_tokens, frecuencia_nits)
+
+    pares = pd.merge(bloques_pend, bloques_ref, on='llave', suffixes=('_pend', '_ref'))
+    pares = pares[['pos_pend', 'pos_ref']].drop_duplicates().reset_index(drop=True)
+    return pares
+
+
+def _similitud_por_pares(textos_pend, textos_ref, pos_pend, pos_ref):
+    """
+    Similitud coseno de n-gramas de caracteres (TF-IDF) para una lista de pares.
+    Se calcula como el producto elemento a elemento de las filas dispersas, por lotes.
+    """
+    vectorizador = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 3), dtype=np.float32)
+    vectorizador.fit(pd.concat([textos_pend, textos_ref], ignore_index=True))
+    matriz_pend = vectorizador.transform(textos_pend)
+    matriz_ref = vectorizador.transform(textos_ref)
+
+    resultado = np.zeros(len(pos_pend), dtype=np.float32)
+    for inicio in range(0, len(pos_pend), TAMANO_LOTE_PARES):
+        fin = inicio + TAMANO_LOTE_PARES
+        producto = matriz_pend[pos_pend[inicio:fin]].multiply(matriz_ref[pos_ref[inicio:fin]])
+        resultado[inicio:fin] = np.asarray(producto.sum(axis=1)).ravel()
+    return resultado
+
+
+def puntuar_pares(pares, df_pendientes, df_referencia):
+    """Calcula los puntajes de NIT, nombre y dirección para todos los pares de forma vectorizada."""
+    pos_pend = pares['pos_pend'].to_numpy()
+    pos_ref = pares['pos_ref'].to_numpy()
+
+    nit_pend = df_pendientes['nit_norm'].to_numpy()[pos_pend]
+    nit_ref = df_referencia['nit_norm'].to_numpy()[pos_ref]
+    pares['puntaje_nit'] = ((nit_pend == nit_ref) & (nit_pend != '')).astype(np.float32)
+
+    pares['puntaje_nombre'] = _similitud_por_pares(df_pendientes['nombre_norm'], df_referencia['nombre_norm'], pos_pend, pos_ref)
+    pares['puntaje_direccion'] = _similitud_por_pares(df_pendientes['direccion_norm'], df_referencia['direccion_norm'], pos_pend, pos_ref)
+
+    pares['puntaje'] = (
+        PESOS_PUNTAJE['nit'] * pares['puntaje_nit']
+        + PESOS_PUNTAJE['nombre'] * pares['puntaje_nombre']
+        + PESOS_PUNTAJE['direccion'] * pares['puntaje_direccion']
+    ).round(4)
+    return pares
+
+
+def emparejar_clientes(df_pendientes, df_referencia):
+    """
+    Devuelve, por cada cliente pendiente, las mejores sugerencias de cliente maestro.
+    Ambos DataFrames deben traer las columnas 'nit', 'nombre' y 'direccion'.
+    """
+    df_pendientes = preparar_registros(df_pendientes)
+    df_referencia = preparar_registros(df_referencia)
+
+    pares = generar_pares_candidatos(df_pendientes, df_referencia)
+    print(f"INFO: Se generaron {len(pares)} pares candidatos "
+          f"(vs. {len(df_pendientes) * len(df_referencia)} de una comparación total).")
+    if pares.empty:
+        return pd.DataFrame()
+
+    pares = puntuar_pares(pares, df_pendientes, df_referencia)
+
+    # Un mismo maestro puede aparecer varias veces (un registro por empresa): nos quedamos con el mejor.
+    pares['id_maestro_cliente'] = df_referencia['id_maestro_cliente'].to_numpy()[pares['pos_ref'].to_numpy()]
+    pares = pares[pares['puntaje'] >= PUNTAJE_MINIMO]
+    pares = pares.sort_values(['pos_pend', 'puntaje'], ascending=[True, False])
+    pares = pares.drop_duplicates(subset=['pos_pend', 'id_maestro_cliente'])
+    pares['ranking'] = pares.groupby('pos_pend').cumcount() + 1
+    pares = pares[pares['ranking'] <= MAX_SUGERENCIAS_POR_CLIENTE]
+
+    sugerencias = pd.concat([
+        df_pendientes.loc[pares['pos_pend'], ['cod_cliente_erp', 'empresa_erp', 'nit', 'nombre', 'direccion']].reset_index(drop=True),
+        df_referencia.loc[pares['pos_ref'], ['cod_cliente_maestro', 'nombre_unificado']].reset_index(drop=True),
+        pares[['ranking', 'puntaje', 'puntaje_nit', 'puntaje_nombre', 'puntaje_direccion']].reset_index(drop=True),
+    ], axis=1)
+    return sugerencias
+
+
+def sugerir_enlaces_clientes():
+    """
+    Busca, para los clientes de dim_clientes_empresa que aún no tienen maestro,
+    los clientes maestros más parecidos (NIT, nombre y dirección) y genera un CSV
+    con las sugerencias ordenadas para revisar antes de editar maestro_clientes.csv.
+    """
+    print("=== INICIO DE LA SUGERENCIA DE ENLACES A CLIENTES MAESTROS ===")
+    conn = get_db_connection()
+    if not conn: return
+
+    try:
+        query_pendientes = """
+            SELECT cod_cliente_erp, empresa_erp, nit, nombre_erp AS nombre, direccion_erp AS direccion
+            FROM dim_clientes_empresa
+            WHERE id_maestro_cliente_fk IS NULL;
+        """
+        df_pendientes = pd.read_sql_query(query_pendientes, conn)
+        print(f"INFO: Se encontraron {len(df_pendientes)} clientes sin enlazar al maestro.")
+
+        # La referencia son los registros ya enlazados (aportan NIT y dirección) más el propio
+        # nombre unificado del maestro, para cubrir maestros que aún no tienen registros enlazados.
+        query_referencia = """
+            SELECT mc.id_maestro_cliente, mc.cod_cliente_maestro, mc.nombre_unificado,
+                   dce.nit, dce.nombre_erp AS nombre, dce.direccion_erp AS direccion
+            FROM maestro_clientes mc
+            JOIN dim_clientes_empresa dce ON dce.id_maestro_cliente_fk = mc.id_maestro_cliente
+            UNION ALL
+            SELECT mc.id_maestro_cliente, mc.cod_cliente_maestro, mc.nombre_unificado,
+                   NULL, mc.nombre_unificado, NULL
+            FROM maestro_clientes mc;
+        """
+        df_referencia = pd.read_sql_query(query_referencia, conn)
+        print(f"INFO: Se leyeron {len(df_referencia)} registros de referencia del maestro de clientes.")
+
+        if df_pendientes.empty or df_referencia.empty:
+            print("\nINFO: No hay datos suficientes para generar sugerencias.")
+            return
+
+        df_sugerencias = emparejar_clientes(df_pendientes, df_referencia)
+
+        if not df_sugerencias.empty:
+            ruta_salida = os.path.join(config.INFORMES_GENERADOS_DIR, 'sugerencias_enlace_clientes.csv')
+            df_sugerencias.to_csv(ruta_salida, index=False)
+            clientes_con_sugerencia = df_sugerencias[['cod_cliente_erp', 'empresa_erp']].drop_duplicates()
+            print(f"\n¡ÉXITO! Se sugirieron enlaces para {len(clientes_con_sugerencia)} clientes.")
+            print(f"Se ha generado un reporte en: {ruta_salida}")
+        else:
+            print("\nINFO: No se encontraron coincidencias con puntaje suficiente.")
+
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante la sugerencia de enlaces de clientes: {e}")
+    finally:
+        if conn: conn.close()
+
+if __name__ == '__main__':
+    sugerir_enlaces_clientes()
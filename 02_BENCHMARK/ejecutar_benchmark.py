@@ -0,0 +1,226 @@
+# 02_BENCHMARK/ejecutar_benchmark.py
+
+import os
+import sys
+import io
+import json
+import glob
+import time
+import argparse
+import subprocess
+import contextlib
+from datetime import datetime
+
+from psycopg2 import extras
+
+# --- Configuración de Rutas ---
+RAIZ_PROYECTO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(RAIZ_PROYECTO)
+sys.path.append(os.path.join(RAIZ_PROYECTO, '00_ETL_TNS'))
+sys.path.append(os.path.join(RAIZ_PROYECTO, '01_MODELO_DATOS_Y_AUXILIARES'))
+import config
+from db_utils import get_db_connection, execute_query
+from instrumentacion import MonitorMemoria
+from generar_payloads_sinteticos import generar_payloads, PAYLOADS_DIR, ESCALA_BASE
+from servidor_api_simulada import iniciar_servidor
+
+from cargar_productos_api import ejecutar_etl_productos
+from cargar_clientes_api import ejecutar_etl_clientes
+from cargar_vendedores_api_crudo import sincronizar_vendedores_api
+from cargar_inventario_api import ejecutar_etl_inventario
+from cargar_ventas_api import ejecutar_etl_ventas
+from poblar_dimensiones_catalogo import poblar_catalogos
+from poblar_dim_tiempo import poblar_dim_tiempo
+
+RESULTADOS_DIR = os.path.join(config.BENCHMARK_DIR, 'resultados')
+
+# (nombre de la etapa, función del ETL, llave del conteo de registros de entrada)
+ETAPAS = [
+    ('productos', ejecutar_etl_productos, 'productos'),
+    ('clientes', ejecutar_etl_clientes, 'terceros'),
+    ('vendedores', sincronizar_vendedores_api, 'terceros'),
+    ('inventario', ejecutar_etl_inventario, 'inventario'),
+    ('ventas', ejecutar_etl_ventas, 'ventas'),
+]
+
+
+# Hosts aceptados para la BD del benchmark: el benchmark borra el esquema y vacía tablas con CASCADE
+HOSTS_LOCALES = {'localhost', '127.0.0.1', '::1'}
+
+
+def validar_destino(nombre_bd, host):
+    """Falla si la BD del benchmark no es local (o un socket Unix) o es la configurada en el .env."""
+    if host not in HOSTS_LOCALES and not host.startswith('/'):
+        raise ValueError(f"El host '{host}' no es local. El benchmark solo corre contra una BD en esta máquina.")
+    if nombre_bd == os.getenv('DB_NAME', 'gestion_comercial'):
+        raise ValueError(f"'{nombre_bd}' es la base de datos configurada en el .env. Usa una base local dedicada al benchmark.")
+
+
+def apuntar_config_a_entorno_local(url_base, nombre_bd, host, puerto, usuario):
+    """
+    Redirige las URLs de la API y la base de datos del módulo config al entorno del benchmark.
+    De la conexión del .env solo se conserva la contraseña.
+    """
+    config.API_URLS['productos'] = f"{url_base}/Material/Listar"
+    config.API_URLS['terceros'] = f"{url_base}/Tercero/Listar"
+    config.API_URLS['ventas'] = f"{url_base}/Ventas/ObtenerVentasDetallada"
+    # La API simulada identifica a la empresa por su nombre corto
+    for empresa_config in config.API_CONFIG_TNS:
+        empresa_config['empresa_tns'] = empresa_config['nombre_corto']
+    config.DB_CONFIG.update(dbname=nombre_bd, host=host, port=puerto, user=usuario)
+
+
+def preparar_base_de_datos(recrear_esquema):
+    """Crea el esquema (opcional) y carga las dimensiones que los ETL necesitan para enriquecer."""
+    conn = get_db_connection()
+    if not conn:
+        raise ConnectionError("No se pudo conectar a la base de datos del benchmark.")
+    try:
+        if recrear_esquema:
+            print("INFO: Recreando el esquema en la base de datos del benchmark...")
+            execute_query(conn, "DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+            with open(os.path.join(RAIZ_PROYECTO, 'schema.sql'), 'r', encoding='utf-8') as f:
+                execute_query(conn, f.read())
+
+        # Sin huellas previas: si no, una segunda corrida omitiría los payloads repetidos y mediría casi nada
+        execute_query(conn, "TRUNCATE TABLE etl_huellas_payload, etl_huellas_registro;")
+
+        # Personas y roles para los vendedores sintéticos (V00, V01, ...), en las tres empresas
+        execute_query(conn, "TRUNCATE TABLE dim_roles_comerciales_historia, maestro_personas RESTART IDENTITY CASCADE;")
+        with conn.cursor() as cursor:
+            personas = [(str(1000000 + j), f"VENDEDOR {j:02d}") for j in range(ESCALA_BASE['vendedores'])]
+            extras.execute_values(cursor, "INSERT INTO maestro_personas (numero_documento, nombre_completo) VALUES %s", personas)
+            cursor.execute("""
+                INSERT INTO dim_roles_comerciales_historia
+                    (cod_rol_erp, empresa_erp, cargo, id_persona_fk, fecha_inicio_validez, fecha_fin_validez)
+                SELECT 'V' || LPAD((mp.numero_documento::INT - 1000000)::TEXT, 2, '0'), e.empresa, 'Vendedor',
+                       mp.id_persona, DATE '2020-01-01', DATE '9999-12-31'
+                FROM maestro_personas mp
+                CROSS JOIN (SELECT UNNEST(%s) AS empresa) e;
+            """, ([c['nombre_corto'] for c in config.API_CONFIG_TNS],))
+        conn.commit()
+    finally:
+        conn.close()
+
+    if recrear_esquema:
+        poblar_catalogos()
+        poblar_dim_tiempo()
+
+
+def obtener_version():
+    """Identificador del código medido (commit de git), para comparar resultados entre versiones."""
+    try:
+        salida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ_PROYECTO,
+                                capture_output=True, text=True, check=True)
+        return salida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconocida'
+
+
+def medir_etapa(nombre, funcion, filas, silencioso):
+    """Ejecuta una etapa del ETL y devuelve su tiempo, rendimiento y memoria pico."""
+    print(f"INFO: Midiendo la etapa '{nombre}'...")
+    salida = io.StringIO() if silencioso else sys.stdout
+    with MonitorMemoria() as monitor, contextlib.redirect_stdout(salida):
+        inicio = time.perf_counter()
+        funcion()
+        segundos = time.perf_counter() - inicio
+
+    return {
+        'etapa': nombre,
+        'funcion': funcion.__name__,
+        'filas': filas,
+        'segundos': round(segundos, 3),
+        'filas_por_segundo': round(filas / segundos, 1) if segundos > 0 else None,
+        'memoria_pico_mb': round(monitor.pico / 1024 ** 2, 1),
+    }
+
+
+def comparar_con_anterior(resultado, ruta_anterior):
+    """Imprime la variación de cada etapa respecto al último resultado guardado."""
+    with open(ruta_anterior, 'r', encoding='utf-8') as f:
+        anterior = {e['etapa']: e for e in json.load(f)['etapas']}
+
+    print(f"\n--- Comparación con {os.path.basename(ruta_anterior)} ---")
+    print(f"{'etapa':<12}{'segundos':>10}{'antes':>10}{'var %':>8}{'mem MB':>9}{'antes':>9}")
+    for etapa in resultado['etapas']:
+        previa = anterior.get(etapa['etapa'])
+        if not previa:
+            continue
+        variacion = (etapa['segundos'] / previa['segundos'] - 1) * 100 if previa['segundos'] else 0
+        print(f"{etapa['etapa']:<12}{etapa['segundos']:>10.2f}{previa['segundos']:>10.2f}{variacion:>+8.1f}"
+              f"{etapa['memoria_pico_mb']:>9.1f}{previa['memoria_pico_mb']:>9.1f}")
+
+
+def ejecutar_benchmark(nombre_bd, factor=1.0, latencia=0.0, recrear_esquema=False, regenerar=True, silencioso=True,
+                       host='localhost', puerto='5432', usuario='postgres'):
+    """
+    Genera los payloads, levanta la API simulada, ejecuta cada etapa del ETL contra la base
+    de datos local indicada y guarda las métricas en un JSON dentro de informes_generados/benchmark.
+    """
+    validar_destino(nombre_bd, host)
+    print("=== INICIO DEL BENCHMARK DEL PIPELINE ETL ===")
+    if regenerar or not os.path.exists(os.path.join(PAYLOADS_DIR, 'conteos.json')):
+        conteos = generar_payloads(factor=factor)
+    else:
+        with open(os.path.join(PAYLOADS_DIR, 'conteos.json'), 'r', encoding='utf-8') as f:
+            conteos = json.load(f)['conteos']
+
+    servidor, url_base = iniciar_servidor(latencia=latencia)
+    try:
+        apuntar_config_a_entorno_local(url_base, nombre_bd, host, puerto, usuario)
+        preparar_base_de_datos(recrear_esquema)
+
+        etapas = [medir_etapa(nombre, funcion, conteos[llave], silencioso) for nombre, funcion, llave in ETAPAS]
+    finally:
+        servidor.shutdown()
+
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version': obtener_version(),
+        'factor_escala': factor,
+        'latencia_api_s': latencia,
+        'conteos': conteos,
+        'etapas': etapas,
+        'total_segundos': round(sum(e['segundos'] for e in etapas), 3),
+    }
+
+    os.makedirs(RESULTADOS_DIR, exist_ok=True)
+    anteriores = sorted(glob.glob(os.path.join(RESULTADOS_DIR, 'benchmark_*.json')))
+    ruta_resultado = os.path.join(RESULTADOS_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{resultado['version']}.json")
+    with open(ruta_resultado, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+    print(f"\n{'etapa':<12}{'filas':>10}{'segundos':>10}{'filas/s':>12}{'mem MB':>9}")
+    for e in etapas:
+        print(f"{e['etapa']:<12}{e['filas']:>10}{e['segundos']:>10.2f}{e['filas_por_segundo'] or 0:>12.1f}{e['memoria_pico_mb']:>9.1f}")
+    if anteriores:
+        comparar_con_anterior(resultado, anteriores[-1])
+
+    print(f"\n¡ÉXITO! Resultados guardados en: {ruta_resultado}")
+    print("\n=== FIN DEL BENCHMARK ===")
+    return resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mide cada etapa del ETL contra una API simulada y una BD local.')
+    parser.add_argument('--bd', required=True, help='Base de datos LOCAL del benchmark (nunca la de producción).')
+    parser.add_argument('--host', default='localhost', help='Host de la BD del benchmark: localhost o un directorio de socket Unix.')
+    parser.add_argument('--puerto', default='5432', help='Puerto de la BD del benchmark.')
+    parser.add_argument('--usuario', default='postgres', help='Usuario de la BD del benchmark.')
+    parser.add_argument('--factor', type=float, default=1.0, help='Multiplicador de la escala de los payloads.')
+    parser.add_argument('--latencia', type=float, default=0.0, help='Latencia simulada de la API en segundos.')
+    parser.add_argument('--recrear-esquema', action='store_true', help='Ejecuta schema.sql y carga los catálogos antes de medir.')
+    parser.add_argument('--reusar-payloads', action='store_true', help='No regenera los payloads si ya existen.')
+    parser.add_argument('--verbose', action='store_true', help='Muestra la salida de cada ETL.')
+    args = parser.parse_args()
+
+    try:
+        validar_destino(args.bd, args.host)
+    except ValueError as e:
+        print(f"ERROR CRÍTICO: {e}")
+        sys.exit(1)
+
+    ejecutar_benchmark(args.bd, factor=args.factor, latencia=args.latencia, recrear_esquema=args.recrear_esquema,
+                       regenerar=not args.reusar_payloads, silencioso=not args.verbose,
+                       host=args.host, puerto=args.puerto, usuario=args.usuario)
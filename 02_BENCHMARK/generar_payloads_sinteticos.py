@@ -0,0 +1,211 @@
+# 02_BENCHMARK/generar_payloads_sinteticos.py
+
+import pandas as pd
+import numpy as np
+import json
+import os
+import sys
+import argparse
+from datetime import date, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+
+# Directorio donde quedan los JSON que luego sirve la API simulada
+PAYLOADS_DIR = os.path.join(config.BENCHMARK_DIR, 'payloads')
+
+# Escala por defecto (por empresa). Se puede multiplicar con --factor.
+ESCALA_BASE = {
+    'productos': 4000,
+    'clientes': 10000,
+    'vendedores': 40,
+    'lineas_venta': 20000,
+}
+
+PALABRAS_DESCRIPCION = [
+    'MAYONESA', 'SALSA', 'BBQ', 'CEREAL', 'FLIPS', 'DETERGENTE', 'SUAVIZANTE', 'JABON', 'CREMA',
+    'DENTAL', 'PERRO', 'GATO', 'ADULTO', 'CACHORRO', 'PREMIUM', 'CLASICA', 'DOYPACK', 'BOLSA',
+    'LIMPIADOR', 'LAVAPLATOS', 'ORIGINAL', 'LIGHT', 'FAMILIAR', 'PROMOCIONAL', 'BONIF'
+]
+PALABRAS_NOMBRE = [
+    'TIENDA', 'DROGUERIA', 'SUPERMERCADO', 'MISCELANEA', 'DISTRIBUIDORA', 'AUTOSERVICIO', 'JUAN',
+    'MARIA', 'PEREZ', 'GOMEZ', 'RODRIGUEZ', 'LOPEZ', 'GARCIA', 'MARTINEZ', 'EL', 'LA', 'PORVENIR',
+    'ESQUINA', 'NORTE', 'CENTRAL', 'SAS', 'LTDA'
+]
+NOMENCLATURA_DIRECCION = ['CL', 'CALLE', 'KR', 'CARRERA', 'AV', 'AVENIDA', 'DG', 'TV']
+
+
+def _texto_aleatorio(rng, palabras, n_filas, n_palabras):
+    """Genera n_filas textos uniendo n_palabras tomadas al azar."""
+    matriz = rng.choice(palabras, size=(n_filas, n_palabras))
+    return pd.Series([' '.join(fila) for fila in matriz])
+
+
+def _marcas_reales():
+    """Usa los nombres de marca del mapeo real para que la corrección de marcas tenga aciertos."""
+    ruta = os.path.join(config.DATOS_ENTRADA_DIR, 'mapeo_marcas.csv')
+    try:
+        return pd.read_csv(ruta, dtype=str)['nombre_marca_erp'].dropna().unique()
+    except (FileNotFoundError, KeyError):
+        return np.array(['MARCA GENERICA'])
+
+
+def generar_productos(rng, empresa_config, n):
+    """Payload de Material/Listar: productos con sus arreglos anidados de Bodegas e Items (listas de precio)."""
+    codigos = pd.Series(
+        [f"{a:02d}.{b:02d}.{c:02d}.{d:03d}" for a, b, c, d in rng.integers([1, 1, 1, 1], [99, 40, 20, 999], size=(n, 4))]
+    ).drop_duplicates().reset_index(drop=True)
+    n = len(codigos)
+    # Cerca del 30% de los productos vienen sin referencia, como ocurre en el ERP
+    referencias = codigos.where(rng.random(n) > 0.3, '')
+    descripciones = _texto_aleatorio(rng, PALABRAS_DESCRIPCION, n, 4) + ' ' + pd.Series(rng.integers(100, 5000, n)).astype(str) + 'G X' + pd.Series(rng.integers(1, 48, n)).astype(str) + 'U'
+    marcas = rng.choice(_marcas_reales(), n)
+    costo = rng.uniform(500, 90000, n).round(2)
+
+    bodegas = empresa_config.get('bodegas_permitidas', ['00'])
+    # Añadimos una bodega no permitida para que el filtro de inventario tenga trabajo
+    bodegas_payload = list(bodegas) + ['99']
+    listas = ['1', '2', '3']
+
+    productos = []
+    for i in range(n):
+        productos.append({
+            'OCODIGO': codigos[i],
+            'OREFERENCIA': referencias[i],
+            'ODESCRIP': descripciones[i],
+            'OCODGRUPO': f"{rng.integers(1, 99):02d}.{rng.integers(1, 40):02d}.00",
+            'OCODLINEA': f"{rng.integers(1, 40):02d}",
+            'ODEPARTAMENTOCODIGO': f"{rng.integers(0, 13):02d}",
+            'ONOMMARCA': marcas[i],
+            'OPESO': f"{rng.uniform(0.1, 25):.4f}",
+            'OFACTOR': f"{rng.integers(1, 48)}",
+            'OPORIVA': rng.choice(['0', '5', '19']),
+            'OULTIMOCOSTO': f"{costo[i] * rng.uniform(0.95, 1.05):.2f}",
+            'OCOSTOPROMEDIO': f"{costo[i]:.2f}",
+            'Bodegas': [
+                {'OCODBODEGA': b, 'OEXISTENCIA': f"{rng.integers(0, 2000)}.00"} for b in bodegas_payload
+            ],
+            'Items': [
+                {'OCODLISTA': lista, 'OPRECIO': f"{costo[i] * (1.2 + 0.1 * j):.2f}"} for j, lista in enumerate(listas)
+                if rng.random() > 0.1
+            ],
+        })
+    return {'status': 'OK', 'results': productos}
+
+
+def generar_terceros(rng, n_clientes, n_vendedores):
+    """Payload de Tercero/Listar: clientes más los vendedores (códigos que empiezan con 'V')."""
+    nits = pd.Series(rng.integers(10**7, 10**10, n_clientes)).astype(str)
+    nombres = _texto_aleatorio(rng, PALABRAS_NOMBRE, n_clientes, 3)
+    direcciones = (
+        pd.Series(rng.choice(NOMENCLATURA_DIRECCION, n_clientes)) + ' '
+        + pd.Series(rng.integers(1, 200, n_clientes)).astype(str) + ' # '
+        + pd.Series(rng.integers(1, 99, n_clientes)).astype(str) + '-'
+        + pd.Series(rng.integers(1, 99, n_clientes)).astype(str)
+    )
+    terceros = [
+        {
+            'OCODIGO': nits[i], 'ONIT': f"{nits[i]}-{rng.integers(0, 9)}", 'ONOMBRE': nombres[i],
+            'OCODCLASIFICACION1': '01', 'ONOMCLASIFICACION1': 'CLIENTES', 'ODIRECC1': direcciones[i],
+            'OTELEF1': f"3{rng.integers(100000000, 999999999)}", 'OCODCIUDAD': '54001',
+            'OINACTIVO': '1' if rng.random() < 0.05 else '0',
+        }
+        for i in range(n_clientes)
+    ]
+    terceros += [
+        {
+            'OCODIGO': f"V{j:02d}", 'ONIT': str(1000000 + j), 'ONOMBRE': f"VENDEDOR {j:02d}",
+            'OCODCLASIFICACION1': '02', 'ONOMCLASIFICACION1': 'VENDEDORES', 'ODIRECC1': '', 'OTELEF1': '',
+            'OCODCIUDAD': '54001', 'OINACTIVO': '0',
+        }
+        for j in range(n_vendedores)
+    ]
+    return {'status': 'OK', 'results': terceros}
+
+
+def generar_ventas(rng, payload_productos, payload_terceros, empresa_config, n_lineas, fecha_desde, fecha_hasta):
+    """Payload de ObtenerVentasDetallada: líneas de factura sobre productos, clientes y vendedores generados."""
+    productos = pd.DataFrame(payload_productos['results'])[['OCODIGO', 'OREFERENCIA', 'OCOSTOPROMEDIO']]
+    terceros = pd.DataFrame(payload_terceros['results'])
+    clientes = terceros.loc[~terceros['OCODIGO'].str.startswith('V'), 'OCODIGO'].to_numpy()
+    vendedores = terceros.loc[terceros['OCODIGO'].str.startswith('V'), 'OCODIGO'].to_numpy()
+    dias = pd.date_range(fecha_desde, fecha_hasta, freq='D')
+
+    idx_prod = rng.integers(0, len(productos), n_lineas)
+    cantidad = rng.integers(1, 24, n_lineas).astype(float)
+    costo_unit = productos['OCOSTOPROMEDIO'].astype(float).to_numpy()[idx_prod]
+    precio_lista = (costo_unit * rng.uniform(1.15, 1.45, n_lineas)).round(2)
+    base = (precio_lista * cantidad).round(2)
+    descuento = (base * rng.choice([0, 0, 0, 0.03, 0.05, 0.1], n_lineas)).round(2)
+    iva = ((base - descuento) * 0.19).round(2)
+    n_facturas = max(1, n_lineas // 6)
+
+    df = pd.DataFrame({
+        'DEKARDEXID': rng.permutation(np.arange(1, n_lineas + 1)) + 10_000_000,
+        'NUMFACTURA': 'FV-' + pd.Series(rng.integers(1, n_facturas + 1, n_lineas)).astype(str),
+        'FECHA': pd.Series(rng.choice(dias, n_lineas)).dt.strftime('%d/%m/%Y'),
+        'CODCLIENTE': rng.choice(clientes, n_lineas),
+        'CODIGO': productos['OCODIGO'].to_numpy()[idx_prod],
+        'REFERENCIA': productos['OREFERENCIA'].to_numpy()[idx_prod],
+        'CODVENDEDOR': rng.choice(vendedores, n_lineas),
+        'CANT': pd.Series(cantidad).map('{:.2f}'.format),
+        'PREBASE': pd.Series(base).map('{:.2f}'.format),
+        'DESCUENTO': pd.Series(descuento).map('{:.2f}'.format),
+        'PREIVA': pd.Series(iva).map('{:.2f}'.format),
+        'PRECIOTOT': pd.Series(base - descuento + iva).map('{:.2f}'.format),
+        'COSTOPROMEDIO': pd.Series(costo_unit * cantidad).map('{:.2f}'.format),
+        'PRECIOLISTA': pd.Series(precio_lista).map('{:.2f}'.format),
+        'FORMAPAGO': rng.choice(['CO', 'CR'], n_lineas),
+        'CODBODEGA': rng.choice(empresa_config.get('bodegas_permitidas', ['00']), n_lineas),
+        'LISTAPRECIO': '1',
+        'OBSERV': '',
+        'MOTIVODEVOLUCION': '',
+        'PEDIDO': '',
+    })
+    df['DEKARDEXID'] = df['DEKARDEXID'].astype(str)
+    return {'Data': df.to_dict(orient='records')}
+
+
+def generar_payloads(factor=1.0, semilla=42, directorio=PAYLOADS_DIR, fecha_hasta=None, dias=2):
+    """
+    Genera y guarda en disco los payloads sintéticos de las tres empresas.
+    Devuelve un diccionario con el número de registros generados por endpoint.
+    """
+    print(f"INFO: Generando payloads sintéticos (factor de escala {factor}) en '{directorio}'...")
+    os.makedirs(directorio, exist_ok=True)
+    rng = np.random.default_rng(semilla)
+    fecha_hasta = fecha_hasta or date.today()
+    fecha_desde = fecha_hasta - timedelta(days=dias - 1)
+
+    conteos = {'productos': 0, 'inventario': 0, 'terceros': 0, 'ventas': 0}
+    for empresa_config in config.API_CONFIG_TNS:
+        nombre_empresa = empresa_config['nombre_corto']
+        payload_productos = generar_productos(rng, empresa_config, int(ESCALA_BASE['productos'] * factor))
+        payload_terceros = generar_terceros(rng, int(ESCALA_BASE['clientes'] * factor), ESCALA_BASE['vendedores'])
+        payload_ventas = generar_ventas(
+            rng, payload_productos, payload_terceros, empresa_config,
+            int(ESCALA_BASE['lineas_venta'] * factor), fecha_desde, fecha_hasta
+        )
+
+        for endpoint, payload in (('productos', payload_productos), ('terceros', payload_terceros), ('ventas', payload_ventas)):
+            with open(os.path.join(directorio, f'{nombre_empresa}_{endpoint}.json'), 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+
+        conteos['productos'] += len(payload_productos['results'])
+        conteos['inventario'] += sum(len(p['Bodegas']) for p in payload_productos['results'])
+        conteos['terceros'] += len(payload_terceros['results'])
+        conteos['ventas'] += len(payload_ventas['Data'])
+        print(f"¡ÉXITO! Payloads de {nombre_empresa} generados.")
+
+    with open(os.path.join(directorio, 'conteos.json'), 'w', encoding='utf-8') as f:
+        json.dump({'factor': factor, 'semilla': semilla, 'conteos': conteos}, f, indent=2)
+    return conteos
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera payloads sintéticos de la API de TNS.')
+    parser.add_argument('--factor', type=float, default=1.0, help='Multiplicador de la escala base por empresa.')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--dias', type=int, default=2, help='Días de ventas a generar (terminando hoy).')
+    args = parser.parse_args()
+    generar_payloads(factor=args.factor, semilla=args.semilla, dias=args.dias)
@@ -0,0 +1,95 @@
+# 02_BENCHMARK/servidor_api_simulada.py
+
+import os
+import sys
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from generar_payloads_sinteticos import PAYLOADS_DIR
+
+# Sufijo de la ruta de la API real -> nombre del endpoint en los archivos de payload
+RUTAS_ENDPOINTS = {
+    '/Material/Listar': 'productos',
+    '/Tercero/Listar': 'terceros',
+    '/Ventas/ObtenerVentasDetallada': 'ventas',
+}
+
+
+def _crear_manejador(payloads, latencia):
+    """Crea la clase que atiende las peticiones con los payloads ya cargados en memoria."""
+
+    class ManejadorApiSimulada(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            endpoint = next((e for ruta, e in RUTAS_ENDPOINTS.items() if url.path.endswith(ruta)), None)
+            empresa = parse_qs(url.query).get('empresa', [''])[0]
+            cuerpo = payloads.get((empresa, endpoint))
+
+            # Simulamos el tiempo de respuesta de la API real
+            if latencia > 0:
+                time.sleep(latencia)
+
+            if cuerpo is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            # Silenciamos el log por petición para no ensuciar la salida del benchmark
+            pass
+
+    return ManejadorApiSimulada
+
+
+def cargar_payloads(directorio=PAYLOADS_DIR):
+    """Lee los JSON generados como bytes, indexados por (empresa, endpoint)."""
+    payloads = {}
+    for archivo in os.listdir(directorio):
+        nombre, extension = os.path.splitext(archivo)
+        if extension != '.json' or '_' not in nombre:
+            continue
+        empresa, endpoint = nombre.rsplit('_', 1)
+        with open(os.path.join(directorio, archivo), 'rb') as f:
+            payloads[(empresa, endpoint)] = f.read()
+    return payloads
+
+
+def iniciar_servidor(puerto=0, latencia=0.0, directorio=PAYLOADS_DIR):
+    """
+    Levanta la API simulada en un hilo de fondo. Con puerto=0 el sistema asigna uno libre.
+    Devuelve el servidor (para apagarlo con .shutdown()) y la URL base a usar como TNS_API_BASE_URL.
+    """
+    payloads = cargar_payloads(directorio)
+    if not payloads:
+        raise FileNotFoundError(f"No hay payloads en '{directorio}'. Ejecuta primero generar_payloads_sinteticos.py")
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', puerto), _crear_manejador(payloads, latencia))
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    url_base = f"http://127.0.0.1:{servidor.server_address[1]}/api"
+    print(f"INFO: API simulada escuchando en {url_base} (latencia {latencia}s, {len(payloads)} payloads).")
+    return servidor, url_base
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='API local que responde con los payloads sintéticos.')
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--latencia', type=float, default=0.0, help='Segundos de espera por petición.')
+    args = parser.parse_args()
+
+    servidor, url_base = iniciar_servidor(args.puerto, args.latencia)
+    print(f"Usa TNS_API_BASE_URL={url_base} y TNS_API_EMPRESA_<EMPRESA>=<nombre_corto>. Ctrl+C para detener.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        servidor.shutdown()
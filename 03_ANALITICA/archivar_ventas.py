@@ -0,0 +1,213 @@
+# 03_ANALITICA/archivar_ventas.py
+# Archivo en frío de hechos_ventas: los meses cerrados más antiguos que el horizonte configurado
+# pasan a Parquet comprimido y se borran de PostgreSQL solo después de verificar el archivo.
+# leer_ventas() vuelve a unir lo archivado cuando una consulta abarca esos meses.
+
+import os
+import sys
+import hashlib
+import argparse
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+from db_utils import get_db_connection, leer_dataframe
+from instrumentacion import medir_etapa, registrar_metricas
+from exportar_parquet import _columnas, _escribir_parquet, retirar_mes_exportado
+
+# Meses completos que se conservan en hechos_ventas además del mes en curso. El ETL recarga por
+# rango de fechas los últimos días: archivar un mes que aún se recarga duplicaría sus ventas.
+MESES_EN_LINEA = int(os.getenv('ETL_MESES_VENTAS_EN_LINEA', '24'))
+MINIMO_MESES_EN_LINEA = 2
+
+
+def _primer_dia(anio, mes):
+    """Primer día del mes, admitiendo meses fuera de 1..12 (ej. mes=0 es diciembre del año anterior)."""
+    anio, mes = anio + (mes - 1) // 12, (mes - 1) % 12 + 1
+    return date(anio, mes, 1)
+
+
+def _sha256(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _forzar_a_disco(ruta):
+    with open(ruta, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def _totales_parquet(ruta):
+    """Filas y sumas de control leídas del archivo recién escrito (no del DataFrame que lo generó)."""
+    tabla = pq.read_table(ruta, columns=['valor_total', 'cantidad'])
+    return (tabla.num_rows,
+            sum(tabla.column('valor_total').to_pylist(), Decimal(0)),
+            sum(tabla.column('cantidad').to_pylist(), Decimal(0)))
+
+
+def archivar_mes(conn, mes):
+    """
+    Archiva las ventas del mes (date del primer día) y las borra de hechos_ventas en la misma
+    transacción. Si el mes ya tenía partes archivadas (ej. ventas promovidas después desde la
+    cuarentena), se agrega una parte nueva. Luego quita el mes de la exportación analítica, que
+    ya no debe leerlo. Retorna las filas archivadas.
+    """
+    desde, hasta = mes, _primer_dia(mes.year, mes.month + 1)
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT COUNT(*), COALESCE(SUM(valor_total), 0), COALESCE(SUM(cantidad), 0)
+            FROM hechos_ventas WHERE fecha_sk >= %s AND fecha_sk < %s;
+        """, (desde, hasta))
+        filas, suma_valor, suma_cantidad = cursor.fetchone()
+        if filas == 0:
+            conn.rollback()
+            return 0
+        cursor.execute("SELECT COALESCE(MAX(parte), 0) + 1 FROM archivo_hechos_ventas WHERE mes = %s;", (mes,))
+        parte = cursor.fetchone()[0]
+
+    ruta_relativa = os.path.join('hechos_ventas', f"anio={mes.year}", f"mes={mes.month}", f"parte_{parte:03d}.parquet")
+    ruta = os.path.join(config.ARCHIVO_VENTAS_DIR, ruta_relativa)
+    seleccion, esquema = _columnas(conn, 'hechos_ventas', exacto=True)
+    try:
+        _escribir_parquet(conn, f"SELECT {seleccion} FROM hechos_ventas WHERE fecha_sk >= %s AND fecha_sk < %s ORDER BY id_venta;",
+                          (desde, hasta), esquema, ruta)
+        _forzar_a_disco(ruta)
+
+        # Verificación antes de borrar: filas y sumas del archivo contra las de la BD
+        en_archivo = _totales_parquet(ruta)
+        if en_archivo != (filas, suma_valor, suma_cantidad):
+            raise ValueError(f"El archivo de {mes:%Y-%m} no coincide con la BD: {en_archivo} vs {(filas, suma_valor, suma_cantidad)}")
+        sha256 = _sha256(ruta)
+
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO archivo_hechos_ventas (mes, parte, ruta_archivo, filas, sha256, suma_valor_total, suma_cantidad)
+                VALUES (%s, %s, %s, %s, %s, %s, %s);
+            """, (mes, parte, ruta_relativa.replace(os.sep, '/'), filas, sha256, suma_valor, suma_cantidad))
+            cursor.execute("DELETE FROM hechos_ventas WHERE fecha_sk >= %s AND fecha_sk < %s;", (desde, hasta))
+            # En REPEATABLE READ solo se borran las filas que se archivaron; una fila modificada
+            # por otra transacción hace fallar el DELETE en vez de perderse.
+            if cursor.rowcount != filas:
+                raise ValueError(f"Se iban a borrar {filas} filas de {mes:%Y-%m} y el DELETE afectó {cursor.rowcount}.")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        raise
+    print(f"INFO: {mes:%Y-%m} archivado: {filas} filas en '{ruta_relativa}' (sha256 {sha256[:12]}...).")
+    # consultas_analiticas une la exportación con el archivo: el mes no puede quedar en ambos
+    retirar_mes_exportado('hechos_ventas', mes)
+    return filas
+
+
+def archivar_ventas(meses_en_linea=MESES_EN_LINEA):
+    """Archiva todos los meses anteriores al horizonte, del más antiguo al más reciente."""
+    print("=== INICIO DEL ARCHIVO EN FRÍO DE VENTAS ===")
+    if meses_en_linea < MINIMO_MESES_EN_LINEA:
+        print(f"ERROR: Se deben conservar al menos {MINIMO_MESES_EN_LINEA} meses en línea (se pidió {meses_en_linea}).")
+        return
+    hoy = date.today()
+    limite = _primer_dia(hoy.year, hoy.month - meses_en_linea)
+    conn = get_db_connection()
+    if not conn: return
+
+    try:
+        with medir_etapa('archivo_ventas', 'archivo') as etapa:
+            conn.set_session(isolation_level='REPEATABLE READ')
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT DISTINCT date_trunc('month', fecha_sk)::date FROM hechos_ventas WHERE fecha_sk < %s ORDER BY 1;", (limite,))
+                meses = [fila[0] for fila in cursor.fetchall()]
+            conn.rollback()
+            print(f"INFO: {len(meses)} meses anteriores a {limite} por archivar.")
+
+            archivadas = 0
+            for mes in meses:
+                archivadas += archivar_mes(conn, mes)
+            registrar_metricas(filas_afectadas_bd=archivadas)
+            etapa['filas_salida'] = archivadas
+
+        if archivadas:
+            # Recupera el espacio de las filas borradas y actualiza las estadísticas
+            conn.set_session(isolation_level='READ COMMITTED', autocommit=True)
+            with conn.cursor() as cursor:
+                cursor.execute("VACUUM (ANALYZE) hechos_ventas;")
+        print(f"\n¡ÉXITO! {archivadas} filas archivadas en '{config.ARCHIVO_VENTAS_DIR}'.")
+
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante el archivo de ventas: {e}")
+        conn.rollback()
+    finally:
+        if conn: conn.close()
+
+
+def _partes_archivadas(conn, desde, hasta):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT ruta_archivo, filas FROM archivo_hechos_ventas
+            WHERE mes >= date_trunc('month', %s::date) AND mes <= %s ORDER BY mes, parte;
+        """, (desde, hasta))
+        return cursor.fetchall()
+
+
+def leer_ventas(conn, desde, hasta, columnas=None):
+    """
+    Ventas entre `desde` y `hasta` (inclusive) como un solo DataFrame, uniendo hechos_ventas con las
+    partes archivadas de esos meses. Los NUMERIC llegan como Decimal en ambos casos.
+    """
+    columnas = list(columnas) if columnas else None
+    lista_sql = ', '.join(columnas) if columnas else '*'
+    partes = [leer_dataframe(conn, f"SELECT {lista_sql} FROM hechos_ventas WHERE fecha_sk BETWEEN %s AND %s;", (desde, hasta))]
+    desde_fecha, hasta_fecha = pd.Timestamp(desde).date(), pd.Timestamp(hasta).date()
+    for ruta_relativa, filas in _partes_archivadas(conn, desde_fecha, hasta_fecha):
+        ruta = os.path.join(config.ARCHIVO_VENTAS_DIR, ruta_relativa)
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(f"Falta la parte archivada '{ruta}'.")
+        if pq.ParquetFile(ruta).metadata.num_rows != filas:
+            raise ValueError(f"La parte archivada '{ruta}' no tiene las {filas} filas registradas.")
+        tabla = pq.read_table(ruta, columns=columnas,
+                              filters=[('fecha_sk', '>=', desde_fecha), ('fecha_sk', '<=', hasta_fecha)])
+        partes.append(tabla.to_pandas())
+    partes = [p for p in partes if not p.empty] or partes[:1]
+    return pd.concat(partes, ignore_index=True)
+
+
+def verificar_archivo():
+    """Recalcula el sha256 de todas las partes archivadas y reporta las que faltan o no coinciden."""
+    conn = get_db_connection()
+    if not conn: return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT mes, parte, ruta_archivo, sha256 FROM archivo_hechos_ventas ORDER BY mes, parte;")
+            registros = cursor.fetchall()
+    finally:
+        conn.close()
+    errores = 0
+    for mes, parte, ruta_relativa, sha256 in registros:
+        ruta = os.path.join(config.ARCHIVO_VENTAS_DIR, ruta_relativa)
+        if not os.path.exists(ruta):
+            print(f"ERROR: Falta la parte {parte} de {mes:%Y-%m}: '{ruta}'.")
+            errores += 1
+        elif _sha256(ruta) != sha256:
+            print(f"ERROR: La parte {parte} de {mes:%Y-%m} no coincide con su sha256 registrado.")
+            errores += 1
+    print(f"INFO: {len(registros)} partes verificadas, {errores} con errores.")
+    return errores == 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archiva en Parquet los meses antiguos de hechos_ventas.')
+    parser.add_argument('--meses-en-linea', type=int, default=MESES_EN_LINEA,
+                        help=f'Meses completos que se conservan en la BD además del actual (por defecto {MESES_EN_LINEA}).')
+    parser.add_argument('--verificar', action='store_true', help='Solo verifica los sha256 de lo ya archivado.')
+    args = parser.parse_args()
+    if args.verificar:
+        verificar_archivo()
+    else:
+        archivar_ventas(args.meses_en_linea)
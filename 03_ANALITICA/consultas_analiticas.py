@@ -0,0 +1,159 @@
+# 03_ANALITICA/consultas_analiticas.py
+# Consultas analíticas con DuckDB sobre la exportación a Parquet (exportar_parquet.py), sin tocar PostgreSQL.
+#
+#   from consultas_analiticas import conectar, ventas_por
+#   ventas_por(['producto', 'mes'], desde='2024-01-01', hasta='2024-06-30', filtros={'empresa_erp': 'CAMDUN'})
+#
+# conectar() también sirve para SQL libre: las vistas se llaman igual que las tablas de la BD.
+
+import os
+import sys
+import glob
+from datetime import date
+
+import duckdb
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+
+# Ejes de análisis: uniones necesarias y columnas que agregan al GROUP BY.
+# 'canal' toma la clasificación (canal/subcanal) vigente en la fecha de cada venta, ya resuelta en la carga.
+EJES = {
+    'producto': (
+        ["JOIN dim_productos p ON p.id_producto = v.id_producto_fk"],
+        ["p.codigo_erp", "p.descripcion_erp", "p.cod_linea_erp", "p.cod_marca_erp"],
+    ),
+    # Atributos que tenía el producto en la fecha de la venta (historia SCD2)
+    'producto_historico': (
+        ["LEFT JOIN dim_productos_historia ph ON ph.id_producto_historia = v.id_producto_historia_fk"],
+        ["ph.descripcion_erp AS descripcion_historica", "ph.cod_linea_erp AS cod_linea_historica",
+         "ph.cod_marca_erp AS cod_marca_historica"],
+    ),
+    'linea': (["JOIN dim_productos p ON p.id_producto = v.id_producto_fk"], ["p.cod_linea_erp"]),
+    'marca': (["JOIN dim_productos p ON p.id_producto = v.id_producto_fk"], ["p.cod_marca_erp"]),
+    'cliente': (
+        ["JOIN dim_clientes_empresa c ON c.id_cliente_empresa = v.id_cliente_empresa_fk"],
+        ["c.cod_cliente_erp", "c.nombre_erp"],
+    ),
+    'maestro_cliente': (
+        ["JOIN dim_clientes_empresa c ON c.id_cliente_empresa = v.id_cliente_empresa_fk",
+         "LEFT JOIN maestro_clientes mc ON mc.id_maestro_cliente = c.id_maestro_cliente_fk"],
+        ["mc.cod_cliente_maestro", "mc.nombre_unificado"],
+    ),
+    'canal': (
+        ["LEFT JOIN dim_clientes_clasificacion_historia ch ON ch.id_clasificacion_historia = v.id_clasificacion_historia_fk"],
+        ["ch.canal", "ch.subcanal"],
+    ),
+    'rol': (
+        ["JOIN dim_roles_comerciales_historia r ON r.id_rol_historia = v.id_rol_historia_fk",
+         "LEFT JOIN maestro_personas pe ON pe.id_persona = r.id_persona_fk"],
+        ["r.cod_rol_erp", "r.cargo", "pe.nombre_completo AS vendedor"],
+    ),
+    'bodega': (
+        ["LEFT JOIN dim_bodegas b ON b.id_bodega = v.id_bodega_fk"],
+        ["COALESCE(b.cod_bodega_erp, v.bodega_erp) AS cod_bodega_erp", "b.nombre_bodega"],
+    ),
+    'empresa': ([], ["v.empresa_erp"]),
+    'dia': ([], ["v.fecha_sk"]),
+    'mes': ([], ["v.anio", "v.mes"]),
+    'anio': ([], ["v.anio"]),
+}
+
+MEDIDAS = [
+    "SUM(v.cantidad) AS cantidad",
+    "SUM(v.valor_base) AS valor_base",
+    "SUM(v.valor_descuento) AS valor_descuento",
+    "SUM(v.valor_total) AS valor_total",
+    "SUM(v.costo_total) AS costo_total",
+    # Venta neta (valor_base - descuento) menos costo, igual que resumen_margenes_mes
+    "SUM(v.valor_base - COALESCE(v.valor_descuento, 0)) - SUM(v.costo_total) AS utilidad",
+    "COUNT(DISTINCT v.numero_factura_erp) AS facturas",
+]
+
+
+def _ruta_parquet(*partes, base=None):
+    return os.path.join(base or config.ANALITICA_DIR, *partes).replace("'", "''")
+
+
+def conectar(base_datos=':memory:'):
+    """
+    Conexión DuckDB con una vista por cada tabla exportada. Las vistas de hechos leen todas las
+    particiones mensuales y exponen además las columnas `anio` y `mes` de la partición.
+    hechos_ventas incluye también los meses del archivo en frío (archivar_ventas.py).
+    """
+    if not os.path.isdir(config.ANALITICA_DIR):
+        raise FileNotFoundError(f"No hay exportación en '{config.ANALITICA_DIR}'. Ejecuta primero exportar_parquet.py.")
+    con = duckdb.connect(base_datos)
+    particiones = os.path.join('anio=*', 'mes=*', '*.parquet')
+    tablas = {os.path.basename(r) for r in glob.glob(os.path.join(config.ANALITICA_DIR, 'hechos_*'))}
+    for tabla in sorted(tablas | {'hechos_ventas'}):
+        # Lo archivado se borró de la BD y archivar_mes() quitó su partición exportada: basta con unirlos
+        lecturas = [f"SELECT * FROM read_parquet('{_ruta_parquet(tabla, particiones, base=base)}', hive_partitioning = true)"
+                    for base in (config.ANALITICA_DIR, config.ARCHIVO_VENTAS_DIR)
+                    if glob.glob(os.path.join(base, tabla, particiones))]
+        if lecturas:
+            con.execute(f"CREATE OR REPLACE VIEW {tabla} AS {' UNION ALL BY NAME '.join(lecturas)};")
+    for ruta in sorted(glob.glob(os.path.join(config.ANALITICA_DIR, 'dimensiones', '*.parquet'))):
+        tabla = os.path.splitext(os.path.basename(ruta))[0]
+        con.execute(f"CREATE OR REPLACE VIEW {tabla} AS SELECT * FROM read_parquet('{_ruta_parquet('dimensiones', os.path.basename(ruta))}');")
+    return con
+
+
+def _a_fecha(valor):
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def ventas_por(ejes, desde=None, hasta=None, filtros=None, con=None):
+    """
+    Ventas agregadas por los ejes pedidos (ver EJES), entre `desde` y `hasta` (inclusive).
+    :param filtros: dict {columna: valor o lista de valores} sobre las columnas de los ejes o de
+                    hechos_ventas (ej. {'empresa_erp': 'CAMDUN', 'p.cod_marca_erp': ['001', '002']}).
+    El rango de fechas también filtra por anio/mes, así DuckDB solo abre las particiones necesarias.
+    Retorna un DataFrame ordenado por valor_total descendente.
+    """
+    desconocidos = [e for e in ejes if e not in EJES]
+    if desconocidos:
+        raise ValueError(f"Ejes no soportados: {desconocidos}. Disponibles: {sorted(EJES)}")
+    propia = con is None
+    con = con or conectar()
+
+    uniones, columnas = [], []
+    for eje in ejes:
+        for union in EJES[eje][0]:
+            if union not in uniones:
+                uniones.append(union)
+        columnas += [c for c in EJES[eje][1] if c not in columnas]
+
+    condiciones, params = [], []
+    desde, hasta = _a_fecha(desde), _a_fecha(hasta)
+    if desde:
+        condiciones += ["v.fecha_sk >= ?", "(v.anio > ? OR (v.anio = ? AND v.mes >= ?))"]
+        params += [desde, desde.year, desde.year, desde.month]
+    if hasta:
+        condiciones += ["v.fecha_sk <= ?", "(v.anio < ? OR (v.anio = ? AND v.mes <= ?))"]
+        params += [hasta, hasta.year, hasta.year, hasta.month]
+    for columna, valor in (filtros or {}).items():
+        columna = columna if '.' in columna else f"v.{columna}"
+        if isinstance(valor, (list, tuple, set)):
+            condiciones.append(f"{columna} IN ({', '.join('?' for _ in valor)})")
+            params += list(valor)
+        else:
+            condiciones.append(f"{columna} = ?")
+            params.append(valor)
+
+    agrupar = [c.split(' AS ')[0] for c in columnas]
+    consulta = (f"SELECT {', '.join(columnas + MEDIDAS)}\n"
+                f"FROM hechos_ventas v\n" + "".join(f"{u}\n" for u in uniones) +
+                (f"WHERE {' AND '.join(condiciones)}\n" if condiciones else "") +
+                (f"GROUP BY {', '.join(agrupar)}\n" if agrupar else "") +
+                "ORDER BY valor_total DESC NULLS LAST;")
+    try:
+        return con.execute(consulta, params).df()
+    finally:
+        if propia:
+            con.close()
+
+
+if __name__ == '__main__':
+    # Ejemplo rápido: ventas por empresa y mes con toda la historia exportada
+    print(ventas_por(['empresa', 'mes']).to_string(index=False))
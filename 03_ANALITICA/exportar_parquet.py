@@ -0,0 +1,214 @@
+# 03_ANALITICA/exportar_parquet.py
+# Exporta el esquema en estrella a Parquet para analizarlo fuera de PostgreSQL (ver consultas_analiticas.py).
+# Hechos: una partición por mes (anio=AAAA/mes=M) que solo se reescribe si el mes cambió en la BD.
+# Dimensiones: una copia completa por tabla en cada exportación (son pequeñas).
+
+import os
+import sys
+import json
+import shutil
+import argparse
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+from db_utils import get_db_connection, leer_por_bloques
+from instrumentacion import medir_etapa, registrar_metricas
+
+# Tabla de hechos -> (columna de fecha que define el mes, llave primaria)
+HECHOS = {
+    'hechos_ventas': ('fecha_sk', 'id_venta'),
+    'hechos_inventario': ('fecha_snapshot', 'id_inventario'),
+}
+
+DIMENSIONES = [
+    'dim_productos', 'dim_productos_historia', 'dim_precios_lista_historia', 'dim_clientes_empresa', 'maestro_clientes',
+    'dim_clientes_clasificacion_historia',
+    'dim_roles_comerciales_historia', 'maestro_personas', 'dim_bodegas', 'dim_tiempo',
+    'dim_lineas', 'dim_marcas', 'dim_grupos', 'dim_dpto_sku', 'dim_geografia',
+]
+
+RUTA_MANIFIESTO = os.path.join(config.ANALITICA_DIR, 'manifiesto.json')
+COMPRESION = 'zstd'
+
+# Tipo de PostgreSQL -> (expresión SQL de lectura, tipo Arrow). Lo numérico viaja como float8:
+# para análisis basta y evita que cada mes infiera un decimal con otra precisión.
+_TIPOS = {
+    'smallint': ('{}', pa.int32()),
+    'integer': ('{}', pa.int32()),
+    'bigint': ('{}', pa.int64()),
+    'numeric': ('{}::float8', pa.float64()),
+    'real': ('{}::float8', pa.float64()),
+    'double precision': ('{}', pa.float64()),
+    'boolean': ('{}', pa.bool_()),
+    'date': ('{}', pa.date32()),
+    'timestamp without time zone': ('{}', pa.timestamp('us')),
+    'timestamp with time zone': ('{}', pa.timestamp('us', tz='UTC')),
+}
+
+
+def _columnas(conn, tabla, exacto=False):
+    """
+    Columnas de la tabla con la expresión de lectura y el esquema Arrow fijo para todas las particiones.
+    Con exacto=True los NUMERIC con precisión se guardan como decimal (sin pérdida, para archivar).
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT column_name, data_type, numeric_precision, numeric_scale FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position;
+        """, (tabla,))
+        filas = cursor.fetchall()
+    if not filas:
+        raise ValueError(f"La tabla '{tabla}' no existe.")
+    expresiones, campos = [], []
+    for nombre, tipo, precision, escala in filas:
+        if exacto and tipo == 'numeric':
+            expresion, tipo_arrow = ('{}', pa.decimal128(precision, escala)) if precision else ('{}::text', pa.string())
+        else:
+            expresion, tipo_arrow = _TIPOS.get(tipo, ('{}::text', pa.string()))
+        expresiones.append(f"{expresion.format(nombre)} AS {nombre}")
+        campos.append(pa.field(nombre, tipo_arrow))
+    return ", ".join(expresiones), pa.schema(campos)
+
+
+def _escribir_parquet(conn, consulta, params, esquema, ruta):
+    """Escribe el resultado de la consulta en `ruta` bloque a bloque; el archivo aparece completo o no aparece."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + '.tmp'
+    filas = 0
+    with pq.ParquetWriter(temporal, esquema, compression=COMPRESION) as escritor:
+        for bloque in leer_por_bloques(conn, consulta, params):
+            if bloque.empty:
+                continue
+            escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False))
+            filas += len(bloque)
+    os.replace(temporal, ruta)
+    return filas
+
+
+def _firmas_por_mes(conn, tabla, columna_fecha, llave):
+    """
+    Firma de cada mes: filas, suma de la llave y el xmin más reciente. Una recarga por rango de
+    fechas (DELETE + INSERT) cambia las llaves, y cualquier UPDATE cambia el xmin de la fila.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT EXTRACT(YEAR FROM {columna_fecha})::int, EXTRACT(MONTH FROM {columna_fecha})::int,
+                   COUNT(*), SUM({llave})::text, MAX(xmin::text::bigint)
+            FROM {tabla} GROUP BY 1, 2;
+        """)
+        return {f"{anio}-{mes:02d}": [filas, suma, xmin] for anio, mes, filas, suma, xmin in cursor.fetchall()}
+
+
+def _ruta_mes(tabla, mes):
+    anio, numero = mes.split('-')
+    return os.path.join(config.ANALITICA_DIR, tabla, f"anio={anio}", f"mes={int(numero)}", 'datos.parquet')
+
+
+def _borrar_mes(tabla, exportados, mes):
+    """Borra la partición exportada del mes ('AAAA-MM') y su entrada en el manifiesto de la tabla."""
+    carpeta_mes = os.path.dirname(_ruta_mes(tabla, mes))
+    shutil.rmtree(carpeta_mes, ignore_errors=True)
+    if os.path.isdir(os.path.dirname(carpeta_mes)) and not os.listdir(os.path.dirname(carpeta_mes)):
+        os.rmdir(os.path.dirname(carpeta_mes))
+    exportados.pop(mes, None)
+
+
+def retirar_mes_exportado(tabla, mes):
+    """
+    Quita de la exportación el mes (date) de la tabla, sin esperar a la siguiente exportación.
+    La usa archivar_ventas.py: un mes archivado ya no está en la BD y, si su partición exportada
+    siguiera ahí, las consultas lo contarían dos veces.
+    """
+    manifiesto = _leer_manifiesto()
+    _borrar_mes(tabla, manifiesto.setdefault(tabla, {}), f"{mes:%Y-%m}")
+    if os.path.isdir(config.ANALITICA_DIR):
+        _guardar_manifiesto(manifiesto)
+
+
+def exportar_hechos(conn, tabla, manifiesto, completo=False):
+    """Reescribe solo los meses nuevos o con cambios y borra los que ya no existen en la BD."""
+    columna_fecha, llave = HECHOS[tabla]
+    seleccion, esquema = _columnas(conn, tabla)
+    firmas = _firmas_por_mes(conn, tabla, columna_fecha, llave)
+    exportados = manifiesto.setdefault(tabla, {})
+
+    pendientes = sorted(m for m, firma in firmas.items() if completo or exportados.get(m) != firma)
+    filas = 0
+    for mes in pendientes:
+        anio, numero = (int(x) for x in mes.split('-'))
+        desde = date(anio, numero, 1)
+        hasta = date(anio + (numero == 12), numero % 12 + 1, 1)
+        consulta = f"SELECT {seleccion} FROM {tabla} WHERE {columna_fecha} >= %s AND {columna_fecha} < %s ORDER BY {llave};"
+        filas += _escribir_parquet(conn, consulta, (desde, hasta), esquema, _ruta_mes(tabla, mes))
+        exportados[mes] = firmas[mes]
+
+    for mes in sorted(set(exportados) - set(firmas)):
+        _borrar_mes(tabla, exportados, mes)
+
+    print(f"INFO: '{tabla}': {len(pendientes)} de {len(firmas)} meses exportados ({filas} filas).")
+    return filas
+
+
+def exportar_dimension(conn, tabla):
+    seleccion, esquema = _columnas(conn, tabla)
+    ruta = os.path.join(config.ANALITICA_DIR, 'dimensiones', f"{tabla}.parquet")
+    return _escribir_parquet(conn, f"SELECT {seleccion} FROM {tabla};", None, esquema, ruta)
+
+
+def _leer_manifiesto():
+    if not os.path.exists(RUTA_MANIFIESTO):
+        return {}
+    with open(RUTA_MANIFIESTO, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _guardar_manifiesto(manifiesto):
+    temporal = RUTA_MANIFIESTO + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2)
+    os.replace(temporal, RUTA_MANIFIESTO)
+
+
+def exportar_parquet(completo=False):
+    """
+    Exporta hechos y dimensiones a informes_generados/analitica/. Con completo=True se
+    reescriben todos los meses aunque su firma no haya cambiado.
+    """
+    print("=== INICIO DE LA EXPORTACIÓN A PARQUET ===")
+    conn = get_db_connection()
+    if not conn: return
+
+    try:
+        with medir_etapa('analitica', 'exportacion_parquet'):
+            os.makedirs(config.ANALITICA_DIR, exist_ok=True)
+            manifiesto = _leer_manifiesto()
+            # Una sola transacción de solo lectura: todas las tablas se ven en el mismo instante
+            conn.set_session(readonly=True, isolation_level='REPEATABLE READ')
+            filas = 0
+            for tabla in HECHOS:
+                filas += exportar_hechos(conn, tabla, manifiesto, completo)
+                # El manifiesto se guarda por tabla: si algo falla después, lo ya escrito no se repite
+                _guardar_manifiesto(manifiesto)
+            for tabla in DIMENSIONES:
+                filas += exportar_dimension(conn, tabla)
+            manifiesto['fecha_exportacion'] = datetime.now().isoformat(timespec='seconds')
+            _guardar_manifiesto(manifiesto)
+            conn.rollback()
+            registrar_metricas(filas_salida=filas)
+        print(f"\n¡ÉXITO! Exportación a Parquet completada en '{config.ANALITICA_DIR}'.")
+
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante la exportación a Parquet: {e}")
+        conn.rollback()
+    finally:
+        if conn: conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exporta el esquema en estrella a Parquet particionado por mes.')
+    parser.add_argument('--completo', action='store_true', help='Reescribe todos los meses, no solo los que cambiaron.')
+    args = parser.parse_args()
+    exportar_parquet(completo=args.completo)
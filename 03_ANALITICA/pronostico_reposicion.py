@@ -0,0 +1,237 @@
+# 03_ANALITICA/pronostico_reposicion.py
+# Pronóstico de demanda y punto de reorden por producto y bodega. La demanda de los últimos
+# HISTORIA_DIAS días se arma como una matriz densa serie x día (NumPy) y todos los modelos se
+# ajustan a todas las series a la vez; cada serie se queda con el de menor error cuadrático en los
+# últimos DIAS_VALIDACION días. Las series intermitentes (la mayoría de los días sin venta) prueban
+# además Croston. Con el stock de inventario_actual se calculan la cobertura y el punto de reorden.
+#
+#   python 03_ANALITICA/pronostico_reposicion.py                 # corte: ayer
+#   python 03_ANALITICA/pronostico_reposicion.py --corte 2024-06-30 --dias-reposicion 10
+
+import os
+import sys
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+from db_utils import get_db_connection, copiar_dataframe, leer_dataframe
+from instrumentacion import medir_etapa, registrar_metricas
+
+HISTORIA_DIAS = 182
+DIAS_VALIDACION = 14
+VENTANA_MEDIA_MOVIL = 28
+ALFA_SUAVIZADO = 0.2
+# Días de historia "virtuales" con factor 1 que suavizan la estacionalidad de las series con pocos datos
+PRIOR_ESTACIONALIDAD = 4
+# Proporción de días sin venta desde la que una serie es intermitente y puede usar Croston
+PROPORCION_INTERMITENTE = 0.5
+# Tiempo de reposición (días) y factor z del nivel de servicio (1.65 ~ 95 %)
+DIAS_REPOSICION = int(os.getenv('ETL_DIAS_REPOSICION', '7'))
+Z_NIVEL_SERVICIO = 1.65
+
+MODELOS = ['media_movil', 'suavizado', 'estacional', 'croston']
+# Tipo de día para la estacionalidad: 0-6 lunes a domingo, 7 festivo (según dim_tiempo)
+TIPOS_DIA = 8
+
+COLUMNAS_PLAN = [
+    'fecha_corte', 'id_producto_fk', 'id_bodega_fk', 'empresa_erp', 'modelo', 'demanda_diaria', 'error_diario',
+    'stock_disponible', 'dias_cobertura', 'stock_seguridad', 'punto_reorden', 'reponer',
+]
+
+
+def _suavizado_exponencial(demanda, alfa=ALFA_SUAVIZADO):
+    """Nivel final del suavizado exponencial simple de cada fila, como un solo producto matriz-vector."""
+    dias = demanda.shape[1]
+    pesos = alfa * (1 - alfa) ** np.arange(dias - 1, -1, -1)
+    # El nivel inicial es la primera semana; su peso es el que le queda al arranque de la recursión
+    inicial = demanda[:, :7].mean(axis=1) if dias else np.zeros(len(demanda))
+    return demanda @ pesos + (1 - alfa) ** dias * inicial
+
+
+def _nivel_semanal(demanda, alfa=ALFA_SUAVIZADO):
+    """
+    Nivel de cada serie sin el efecto del día de la semana: suavizado exponencial de la media móvil
+    de 7 días. Una venta semanal fija (ej. todos los lunes) da un nivel constante, sin importar en
+    qué día de la semana termina la historia.
+    """
+    acumulada = np.cumsum(np.pad(demanda, ((0, 0), (1, 0))), axis=1)
+    semanal = (acumulada[:, 7:] - acumulada[:, :-7]) / 7
+    return _suavizado_exponencial(semanal, alfa) if semanal.shape[1] else demanda.mean(axis=1)
+
+
+def _factores_estacionales(demanda, tipos):
+    """
+    Participación de cada tipo de día en la demanda de cada serie (demanda media del tipo / demanda
+    media), encogida hacia 1 y normalizada para que su promedio sobre los días de la historia sea 1:
+    nivel x factor reparte el nivel entre los días sin cambiar el total. Ningún día se divide por
+    el factor, así que los días sin venta de una serie intermitente no la deforman.
+    """
+    media = demanda.mean(axis=1, keepdims=True)
+    suma_tipo = demanda @ np.eye(TIPOS_DIA)[tipos]
+    dias_tipo = np.bincount(tipos, minlength=TIPOS_DIA)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        factores = (suma_tipo + PRIOR_ESTACIONALIDAD * media) / ((dias_tipo + PRIOR_ESTACIONALIDAD) * media)
+        factores = factores / factores[:, tipos].mean(axis=1, keepdims=True)
+    return np.where(media > 0, factores, 1.0)
+
+
+def _croston(demanda, alfa=ALFA_SUAVIZADO):
+    """
+    Método de Croston para demanda intermitente: suaviza por separado el tamaño de las ventas y el
+    intervalo entre ellas, y pronostica tamaño / intervalo por día. Recorre los días una vez,
+    con todas las series a la vez. Las series sin ventas pronostican 0.
+    """
+    tamano = np.full(len(demanda), np.nan)
+    intervalo = np.full(len(demanda), np.nan)
+    desde_ultima = np.ones(len(demanda))
+    for dia in demanda.T:
+        hubo = dia > 0
+        primera = hubo & np.isnan(tamano)
+        siguiente = hubo & ~primera
+        tamano[primera], intervalo[primera] = dia[primera], desde_ultima[primera]
+        tamano[siguiente] += alfa * (dia[siguiente] - tamano[siguiente])
+        intervalo[siguiente] += alfa * (desde_ultima[siguiente] - intervalo[siguiente])
+        desde_ultima = np.where(hubo, 1, desde_ultima + 1)
+    return np.nan_to_num(tamano / intervalo)
+
+
+def pronosticar(demanda, tipos_historia, tipos_futuro):
+    """
+    Pronóstico diario de cada serie (fila de `demanda`) para los días futuros con cada modelo.
+    `tipos_*` son los tipos de día (0..7) de las columnas de la historia y de los días a pronosticar.
+    Retorna {modelo: matriz series x días futuros}.
+    """
+    horizonte = len(tipos_futuro)
+    media_movil = demanda[:, -VENTANA_MEDIA_MOVIL:].mean(axis=1)
+    suavizado = _suavizado_exponencial(demanda)
+    factores = _factores_estacionales(demanda, tipos_historia)
+    return {
+        'media_movil': np.repeat(media_movil[:, None], horizonte, axis=1),
+        'suavizado': np.repeat(suavizado[:, None], horizonte, axis=1),
+        'estacional': _nivel_semanal(demanda)[:, None] * factores[:, tipos_futuro],
+        'croston': np.repeat(_croston(demanda)[:, None], horizonte, axis=1),
+    }
+
+
+def elegir_modelo(demanda, tipos):
+    """
+    Valida los modelos con los últimos DIAS_VALIDACION días de cada serie y elige el de menor error
+    cuadrático medio (el error absoluto premia pronosticar casi 0 en las series con muchos días sin
+    venta). Croston solo compite en las series intermitentes. Retorna el índice del modelo (en
+    MODELOS) y el error cuadrático medio por serie.
+    """
+    entrenamiento, validacion = demanda[:, :-DIAS_VALIDACION], demanda[:, -DIAS_VALIDACION:]
+    pronosticos = pronosticar(entrenamiento, tipos[:-DIAS_VALIDACION], tipos[-DIAS_VALIDACION:])
+    errores = np.stack([pronosticos[m] - validacion for m in MODELOS])   # modelos x series x días
+    rmse = np.sqrt((errores ** 2).mean(axis=2))                          # modelos x series
+    intermitente = (entrenamiento == 0).mean(axis=1) > PROPORCION_INTERMITENTE
+    rmse[MODELOS.index('croston'), ~intermitente] = np.inf
+    elegido = rmse.argmin(axis=0)
+    return elegido, rmse[elegido, np.arange(len(demanda))]
+
+
+def _leer_datos(conn, corte, dias_reposicion):
+    desde = corte - timedelta(days=HISTORIA_DIAS - 1)
+    demanda = leer_dataframe(conn, """
+        SELECT id_producto_fk, id_bodega_fk, fecha_sk, SUM(cantidad)::float8 AS cantidad
+        FROM hechos_ventas
+        WHERE fecha_sk BETWEEN %s AND %s AND id_bodega_fk IS NOT NULL
+        GROUP BY 1, 2, 3;
+    """, (desde, corte))
+    stock = leer_dataframe(conn, """
+        SELECT id_producto_fk, id_bodega_fk, SUM(cantidad_disponible)::float8 AS stock_disponible
+        FROM inventario_actual GROUP BY 1, 2;
+    """)
+    # Los días que aún no están en dim_tiempo se toman como no festivos
+    calendario = leer_dataframe(conn, """
+        SELECT d::date AS fecha_sk,
+               CASE WHEN COALESCE(t.es_festivo, FALSE) THEN 7 ELSE EXTRACT(ISODOW FROM d)::int - 1 END AS tipo_dia
+        FROM generate_series(%s::date, %s::date, INTERVAL '1 day') AS d
+        LEFT JOIN dim_tiempo t ON t.fecha_sk = d::date
+        ORDER BY 1;
+    """, (desde, corte + timedelta(days=dias_reposicion)))
+    empresas = leer_dataframe(conn, "SELECT id_producto AS id_producto_fk, empresa_erp FROM dim_productos;")
+    return desde, demanda, stock, calendario, empresas
+
+
+def calcular_plan(desde, demanda, stock, calendario, empresas, corte, dias_reposicion):
+    """Arma la matriz de demanda, pronostica todas las series y calcula cobertura y punto de reorden."""
+    series = pd.concat([demanda[['id_producto_fk', 'id_bodega_fk']], stock[['id_producto_fk', 'id_bodega_fk']]])
+    series = series.drop_duplicates(ignore_index=True).astype('int64')
+    posicion = pd.MultiIndex.from_frame(series)
+
+    # Matriz densa: una fila por producto x bodega, una columna por día (los días sin venta quedan en 0)
+    matriz = np.zeros((len(series), HISTORIA_DIAS))
+    if not demanda.empty:
+        filas = posicion.get_indexer(pd.MultiIndex.from_frame(demanda[['id_producto_fk', 'id_bodega_fk']].astype('int64')))
+        columnas = (pd.to_datetime(demanda['fecha_sk']) - pd.Timestamp(desde)).dt.days.to_numpy()
+        matriz[filas, columnas] = demanda['cantidad'].to_numpy()
+    # Las devoluciones de un día no son demanda negativa
+    matriz = np.clip(matriz, 0, None)
+
+    tipos = calendario['tipo_dia'].to_numpy()
+    tipos_historia, tipos_futuro = tipos[:HISTORIA_DIAS], tipos[HISTORIA_DIAS:]
+    elegido, error_diario = elegir_modelo(matriz, tipos_historia)
+    pronosticos = pronosticar(matriz, tipos_historia, tipos_futuro)
+    pronosticos = np.stack([pronosticos[m] for m in MODELOS])
+    demanda_reposicion = pronosticos[elegido, np.arange(len(series))].sum(axis=1)
+
+    plan = series.copy()
+    plan['fecha_corte'] = corte
+    plan['modelo'] = np.array(MODELOS)[elegido]
+    plan['demanda_diaria'] = (demanda_reposicion / dias_reposicion).round(4)
+    plan['error_diario'] = error_diario.round(4)
+    plan = plan.merge(stock, on=['id_producto_fk', 'id_bodega_fk'], how='left').merge(empresas, on='id_producto_fk', how='left')
+    plan['stock_disponible'] = plan['stock_disponible'].fillna(0.0)
+    plan['stock_seguridad'] = (Z_NIVEL_SERVICIO * plan['error_diario'] * np.sqrt(dias_reposicion)).round(4)
+    plan['punto_reorden'] = (demanda_reposicion + plan['stock_seguridad']).round(4)
+    plan['dias_cobertura'] = (plan['stock_disponible'] / plan['demanda_diaria'].where(plan['demanda_diaria'] > 0)).round(1)
+    plan['reponer'] = (plan['punto_reorden'] > 0) & (plan['stock_disponible'] <= plan['punto_reorden'])
+    return plan[COLUMNAS_PLAN]
+
+
+def actualizar_plan_reposicion(fecha_corte=None, dias_reposicion=DIAS_REPOSICION):
+    """
+    Pronostica la demanda de todos los productos por bodega con ventas o stock, reemplaza
+    plan_reposicion con el resultado y guarda en informes_generados/ los que hay que reponer.
+    """
+    print("=== INICIO DEL PRONÓSTICO DE DEMANDA Y PUNTOS DE REORDEN ===")
+    corte = fecha_corte or date.today() - timedelta(days=1)
+    conn = get_db_connection()
+    if not conn: return
+
+    try:
+        with medir_etapa('reposicion', 'pronostico') as etapa:
+            desde, demanda, stock, calendario, empresas = _leer_datos(conn, corte, dias_reposicion)
+            etapa['filas_entrada'] = len(demanda) + len(stock)
+            plan = calcular_plan(desde, demanda, stock, calendario, empresas, corte, dias_reposicion)
+            etapa['filas_salida'] = len(plan)
+
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM plan_reposicion;")
+                copiar_dataframe(conn, 'plan_reposicion', plan, COLUMNAS_PLAN)
+            conn.commit()
+            registrar_metricas(filas_afectadas_bd=len(plan))
+
+        por_reponer = plan[plan['reponer']].sort_values('dias_cobertura', na_position='last')
+        ruta = os.path.join(config.INFORMES_GENERADOS_DIR, 'productos_por_reponer.csv')
+        por_reponer.to_csv(ruta, index=False, encoding='utf-8-sig')
+        print(f"INFO: Modelo elegido por serie:\n{plan['modelo'].value_counts().to_string()}")
+        print(f"\n¡ÉXITO! {len(plan)} series pronosticadas al {corte}; {len(por_reponer)} por reponer en '{ruta}'.")
+
+    except Exception as e:
+        print(f"ERROR CRÍTICO durante el pronóstico de reposición: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pronóstico de demanda y puntos de reorden por producto y bodega.')
+    parser.add_argument('--corte', type=date.fromisoformat, help='Último día de historia (AAAA-MM-DD). Por defecto, ayer.')
+    parser.add_argument('--dias-reposicion', type=int, default=DIAS_REPOSICION, help='Tiempo de reposición en días.')
+    args = parser.parse_args()
+    actualizar_plan_reposicion(args.corte, args.dias_reposicion)
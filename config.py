@@ -67,6 +67,17 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATOS_ENTRADA_DIR = os.path.join(BASE_DIR, "datos_entrada")
 INFORMES_GENERADOS_DIR = os.path.join(BASE_DIR, "informes_generados")
 SQL_DIR = os.path.join(BASE_DIR, "sql")
+BENCHMARK_DIR = os.path.join(INFORMES_GENERADOS_DIR, "benchmark")
+# Bitácora de mediciones por etapa del ETL (una línea JSON por etapa ejecutada)
+ETL_RUN_LOG_PATH = os.path.join(INFORMES_GENERADOS_DIR, "etl_run_log.jsonl")
+# Perfiles de CPU/memoria generados con perfilado.py
+PERF_DIR = os.path.join(INFORMES_GENERADOS_DIR, "perf")
+# Estructuras compiladas reutilizables entre corridas (ej. reglas de mapeo de productos)
+CACHE_DIR = os.path.join(INFORMES_GENERADOS_DIR, "cache")
+# Exportación a Parquet del esquema en estrella para consultas analíticas (03_ANALITICA/)
+ANALITICA_DIR = os.path.join(INFORMES_GENERADOS_DIR, "analitica")
+# Archivo en frío de los meses antiguos de hechos_ventas (Parquet). Conviene ubicarlo en un disco con respaldo.
+ARCHIVO_VENTAS_DIR = os.getenv("ARCHIVO_VENTAS_DIR", os.path.join(BASE_DIR, "archivo_ventas"))
 
 # --- Creación de Directorios (Buena práctica) ---
 try:
@@ -1,8 +1,15 @@
 # db_utils.py
 # Funciones de utilidad para interactuar con la base de datos.
 
+import io
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
 import psycopg2
 from psycopg2 import extras
+from psycopg2.pool import ThreadedConnectionPool
 import config
 
 def get_db_connection():
@@ -69,4 +76,247 @@ def copy_csv_to_db(conn, csv_filepath, table_name):
         except psycopg2.Error as e:
             print(f"ERROR al ejecutar COPY en la tabla '{table_name}': {e}")
             conn.rollback()
-            raise
\ No newline at end of file
+            raise
+
+# Filas que trae el servidor en cada viaje al leer por bloques (ajustable con ETL_ITERSIZE).
+ITERSIZE = int(os.getenv('ETL_ITERSIZE', '5000'))
+
+def leer_por_bloques(conn, query, params=None, tamano_bloque=ITERSIZE, tipos=None):
+    """
+    Lee una consulta con un cursor con nombre (del lado del servidor) y la entrega como
+    DataFrames de máximo `tamano_bloque` filas, sin traer el resultado completo a memoria.
+    :param tipos: dict opcional {columna: dtype} que se aplica a cada bloque.
+    Si la consulta no trae filas, entrega un único bloque vacío (con sus columnas).
+    El cursor vive dentro de la transacción de `conn`: no hacer commit mientras se itera.
+    """
+    nombre_cursor = f"lectura_{uuid.uuid4().hex[:12]}"
+    with conn.cursor(name=nombre_cursor) as cursor:
+        cursor.itersize = tamano_bloque
+        cursor.execute(query, params)
+        columnas = None
+        while True:
+            filas = cursor.fetchmany(tamano_bloque)
+            if columnas is None:
+                columnas = [c[0] for c in cursor.description]
+            elif not filas:
+                break
+            bloque = pd.DataFrame.from_records(filas, columns=columnas)
+            if tipos:
+                bloque = bloque.astype({c: t for c, t in tipos.items() if c in bloque.columns})
+            yield bloque
+
+def leer_dataframe(conn, query, params=None, tamano_bloque=ITERSIZE, tipos=None):
+    """Igual que leer_por_bloques, pero une los bloques en un solo DataFrame."""
+    return pd.concat(leer_por_bloques(conn, query, params, tamano_bloque, tipos), ignore_index=True)
+
+def escribir_csv_por_bloques(bloques, ruta_salida, transformar=None):
+    """
+    Escribe en un CSV los DataFrames de un iterador (ej. leer_por_bloques) a medida que llegan.
+    `transformar` se aplica a cada bloque antes de escribirlo. El archivo solo se crea si hay
+    al menos una fila. Retorna el número de filas escritas.
+    """
+    total = 0
+    for bloque in bloques:
+        if transformar is not None:
+            bloque = transformar(bloque)
+        if bloque.empty:
+            continue
+        bloque.to_csv(ruta_salida, index=False, mode='w' if total == 0 else 'a', header=(total == 0))
+        total += len(bloque)
+    return total
+
+def copiar_dataframe(conn, tabla, df, columnas=None):
+    """
+    Inserta un DataFrame en una tabla con COPY FROM STDIN (formato CSV, nulos como \\N).
+    No hace commit: la transacción la maneja quien llama. Retorna el número de filas copiadas.
+    """
+    columnas = list(columnas or df.columns)
+    buffer = io.StringIO()
+    df[columnas].to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+    return len(df)
+
+# --- Carga en paralelo ---
+# Para recargas grandes: cada pieza viaja por su propia conexión (un backend de PostgreSQL por
+# COPY) a una tabla de carga UNLOGGED, y quien llama la publica después en una sola transacción.
+
+# Conexiones simultáneas de la carga en paralelo
+CONEXIONES_CARGA = int(os.getenv('ETL_CONEXIONES_CARGA', '4'))
+
+def crear_tabla_carga(conn, tabla):
+    """
+    Crea una tabla UNLOGGED vacía con las columnas de `tabla` (sin índices, restricciones ni
+    valores por defecto) y la confirma, para que las demás conexiones puedan copiar en ella.
+    Retorna su nombre.
+    """
+    carga = f"{tabla.lower()}__carga_{uuid.uuid4().hex[:8]}"
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE UNLOGGED TABLE {carga} AS SELECT * FROM {tabla} WITH NO DATA;")
+    conn.commit()
+    return carga
+
+def copiar_en_paralelo(tabla, piezas, columnas=None, conexiones=CONEXIONES_CARGA):
+    """
+    COPY de cada DataFrame de `piezas` a `tabla`, a la vez, cada uno por una conexión de un pool
+    de `conexiones`. Cada pieza se confirma por separado, así que `tabla` debe ser una tabla de
+    carga que luego se publica de una vez. Un error en cualquier pieza se propaga.
+    Retorna el número de filas copiadas.
+    """
+    pool = ThreadedConnectionPool(1, conexiones, **config.DB_CONFIG)
+
+    def _copiar(pieza):
+        conn = pool.getconn()
+        try:
+            filas = copiar_dataframe(conn, tabla, pieza, columnas)
+            conn.commit()
+            return filas
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
+
+    try:
+        with ThreadPoolExecutor(max_workers=conexiones) as ejecutor:
+            return sum(ejecutor.map(_copiar, piezas))
+    finally:
+        pool.closeall()
+
+# --- Carga por tabla sombra ---
+# La tabla se recarga completa en una copia (sombra) sin índices, luego se le construyen los
+# índices y restricciones de la original y, en una transacción corta, la sombra toma su lugar.
+# Los lectores ven la versión anterior hasta el intercambio y nunca una tabla vacía o a medias.
+
+# Máximo que el intercambio espera por el bloqueo exclusivo antes de desistir (no encola lectores).
+LOCK_TIMEOUT_INTERCAMBIO = os.getenv('ETL_LOCK_TIMEOUT_INTERCAMBIO', '5s')
+
+def _nombre_sombra(tabla):
+    return f"{tabla.lower()}__sombra"
+
+def preparar_tabla_sombra(conn, tabla):
+    """
+    Crea (vacía) la tabla sombra de `tabla` con sus mismas columnas, valores por defecto y
+    restricciones CHECK/NOT NULL, pero sin índices para que el COPY sea rápido. Retorna su nombre.
+    """
+    tabla, sombra = tabla.lower(), _nombre_sombra(tabla)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {sombra};")
+        cursor.execute(f"""
+            CREATE TABLE {sombra} (LIKE {tabla}
+                INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED
+                INCLUDING IDENTITY INCLUDING STORAGE INCLUDING COMMENTS);
+        """)
+    conn.commit()
+    return sombra
+
+def _indices_de(cursor, tabla):
+    """(nombre, definición, tipo de restricción o None) de cada índice de la tabla."""
+    cursor.execute("""
+        SELECT i.relname, pg_get_indexdef(x.indexrelid), c.contype
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        LEFT JOIN pg_constraint c ON c.conindid = x.indexrelid AND c.conrelid = x.indrelid
+        WHERE x.indrelid = %s::regclass;
+    """, (tabla,))
+    return cursor.fetchall()
+
+def publicar_tabla_sombra(conn, tabla, sombra=None):
+    """
+    Construye en la sombra los índices, llaves y llaves foráneas de `tabla`, la analiza y la
+    intercambia con la tabla viva en una sola transacción corta (renombrar y borrar la anterior).
+    Los índices y restricciones quedan con sus nombres originales; se conservan el comentario
+    de la tabla y los permisos (GRANT). No se admiten tablas referenciadas por llaves foráneas.
+    """
+    tabla = tabla.lower()
+    sombra = sombra or _nombre_sombra(tabla)
+    anterior = f"{tabla}__anterior"
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_constraint WHERE confrelid = %s::regclass AND contype = 'f';", (tabla,))
+        if cursor.fetchone():
+            raise ValueError(f"La tabla '{tabla}' es referenciada por llaves foráneas; no se puede cargar por intercambio.")
+
+        # --- PASO 1: Índices y llaves (fuera del intercambio: es la parte lenta) ---
+        renombrar = []
+        for nombre, definicion, tipo_restriccion in _indices_de(cursor, tabla):
+            if tipo_restriccion not in (None, 'p', 'u'):
+                raise ValueError(f"El índice '{nombre}' respalda una restricción no soportada ({tipo_restriccion}).")
+            temporal = f"{nombre[:54]}__sombra"
+            # "CREATE [UNIQUE] INDEX nombre ON public.tabla USING btree (...)" -> mismo índice sobre la sombra
+            crear, resto = re.match(r'(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ (.*)', definicion).groups()
+            cursor.execute(f"{crear} {temporal} ON {sombra} {resto};")
+            if tipo_restriccion == 'p':
+                cursor.execute(f"ALTER TABLE {sombra} ADD CONSTRAINT {temporal} PRIMARY KEY USING INDEX {temporal};")
+            elif tipo_restriccion == 'u':
+                cursor.execute(f"ALTER TABLE {sombra} ADD CONSTRAINT {temporal} UNIQUE USING INDEX {temporal};")
+            renombrar.append((temporal, nombre))
+
+        # Llaves foráneas salientes (sus nombres solo deben ser únicos por tabla)
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f';
+        """, (tabla,))
+        for nombre, definicion in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {sombra} ADD CONSTRAINT {nombre} {definicion};")
+
+        # Comentario y permisos de la tabla viva
+        cursor.execute("SELECT obj_description(%s::regclass, 'pg_class');", (tabla,))
+        comentario = cursor.fetchone()[0]
+        if comentario:
+            cursor.execute(f"COMMENT ON TABLE {sombra} IS %s;", (comentario,))
+        cursor.execute("""
+            SELECT grantee, string_agg(privilege_type, ', ') FROM information_schema.role_table_grants
+            WHERE table_schema = 'public' AND table_name = %s AND grantee <> current_user
+            GROUP BY grantee;
+        """, (tabla,))
+        for rol, privilegios in cursor.fetchall():
+            destino = rol if rol == 'PUBLIC' else f'"{rol}"'
+            cursor.execute(f"GRANT {privilegios} ON {sombra} TO {destino};")
+        cursor.execute(f"ANALYZE {sombra};")
+    conn.commit()
+
+    # --- PASO 2: Intercambio (transacción corta con bloqueo exclusivo) ---
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("SET LOCAL lock_timeout = %s;", (LOCK_TIMEOUT_INTERCAMBIO,))
+            cursor.execute(f"LOCK TABLE {tabla} IN ACCESS EXCLUSIVE MODE;")
+            # Las secuencias (SERIAL) pertenecen a la tabla vieja: se pasan a la nueva antes de borrarla
+            cursor.execute("""
+                SELECT s.relname, a.attname
+                FROM pg_depend d
+                JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+                JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+                WHERE d.refobjid = %s::regclass AND d.deptype = 'a';
+            """, (tabla,))
+            secuencias = cursor.fetchall()
+            cursor.execute(f"ALTER TABLE {tabla} RENAME TO {anterior};")
+            cursor.execute(f"ALTER TABLE {sombra} RENAME TO {tabla};")
+            for secuencia, columna in secuencias:
+                cursor.execute(f"ALTER SEQUENCE {secuencia} OWNED BY {tabla}.{columna};")
+            cursor.execute(f"DROP TABLE {anterior};")
+            for temporal, nombre in renombrar:
+                cursor.execute(f"ALTER INDEX {temporal} RENAME TO {nombre};")
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"ERROR al intercambiar la tabla '{tabla}' con su sombra: {e}")
+            conn.rollback()
+            raise
+
+def cargar_por_intercambio(conn, tabla, df, columnas=None):
+    """
+    Recarga completa de `tabla` con el contenido del DataFrame: COPY a la sombra, índices y
+    un intercambio atómico. Retorna el número de filas cargadas.
+    """
+    sombra = preparar_tabla_sombra(conn, tabla)
+    try:
+        filas = copiar_dataframe(conn, sombra, df, columnas)
+        conn.commit()
+        publicar_tabla_sombra(conn, tabla, sombra)
+    except Exception:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {sombra};")
+        conn.commit()
+        raise
+    return filas
@@ -0,0 +1,112 @@
+# huellas.py
+# Registro de huellas (hash) de lo último que se procesó de la API, para no repetir trabajo:
+# por empresa y endpoint (payload completo) y por registro (cada producto / cliente).
+
+import os
+import hashlib
+
+import pandas as pd
+from psycopg2 import extras
+
+from db_utils import get_db_connection
+
+# Con ETL_IGNORAR_HUELLAS=1 se procesa todo aunque el payload no haya cambiado (ej. tras corregir datos a mano).
+IGNORAR_HUELLAS = os.getenv('ETL_IGNORAR_HUELLAS', '0') == '1'
+
+
+class RegistroHuellas:
+    """
+    Huellas de un proceso (ej. 'productos'). Se leen al crearlo y las nuevas quedan pendientes
+    hasta confirmar(), que debe llamarse solo después de que la carga se haya confirmado en la BD.
+
+    :param contexto: texto que se mezcla en todas las huellas. Si cambia (ej. los mapeos de
+                     corrección), todo se considera cambiado y se vuelve a procesar.
+    """
+
+    def __init__(self, proceso, endpoint, contexto=''):
+        self.proceso = proceso
+        self.endpoint = endpoint
+        self.contexto = contexto
+        self._payloads_pendientes = {}
+        self._registros_pendientes = []
+        self._payloads = {}
+        if IGNORAR_HUELLAS:
+            print(f"INFO: ETL_IGNORAR_HUELLAS activo: se procesará todo '{proceso}'.")
+            return
+        conn = get_db_connection()
+        if not conn:
+            return
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT empresa_erp, huella FROM etl_huellas_payload WHERE proceso = %s AND endpoint = %s;",
+                    (proceso, endpoint)
+                )
+                self._payloads = dict(cursor.fetchall())
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudieron leer las huellas de '{proceso}'; se procesará todo: {e}")
+        finally:
+            conn.close()
+
+    def payload_sin_cambios(self, empresa, contenido):
+        """
+        Compara el contenido crudo de la respuesta (bytes) con la huella de la última carga.
+        Si cambió, deja la nueva huella pendiente y retorna False.
+        """
+        huella = hashlib.sha256(self.contexto.encode('utf-8') + contenido).hexdigest()
+        if self._payloads.get(empresa) == huella:
+            return True
+        self._payloads_pendientes[empresa] = huella
+        return False
+
+    def _huellas_registros(self, df, llaves, columnas):
+        """Llave (texto) y huella (entero de 64 bits) de cada fila, vectorizado."""
+        llave = df[llaves[0]].astype(str)
+        for col in llaves[1:]:
+            llave = llave + '|' + df[col].astype(str)
+        datos = df[columnas].astype(str).assign(_contexto=self.contexto)
+        huella = pd.util.hash_pandas_object(datos, index=False).astype('int64')
+        return pd.DataFrame({'empresa_erp': df['empresa_erp'].to_numpy(), 'llave': llave.to_numpy(), 'huella': huella.to_numpy()})
+
+    def filtrar_cambiados(self, conn, df, llaves, columnas):
+        """
+        Devuelve solo las filas nuevas o cuyo contenido (columnas) cambió desde la última carga.
+        Las huellas de esas filas quedan pendientes de confirmar.
+        """
+        if df is None or df.empty:
+            return df
+        actuales = self._huellas_registros(df, llaves, columnas)
+        if IGNORAR_HUELLAS:
+            cambiados = pd.Series(True, index=df.index)
+        else:
+            anteriores = pd.read_sql_query(
+                "SELECT empresa_erp, llave, huella FROM etl_huellas_registro WHERE proceso = %s AND empresa_erp = ANY(%s);",
+                conn, params=(self.proceso, list(actuales['empresa_erp'].unique()))
+            )
+            cruce = actuales.merge(anteriores, on=['empresa_erp', 'llave'], how='left', suffixes=('', '_anterior'))
+            cambiados = pd.Series((cruce['huella'] != cruce['huella_anterior']).to_numpy(), index=df.index)
+        self._registros_pendientes.append(actuales[cambiados.to_numpy()])
+        print(f"INFO: {int(cambiados.sum())} de {len(df)} registros de '{self.proceso}' son nuevos o cambiaron.")
+        return df[cambiados]
+
+    def confirmar(self, conn):
+        """Guarda las huellas pendientes (payloads y registros) una vez confirmada la carga."""
+        registros = pd.concat(self._registros_pendientes, ignore_index=True) if self._registros_pendientes else None
+        with conn.cursor() as cursor:
+            if self._payloads_pendientes:
+                extras.execute_values(cursor, """
+                    INSERT INTO etl_huellas_payload (proceso, endpoint, empresa_erp, huella) VALUES %s
+                    ON CONFLICT (proceso, endpoint, empresa_erp) DO UPDATE SET
+                        huella = EXCLUDED.huella, fecha_proceso = NOW();
+                """, [(self.proceso, self.endpoint, e, h) for e, h in self._payloads_pendientes.items()])
+            if registros is not None and not registros.empty:
+                # Un registro repetido en el payload se guarda una sola vez (queda la última versión)
+                registros = registros.drop_duplicates(subset=['empresa_erp', 'llave'], keep='last')
+                extras.execute_values(cursor, """
+                    INSERT INTO etl_huellas_registro (proceso, empresa_erp, llave, huella) VALUES %s
+                    ON CONFLICT (proceso, empresa_erp, llave) DO UPDATE SET
+                        huella = EXCLUDED.huella, fecha_proceso = NOW();
+                """, [(self.proceso, e, l, int(h)) for e, l, h in registros.itertuples(index=False)], page_size=1000)
+        conn.commit()
+        self._payloads.update(self._payloads_pendientes)
+        self._payloads_pendientes, self._registros_pendientes = {}, []
@@ -0,0 +1,288 @@
+# instrumentacion.py
+# Medición por etapa (extracción, transformación, carga) de los procesos ETL.
+
+import os
+import json
+import time
+import uuid
+import atexit
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+import pandas as pd
+import psutil
+from psycopg2 import extras
+
+import config
+from db_utils import get_db_connection
+
+# Identificador de la corrida: agrupa todas las etapas ejecutadas en un mismo proceso diario.
+ID_EJECUCION = datetime.now().strftime('%Y%m%d_%H%M%S_') + uuid.uuid4().hex[:6]
+
+# Etapa que se está midiendo en este momento (permite registrar métricas desde cualquier función interna).
+_etapa_actual = contextvars.ContextVar('etapa_actual', default=None)
+
+# Mediciones terminadas que aún no se guardan en etl_run_log: se insertan juntas, con una sola
+# conexión, al cerrar la corrida (ver guardar_registros_pendientes()).
+_PENDIENTES = []
+_candado_pendientes = threading.Lock()
+
+COLUMNAS_LOG = [
+    'id_ejecucion', 'proceso', 'etapa', 'inicio', 'segundos', 'filas_entrada', 'filas_salida',
+    'bytes_descargados', 'filas_afectadas_bd', 'memoria_pico_mb', 'estado', 'mensaje_error'
+]
+
+
+class MonitorMemoria:
+    """Muestrea en un hilo de fondo la memoria residente (RSS) del proceso y guarda el pico."""
+
+    def __init__(self, intervalo=0.05):
+        self.intervalo = intervalo
+        self.proceso = psutil.Process()
+        self.pico = 0
+        self._detener = threading.Event()
+
+    def _muestrear(self):
+        while not self._detener.is_set():
+            self.pico = max(self.pico, self.proceso.memory_info().rss)
+            self._detener.wait(self.intervalo)
+
+    def __enter__(self):
+        self.pico = self.proceso.memory_info().rss
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+        self.pico = max(self.pico, self.proceso.memory_info().rss)
+
+
+def iniciar_ejecucion():
+    """Abre una nueva corrida (nuevo id_ejecucion). La llama el orquestador al inicio de cada proceso."""
+    global ID_EJECUCION
+    guardar_registros_pendientes()
+    ID_EJECUCION = datetime.now().strftime('%Y%m%d_%H%M%S_') + uuid.uuid4().hex[:6]
+    return ID_EJECUCION
+
+
+def registrar_metricas(**metricas):
+    """
+    Suma métricas a la etapa en curso (ej. bytes_descargados=len(response.content)).
+    Si no hay ninguna etapa abierta, no hace nada.
+    """
+    registro = _etapa_actual.get()
+    if registro is None:
+        return
+    for campo, valor in metricas.items():
+        if valor is None:
+            continue
+        registro[campo] = (registro.get(campo) or 0) + valor
+
+
+def registrar_error(error):
+    """Marca la etapa en curso como fallida cuando la función captura la excepción y no la relanza."""
+    registro = _etapa_actual.get()
+    if registro is not None:
+        registro['estado'] = 'ERROR'
+        registro['mensaje_error'] = str(error)[:500]
+
+
+def _aplanar(registro):
+    """El registro seguido de los de sus etapas anidadas (en el orden en que terminaron)."""
+    registros = [registro]
+    for anidada in registro['_anidadas']:
+        registros.extend(_aplanar(anidada))
+    return registros
+
+
+def _marcar_revertidas(registro):
+    """
+    La etapa falló: sus etapas anidadas que corrían dentro de su transacción y terminaron bien
+    no dejaron nada en la BD (la transacción se revirtió), así que se marcan REVERTIDA.
+    """
+    for anidada in registro['_anidadas']:
+        if anidada['_en_transaccion'] and anidada['estado'] == 'OK':
+            anidada['estado'] = 'REVERTIDA'
+            anidada['mensaje_error'] = f"Revertida con la etapa {registro['proceso']}/{registro['etapa']}."
+            _marcar_revertidas(anidada)
+
+
+def _guardar_registro(registro):
+    """
+    Escribe el registro (y los de sus etapas anidadas) en el archivo JSON-lines y los deja
+    pendientes para etl_run_log.
+    """
+    registros = [{c: r.get(c) for c in COLUMNAS_LOG} for r in _aplanar(registro)]
+    try:
+        with open(config.ETL_RUN_LOG_PATH, 'a', encoding='utf-8') as f:
+            for r in registros:
+                f.write(json.dumps(r, ensure_ascii=False, default=str) + '\n')
+    except OSError as e:
+        print(f"ADVERTENCIA: No se pudo escribir el log de ejecución: {e}")
+    with _candado_pendientes:
+        _PENDIENTES.extend(registros)
+
+
+def guardar_registros_pendientes():
+    """
+    Inserta en etl_run_log, con una sola conexión y una sola sentencia, las mediciones acumuladas
+    de la corrida. Se llama al abrir la siguiente corrida, antes de leer la bitácora y al salir.
+    Retorna los registros guardados.
+    """
+    with _candado_pendientes:
+        registros = list(_PENDIENTES)
+        _PENDIENTES.clear()
+    if not registros:
+        return 0
+
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        query = f"INSERT INTO etl_run_log ({', '.join(COLUMNAS_LOG)}) VALUES %s;"
+        with conn.cursor() as cursor:
+            extras.execute_values(cursor, query, [tuple(r[c] for c in COLUMNAS_LOG) for r in registros])
+        conn.commit()
+        return len(registros)
+    except Exception as e:
+        print(f"ADVERTENCIA: No se pudieron guardar {len(registros)} mediciones en 'etl_run_log': {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+
+atexit.register(guardar_registros_pendientes)
+
+
+@contextmanager
+def medir_etapa(proceso, etapa, filas_entrada=None, en_transaccion=False):
+    """
+    Context manager que mide una etapa del ETL: tiempo, memoria pico y las métricas que
+    se registren dentro con registrar_metricas(). Al terminar guarda el registro.
+
+        with medir_etapa('ventas', 'carga', filas_entrada=len(df)):
+            ...
+            registrar_metricas(filas_afectadas_bd=cursor.rowcount)
+
+    Una etapa abierta dentro de otra se guarda junto con la de afuera. Con en_transaccion=True
+    la etapa no confirma: corre dentro de la transacción de la etapa que la contiene, y si esa
+    etapa falla queda como REVERTIDA aunque ella haya terminado bien.
+    """
+    padre = _etapa_actual.get()
+    registro = {
+        'id_ejecucion': ID_EJECUCION, 'proceso': proceso, 'etapa': etapa,
+        'inicio': datetime.now().astimezone().isoformat(timespec='seconds'),
+        'filas_entrada': filas_entrada, 'estado': 'OK', 'mensaje_error': None,
+        '_en_transaccion': en_transaccion, '_anidadas': [],
+    }
+    token = _etapa_actual.set(registro)
+    inicio = time.perf_counter()
+    try:
+        with MonitorMemoria() as monitor:
+            yield registro
+    except Exception as e:
+        registro['estado'] = 'ERROR'
+        registro['mensaje_error'] = str(e)[:500]
+        raise
+    finally:
+        _etapa_actual.reset(token)
+        registro['segundos'] = round(time.perf_counter() - inicio, 3)
+        registro['memoria_pico_mb'] = round(monitor.pico / 1024 ** 2, 1)
+        if registro['estado'] == 'ERROR':
+            _marcar_revertidas(registro)
+        if padre is None:
+            _guardar_registro(registro)
+        else:
+            padre['_anidadas'].append(registro)
+
+
+def _contar_filas(objeto):
+    """Número de filas de un DataFrame o de una lista de registros (None para otros objetos)."""
+    return len(objeto) if isinstance(objeto, (pd.DataFrame, list)) else None
+
+
+def instrumentar(proceso, etapa):
+    """
+    Decorador para las funciones de extracción, transformación y carga. Mide la etapa y toma
+    automáticamente las filas de entrada (primer argumento DataFrame o lista) y de salida (lo que retorne).
+    """
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            filas_entrada = next((_contar_filas(a) for a in args if _contar_filas(a) is not None), None)
+            with medir_etapa(proceso, etapa, filas_entrada=filas_entrada) as registro:
+                resultado = funcion(*args, **kwargs)
+                if registro.get('filas_salida') is None:
+                    registro['filas_salida'] = _contar_filas(resultado)
+                return resultado
+        return envoltura
+    return decorador
+
+
+def _leer_registros(dias):
+    """Lee las mediciones de los últimos días desde la BD; si no hay conexión, desde el JSON-lines."""
+    guardar_registros_pendientes()
+    conn = get_db_connection()
+    if conn:
+        try:
+            query = f"SELECT {', '.join(COLUMNAS_LOG)} FROM etl_run_log WHERE inicio >= NOW() - %s * INTERVAL '1 day';"
+            return pd.read_sql_query(query, conn, params=(dias,))
+        finally:
+            conn.close()
+
+    print("ADVERTENCIA: Se usará el archivo JSON-lines para el resumen.")
+    if not os.path.exists(config.ETL_RUN_LOG_PATH):
+        return pd.DataFrame(columns=COLUMNAS_LOG)
+    df = pd.read_json(config.ETL_RUN_LOG_PATH, lines=True)
+    df['inicio'] = pd.to_datetime(df['inicio'], utc=True)
+    return df[df['inicio'] >= pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=dias)]
+
+
+def resumen_rendimiento(dias=30):
+    """
+    Muestra, por proceso y etapa, la última medición frente al promedio del periodo,
+    para detectar qué etapa de la corrida diaria se volvió más lenta.
+    """
+    print(f"=== RESUMEN DE RENDIMIENTO DEL ETL (últimos {dias} días) ===")
+    df = _leer_registros(dias)
+    if df.empty:
+        print("INFO: No hay mediciones registradas en el periodo.")
+        return None
+
+    errores = df[df['estado'] == 'ERROR'].groupby(['proceso', 'etapa']).size()
+    # Una etapa puede medirse varias veces por corrida (una vez por empresa en el pipeline): se suman
+    sumar = lambda serie: serie.sum(min_count=1)
+    df = (df[df['estado'] == 'OK']
+          .groupby(['id_ejecucion', 'proceso', 'etapa'], as_index=False)
+          .agg(inicio=('inicio', 'min'), segundos=('segundos', 'sum'), filas_entrada=('filas_entrada', sumar),
+               filas_salida=('filas_salida', sumar), memoria_pico_mb=('memoria_pico_mb', 'max'))
+          .sort_values('inicio'))
+    df['filas_por_segundo'] = df['filas_salida'].fillna(df['filas_entrada']) / df['segundos'].where(df['segundos'] > 0)
+    agrupado = df.groupby(['proceso', 'etapa'])
+    resumen = pd.DataFrame({
+        'corridas': agrupado.size(),
+        'seg_ultima': agrupado['segundos'].last(),
+        'seg_promedio': agrupado['segundos'].mean().round(2),
+        'seg_max': agrupado['segundos'].max(),
+        'filas_s_ultima': agrupado['filas_por_segundo'].last().round(1),
+        'mem_mb_ultima': agrupado['memoria_pico_mb'].last(),
+    })
+    resumen['var_vs_promedio_%'] = ((resumen['seg_ultima'] / resumen['seg_promedio'] - 1) * 100).round(1)
+    resumen['errores'] = errores.reindex(resumen.index, fill_value=0)
+
+    print(resumen.to_string())
+    return resumen
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resumen de las mediciones por etapa del ETL.')
+    parser.add_argument('--dias', type=int, default=30, help='Días hacia atrás a considerar.')
+    args = parser.parse_args()
+    resumen_rendimiento(args.dias)
@@ -2,13 +2,20 @@
 
 import sys
 import os
+import argparse
 
 # --- Configuración de Rutas ---
 # Añadimos las carpetas de los scripts al path de Python para poder importarlos
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '00_ETL_TNS')))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '01_MODELO_DATOS_Y_AUXILIARES')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '03_ANALITICA')))
 
 # --- Importación de las Funciones Principales ---
+# Instrumentación (bitácora de rendimiento por etapa)
+from instrumentacion import iniciar_ejecucion, resumen_rendimiento
+# Perfilado opcional de pasos (ETL_PERFILAR / --perfilar)
+from perfilado import ejecutar_paso, perfilar
+
 # Cargas de API
 from cargar_productos_api import ejecutar_etl_productos
 from cargar_clientes_api import ejecutar_etl_clientes
@@ -18,8 +25,10 @@ from cargar_ventas_api import ejecutar_etl_ventas
 
 # Auditorías
 from auditoria_gestion_productos import auditar_productos_sin_gestion
+from sugerir_clasificacion_productos import sugerir_clasificacion_productos
 from auditoria_gestion_clientes import auditar_clientes_sin_gestion
 from auditoria_gestion_vendedores import auditar_vendedores
+from sugerir_enlaces_clientes import sugerir_enlaces_clientes
 
 # Sincronizaciones Manuales
 from sincronizar_maestro_clientes import sincronizar_maestro_clientes
@@ -27,57 +36,97 @@ from sincronizar_clasificacion_clientes import sincronizar_clasificacion_cliente
 from sincronizar_gestion_productos import sincronizar_gestion_productos
 from sincronizar_maestro_personas import sincronizar_maestro_personas
 from sincronizar_roles_vendedores import sincronizar_roles
+from reprocesar_cuarentena_ventas import reprocesar_cuarentena_ventas
+from clasificacion_abc import actualizar_clasificacion_abc
+from segmentacion_rfm import actualizar_segmentacion_rfm
 
 # Tareas Ocasionales
 from poblar_dimensiones_catalogo import poblar_catalogos
 from generar_snapshot_inventario import generar_snapshot_inventario
 
+# Analítica (exportación a Parquet, archivo y reposición)
+from exportar_parquet import exportar_parquet
+from archivar_ventas import archivar_ventas
+from pronostico_reposicion import actualizar_plan_reposicion
+
 
 def ejecutar_cargas_diarias_api():
     """Ejecuta todos los scripts que extraen datos de la API."""
     print("\n--- INICIANDO FASE 1: CARGAS DESDE LA API ---")
+    print(f"INFO: Id de ejecución para la bitácora de rendimiento: {iniciar_ejecucion()}")
     try:
-        ejecutar_etl_productos()
+        ejecutar_paso(ejecutar_etl_productos)
     except Exception as e:
         print(f"ERROR en cargar_productos_api.py: {e}")
     
     try:
-        ejecutar_etl_clientes()
+        ejecutar_paso(ejecutar_etl_clientes)
     except Exception as e:
         print(f"ERROR en cargar_clientes_api.py: {e}")
         
     try:
-        sincronizar_vendedores_api()
+        ejecutar_paso(sincronizar_vendedores_api)
     except Exception as e:
         print(f"ERROR en cargar_vendedores_api_crudo.py: {e}")
 
     try:
-        ejecutar_etl_inventario()
+        ejecutar_paso(ejecutar_etl_inventario)
     except Exception as e:
         print(f"ERROR en cargar_inventario_api.py: {e}")
     
     try:
-        ejecutar_etl_ventas()
+        ejecutar_paso(ejecutar_etl_ventas)
     except Exception as e:
         print(f"ERROR en cargar_ventas_api.py: {e}")
 
+    # Las dimensiones recién cargadas pueden completar líneas de días anteriores
+    try:
+        ejecutar_paso(reprocesar_cuarentena_ventas)
+    except Exception as e:
+        print(f"ERROR en reprocesar_cuarentena_ventas.py: {e}")
+
+    # Con las ventas del día ya cargadas, las ventanas ABC y el RFM avanzan hasta ayer
+    try:
+        ejecutar_paso(actualizar_clasificacion_abc)
+    except Exception as e:
+        print(f"ERROR en clasificacion_abc.py: {e}")
+    try:
+        ejecutar_paso(actualizar_segmentacion_rfm)
+    except Exception as e:
+        print(f"ERROR en segmentacion_rfm.py: {e}")
+    # Con ventas e inventario del día: pronóstico de demanda y puntos de reorden
+    try:
+        ejecutar_paso(actualizar_plan_reposicion)
+    except Exception as e:
+        print(f"ERROR en pronostico_reposicion.py: {e}")
+
     print("\n--- FASE 1 COMPLETADA ---")
 
 def ejecutar_auditorias():
     """Ejecuta todos los scripts de auditoría para generar los reportes de pendientes."""
     print("\n--- INICIANDO FASE 2: AUDITORÍA DE DATOS DE GESTIÓN ---")
     try:
-        auditar_productos_sin_gestion()
+        ejecutar_paso(auditar_productos_sin_gestion)
     except Exception as e:
         print(f"ERROR en auditoria_gestion_productos.py: {e}")
+
+    try:
+        ejecutar_paso(sugerir_clasificacion_productos)
+    except Exception as e:
+        print(f"ERROR en sugerir_clasificacion_productos.py: {e}")
     
     try:
-        auditar_clientes_sin_gestion()
+        ejecutar_paso(auditar_clientes_sin_gestion)
     except Exception as e:
         print(f"ERROR en auditoria_gestion_clientes.py: {e}")
+
+    try:
+        ejecutar_paso(sugerir_enlaces_clientes)
+    except Exception as e:
+        print(f"ERROR en sugerir_enlaces_clientes.py: {e}")
         
     try:
-        auditar_vendedores()
+        ejecutar_paso(auditar_vendedores)
     except Exception as e:
         print(f"ERROR en auditoria_gestion_vendedores.py: {e}")
     print("\n--- FASE 2 COMPLETADA ---")
@@ -86,28 +135,34 @@ def ejecutar_sincronizaciones_manuales():
     """Ejecuta todos los scripts que sincronizan los archivos CSV manuales."""
     print("\n--- INICIANDO FASE 3: SINCRONIZACIÓN DE ARCHIVOS MANUALES ---")
     try:
-        sincronizar_gestion_productos()
+        ejecutar_paso(sincronizar_gestion_productos)
     except Exception as e:
         print(f"ERROR en sincronizar_gestion_productos.py: {e}")
     
     # Para clientes y vendedores, el orden es importante
     try:
-        sincronizar_maestro_clientes()
+        ejecutar_paso(sincronizar_maestro_clientes)
     except Exception as e:
         print(f"ERROR en sincronizar_maestro_clientes.py: {e}")
     try:
-        sincronizar_clasificacion_clientes()
+        ejecutar_paso(sincronizar_clasificacion_clientes)
     except Exception as e:
         print(f"ERROR en sincronizar_clasificacion_clientes.py: {e}")
         
     try:
-        sincronizar_maestro_personas()
+        ejecutar_paso(sincronizar_maestro_personas)
     except Exception as e:
         print(f"ERROR en sincronizar_maestro_personas.py: {e}")
     try:
-        sincronizar_roles()
+        ejecutar_paso(sincronizar_roles)
     except Exception as e:
         print(f"ERROR en sincronizar_roles_vendedores.py: {e}")
+
+    # Con productos, clientes y roles ya sincronizados, se intenta promover la cuarentena de ventas
+    try:
+        ejecutar_paso(reprocesar_cuarentena_ventas)
+    except Exception as e:
+        print(f"ERROR en reprocesar_cuarentena_ventas.py: {e}")
     print("\n--- FASE 3 COMPLETADA ---")
 
 def ejecutar_tareas_ocasionales():
@@ -118,20 +173,38 @@ def ejecutar_tareas_ocasionales():
         print("\n--- MENÚ DE TAREAS OCASIONALES ---")
         print("1. Poblar Catálogos Base (marcas, líneas, bodegas, departamentos, grupos)")
         print("2. Generar Snapshot Histórico de Inventario")
-        print("3. Volver al menú principal")
+        print("3. Ver Resumen de Rendimiento del ETL (últimos 30 días)")
+        print("4. Exportar Hechos y Dimensiones a Parquet (análisis local)")
+        print("5. Archivar Meses Antiguos de Ventas (Parquet en frío)")
+        print("6. Volver al menú principal")
         sub_opcion = input("Elige una opción: ")
 
         if sub_opcion == '1':
             try:
-                poblar_catalogos()
+                ejecutar_paso(poblar_catalogos)
             except Exception as e:
                 print(f"ERROR en poblar_dimensiones_catalogo.py: {e}")
         elif sub_opcion == '2':
             try:
-                generar_snapshot_inventario()
+                ejecutar_paso(generar_snapshot_inventario)
             except Exception as e:
                 print(f"ERROR en generar_snapshot_inventario.py: {e}")
         elif sub_opcion == '3':
+            try:
+                resumen_rendimiento()
+            except Exception as e:
+                print(f"ERROR en instrumentacion.py: {e}")
+        elif sub_opcion == '4':
+            try:
+                ejecutar_paso(exportar_parquet)
+            except Exception as e:
+                print(f"ERROR en exportar_parquet.py: {e}")
+        elif sub_opcion == '5':
+            try:
+                ejecutar_paso(archivar_ventas)
+            except Exception as e:
+                print(f"ERROR en archivar_ventas.py: {e}")
+        elif sub_opcion == '6':
             break
         else:
             print("Opción no válida.")
@@ -164,5 +237,25 @@ def mostrar_menu():
         else:
             print("Opción no válida. Por favor, intenta de nuevo.")
 
+# Pasos que se pueden ejecutar sueltos (y perfilar) con: python main.py --perfilar <paso>
+PASOS_DISPONIBLES = {f.__name__: f for f in [
+    ejecutar_etl_productos, ejecutar_etl_clientes, sincronizar_vendedores_api, ejecutar_etl_inventario,
+    ejecutar_etl_ventas, auditar_productos_sin_gestion, sugerir_clasificacion_productos,
+    auditar_clientes_sin_gestion, sugerir_enlaces_clientes, auditar_vendedores,
+    sincronizar_gestion_productos, sincronizar_maestro_clientes, sincronizar_clasificacion_clientes,
+    sincronizar_maestro_personas, sincronizar_roles, reprocesar_cuarentena_ventas, actualizar_clasificacion_abc,
+    actualizar_segmentacion_rfm, poblar_catalogos,
+    generar_snapshot_inventario, exportar_parquet, archivar_ventas, actualizar_plan_reposicion,
+]}
+
 if __name__ == '__main__':
-    mostrar_menu()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Orquestador de procesos de gestión comercial.')
+    parser.add_argument('--perfilar', choices=sorted(PASOS_DISPONIBLES), metavar='PASO',
+                        help='Ejecuta solo este paso bajo cProfile y guarda el perfil en informes_generados/perf/.')
+    parser.add_argument('--memoria', action='store_true', help='Con --perfilar, rastrea también la memoria con tracemalloc.')
+    args = parser.parse_args()
+
+    if args.perfilar:
+        perfilar(PASOS_DISPONIBLES[args.perfilar], memoria=args.memoria)
+    else:
+        mostrar_menu()
\ No newline at end of file
@@ -0,0 +1,96 @@
+# perfilado.py
+# Perfilado opcional (cProfile + tracemalloc) de los pasos que ejecuta el orquestador.
+
+import os
+import io
+import time
+import pstats
+import cProfile
+import tracemalloc
+from datetime import datetime
+
+import config
+
+# Pasos a perfilar durante el menú, por nombre de función: ETL_PERFILAR=ejecutar_etl_ventas,auditar_productos_sin_gestion
+# (o ETL_PERFILAR=todos). Con ETL_PERFILAR_MEMORIA=1 se agrega tracemalloc.
+PASOS_A_PERFILAR = {p.strip() for p in os.getenv('ETL_PERFILAR', '').split(',') if p.strip()}
+PERFILAR_MEMORIA = os.getenv('ETL_PERFILAR_MEMORIA', '0') == '1'
+# Número de funciones / líneas que se listan en el resumen.
+TOP_N = int(os.getenv('ETL_PERFILAR_TOP', '30'))
+
+# True mientras corre un paso perfilado (ver perfilando()).
+_perfilando = False
+
+
+def perfilando():
+    """
+    Indica si hay un paso bajo cProfile. cProfile solo mide bien el hilo que lo activó, así que
+    el pipeline corre sus etapas en este mismo hilo, una tras otra, mientras esto sea True.
+    """
+    return _perfilando
+
+
+def _resumen_cpu(perfil, top):
+    """Texto con las funciones más costosas, por tiempo acumulado y por tiempo propio."""
+    salida = io.StringIO()
+    estadisticas = pstats.Stats(perfil, stream=salida).strip_dirs()
+    salida.write(f"--- Top {top} por tiempo acumulado (cumulative) ---\n")
+    estadisticas.sort_stats('cumulative').print_stats(top)
+    salida.write(f"\n--- Top {top} por tiempo propio (tottime) ---\n")
+    estadisticas.sort_stats('tottime').print_stats(top)
+    return salida.getvalue()
+
+
+def _resumen_memoria(foto, top):
+    """Texto con las líneas de código que más memoria tenían asignada al terminar el paso."""
+    lineas = [f"--- Top {top} asignaciones de memoria por línea (tracemalloc) ---"]
+    for i, stat in enumerate(foto.statistics('lineno')[:top], 1):
+        marco = stat.traceback[0]
+        lineas.append(f"{i:>3}. {marco.filename}:{marco.lineno}  {stat.size / 1024 ** 2:.2f} MB en {stat.count} bloques")
+    return "\n".join(lineas) + "\n"
+
+
+def perfilar(funcion, *args, memoria=False, top=TOP_N, **kwargs):
+    """
+    Ejecuta la función bajo cProfile (y opcionalmente tracemalloc) y guarda en informes_generados/perf/:
+    el perfil binario (.prof, abrible con snakeviz o pstats) y un resumen .txt con los puntos calientes.
+    """
+    os.makedirs(config.PERF_DIR, exist_ok=True)
+    nombre = getattr(funcion, '__name__', 'paso')
+    base = os.path.join(config.PERF_DIR, f"{nombre}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    print(f"INFO: Perfilando '{nombre}' (memoria: {'sí' if memoria else 'no'})...")
+
+    global _perfilando
+    if memoria:
+        tracemalloc.start()
+    perfil = cProfile.Profile()
+    inicio = time.perf_counter()
+    _perfilando = True
+    try:
+        return perfil.runcall(funcion, *args, **kwargs)
+    finally:
+        _perfilando = False
+        segundos = time.perf_counter() - inicio
+        foto = None
+        if memoria:
+            foto = tracemalloc.take_snapshot()
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        perfil.dump_stats(base + '.prof')
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(f"Paso: {nombre}\nSegundos: {segundos:.3f}\n")
+            if foto is not None:
+                f.write(f"Pico de memoria rastreada: {pico / 1024 ** 2:.1f} MB\n\n")
+                f.write(_resumen_memoria(foto, top))
+            f.write("\n")
+            f.write(_resumen_cpu(perfil, top))
+        print(f"INFO: Perfil guardado en: {base}.prof (resumen en {base}.txt)")
+
+
+def ejecutar_paso(funcion, *args, **kwargs):
+    """Ejecuta un paso del orquestador; si fue pedido en ETL_PERFILAR, lo ejecuta perfilado."""
+    nombre = getattr(funcion, '__name__', '')
+    if 'todos' in PASOS_A_PERFILAR or nombre in PASOS_A_PERFILAR:
+        return perfilar(funcion, *args, memoria=PERFILAR_MEMORIA, **kwargs)
+    return funcion(*args, **kwargs)
@@ -0,0 +1,94 @@
+# pipeline.py
+# Ejecuta extracción -> transformación -> carga por empresa con las etapas solapadas.
+
+import queue
+import threading
+
+from instrumentacion import medir_etapa
+from perfilado import perfilando
+
+# Señal de fin que cada etapa envía a la siguiente cuando ya no hay más elementos.
+_FIN = object()
+
+# Elementos que pueden esperar entre dos etapas. Con 1, la descarga de la siguiente
+# empresa se frena si la transformación va atrasada (contrapresión) y la memoria queda acotada.
+CAPACIDAD_COLA = 1
+
+
+def _etiqueta(elemento):
+    """Nombre legible del elemento que recorre el pipeline (ej. el nombre corto de la empresa)."""
+    return elemento.get('nombre_corto', str(elemento)) if isinstance(elemento, dict) else str(elemento)
+
+
+def _trabajador(nombre_etapa, funcion, entrada, salida, errores):
+    """
+    Toma elementos de la cola de entrada, aplica la función de la etapa y pasa el resultado a la salida.
+    Un error en una empresa se reporta y no detiene a las demás (igual que en los ETL por empresa).
+    """
+    while True:
+        item = entrada.get()
+        if item is _FIN:
+            break
+        elemento, dato = item
+        try:
+            resultado = funcion(elemento, dato)
+        except Exception as e:
+            print(f"ERROR en la etapa '{nombre_etapa}' para {_etiqueta(elemento)}: {e}")
+            errores.append((nombre_etapa, _etiqueta(elemento), str(e)))
+            continue
+        # None significa "nada que pasar a la siguiente etapa" (ej. empresa sin datos)
+        if salida is not None and resultado is not None:
+            salida.put((elemento, resultado))
+    if salida is not None:
+        salida.put(_FIN)
+
+
+def ejecutar_pipeline(proceso, elementos, extraer, transformar, cargar, capacidad=CAPACIDAD_COLA):
+    """
+    Corre las tres etapas en hilos separados unidos por colas acotadas: mientras una empresa se
+    carga, la siguiente se transforma y la otra se descarga. Cada función recibe el elemento
+    (configuración de la empresa) y, salvo extraer, el dato que produjo la etapa anterior:
+
+        extraer(elemento) -> dato | None
+        transformar(elemento, dato) -> dato | None
+        cargar(elemento, dato)
+
+    La carga de cada empresa debe manejar su propia transacción. Devuelve la lista de errores.
+
+    Si el paso se está perfilando (ETL_PERFILAR / --perfilar), las etapas corren una tras otra en
+    este hilo, sin solapamiento, para que el perfil incluya el trabajo de todas.
+    """
+    en_linea = perfilando()
+    # En línea cada etapa procesa todas las empresas antes de la siguiente: las colas no pueden ser acotadas
+    capacidad = 0 if en_linea else capacidad
+    cola_entrada = queue.Queue()
+    cola_extraidos = queue.Queue(maxsize=capacidad)
+    cola_transformados = queue.Queue(maxsize=capacidad)
+    for elemento in elementos:
+        cola_entrada.put((elemento, None))
+    cola_entrada.put(_FIN)
+
+    errores = []
+    etapas = [
+        ('extraccion', lambda elemento, _: extraer(elemento), cola_entrada, cola_extraidos),
+        ('transformacion', transformar, cola_extraidos, cola_transformados),
+        ('carga', cargar, cola_transformados, None),
+    ]
+
+    with medir_etapa(proceso, 'pipeline_total'):
+        if en_linea:
+            print(f"INFO: Perfilando: las etapas del pipeline de {proceso} corren en secuencia.")
+            for nombre_etapa, funcion, entrada, salida in etapas:
+                _trabajador(nombre_etapa, funcion, entrada, salida, errores)
+        else:
+            hilos = [threading.Thread(target=_trabajador, name=f'{proceso}-{nombre_etapa}', daemon=True,
+                                      args=(nombre_etapa, funcion, entrada, salida, errores))
+                     for nombre_etapa, funcion, entrada, salida in etapas]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+
+    if errores:
+        print(f"ADVERTENCIA: El pipeline de {proceso} terminó con {len(errores)} error(es).")
+    return errores
@@ -8,6 +8,9 @@
 --    LOCALE_PROVIDER = 'libc'
 --    CONNECTION LIMIT = -1;
 
+-- Este script borra y recrea cada tabla. Para actualizar una base con datos usa sql/migracion_esquema.sql,
+-- y al agregar aquí una tabla o columna, agrégala también allá.
+
 DROP TABLE IF EXISTS Dim_Lineas CASCADE;
 CREATE TABLE Dim_Lineas (
     id_linea SERIAL PRIMARY KEY,
@@ -107,6 +110,46 @@ CREATE TABLE Dim_Productos (
 );
 COMMENT ON TABLE Dim_Productos IS 'Tabla maestra de productos tal como existen en el ERP para cada empresa.';
 
+DROP TABLE IF EXISTS Dim_Productos_Historia CASCADE;
+CREATE TABLE Dim_Productos_Historia (
+    id_producto_historia SERIAL PRIMARY KEY,
+    id_producto_fk INT NOT NULL REFERENCES Dim_Productos(id_producto),
+
+    -- Atributos de Dim_Productos tal como estaban durante la vigencia
+    descripcion_erp VARCHAR(255),
+    cod_grupo_erp VARCHAR(50),
+    cod_linea_erp VARCHAR(50),
+    cod_dpto_sku_erp VARCHAR(50),
+    cod_marca_erp VARCHAR(50),
+    costo_promedio_erp NUMERIC(18, 6),
+    costo_ult_erp NUMERIC(18, 6),
+    huella_atributos CHAR(32) NOT NULL, -- md5 de los atributos: si no cambia, no se abre versión
+
+    -- Columnas para manejar el historial
+    fecha_inicio_validez DATE NOT NULL,
+    fecha_fin_validez DATE NOT NULL,
+    CONSTRAINT uq_producto_historia_inicio UNIQUE (id_producto_fk, fecha_inicio_validez)
+);
+-- Búsqueda de la versión vigente (fecha_fin_validez = '9999-12-31') al comparar huellas.
+CREATE INDEX idx_productos_historia_vigente ON Dim_Productos_Historia (id_producto_fk, fecha_fin_validez);
+COMMENT ON TABLE Dim_Productos_Historia IS 'Tabla histórica (SCD Tipo 2) de los atributos y costos de cada producto. La mantiene el ETL de productos.';
+
+DROP TABLE IF EXISTS Dim_Precios_Lista_Historia CASCADE;
+CREATE TABLE Dim_Precios_Lista_Historia (
+    id_precio_historia SERIAL PRIMARY KEY,
+    id_producto_fk INT NOT NULL REFERENCES Dim_Productos(id_producto),
+    cod_lista_erp VARCHAR(20) NOT NULL, -- OCODLISTA de los Items del producto
+    precio NUMERIC(18, 4) NOT NULL,
+
+    -- Solo se abre una fila cuando el precio de la lista cambia
+    fecha_inicio_validez DATE NOT NULL,
+    fecha_fin_validez DATE NOT NULL,
+    CONSTRAINT uq_precio_lista_inicio UNIQUE (id_producto_fk, cod_lista_erp, fecha_inicio_validez)
+);
+-- Búsqueda de los precios vigentes (fecha_fin_validez = '9999-12-31') de cada producto.
+CREATE INDEX idx_precios_lista_vigente ON Dim_Precios_Lista_Historia (id_producto_fk, fecha_fin_validez);
+COMMENT ON TABLE Dim_Precios_Lista_Historia IS 'Historia de precios por lista de cada producto, con vigencia. Una fila por cambio de precio; la mantiene el ETL de productos.';
+
 CREATE TABLE Inventario_Actual (
     id_producto_fk INT NOT NULL REFERENCES dim_productos(id_producto),
     id_bodega_fk INT NOT NULL REFERENCES Dim_Bodegas(id_bodega),
@@ -132,6 +175,24 @@ CREATE TABLE Hechos_Inventario (
 
 COMMENT ON TABLE Hechos_Inventario IS 'Tabla de hechos histórica para almacenar snapshots del inventario en momentos específicos.';
 
+DROP TABLE IF EXISTS Plan_Reposicion CASCADE;
+CREATE TABLE Plan_Reposicion (
+    fecha_corte DATE NOT NULL,            -- Último día de historia usado en el pronóstico
+    id_producto_fk INT NOT NULL REFERENCES dim_productos(id_producto),
+    id_bodega_fk INT NOT NULL REFERENCES Dim_Bodegas(id_bodega),
+    empresa_erp VARCHAR(50),
+    modelo VARCHAR(30) NOT NULL,          -- Modelo con menor error en la validación: media_movil, suavizado, estacional o croston
+    demanda_diaria NUMERIC(18, 4) NOT NULL,  -- Promedio pronosticado durante el tiempo de reposición
+    error_diario NUMERIC(18, 4) NOT NULL,    -- Error cuadrático medio diario del modelo en la validación
+    stock_disponible NUMERIC(18, 4) NOT NULL,
+    dias_cobertura NUMERIC(18, 1),           -- NULL si no hay demanda pronosticada
+    stock_seguridad NUMERIC(18, 4) NOT NULL,
+    punto_reorden NUMERIC(18, 4) NOT NULL,
+    reponer BOOLEAN NOT NULL,
+    PRIMARY KEY (id_producto_fk, id_bodega_fk)
+);
+COMMENT ON TABLE Plan_Reposicion IS 'Último pronóstico de demanda por producto y bodega, con días de cobertura y punto de reorden. Se reemplaza completo en cada corrida.';
+
 DROP TABLE IF EXISTS Maestro_Clientes CASCADE;
 CREATE TABLE Maestro_Clientes (
     id_maestro_cliente SERIAL PRIMARY KEY,
@@ -165,6 +226,8 @@ CREATE TABLE Dim_Clientes_Empresa (
     CONSTRAINT uq_cliente_por_empresa UNIQUE (cod_cliente_erp, empresa_erp)
 );
 COMMENT ON TABLE Dim_Clientes_Empresa IS 'Registros de clientes por empresa, tal como vienen del ERP. Se enlazan a un único cliente maestro.';
+-- Índice parcial para la auditoría de clientes pendientes de enlazar al maestro.
+CREATE INDEX idx_clientes_empresa_sin_maestro ON Dim_Clientes_Empresa (id_cliente_empresa) WHERE id_maestro_cliente_fk IS NULL;
 
 DROP TABLE IF EXISTS Dim_Clientes_Clasificacion_Historia CASCADE;
 CREATE TABLE Dim_Clientes_Clasificacion_Historia (
@@ -183,6 +246,8 @@ CREATE TABLE Dim_Clientes_Clasificacion_Historia (
     fecha_fin_validez DATE NOT NULL
 );
 COMMENT ON TABLE Dim_Clientes_Clasificacion_Historia IS 'Tabla histórica (SCD Tipo 2) que registra las clasificaciones de un cliente a lo largo del tiempo.';
+-- Búsqueda de la versión vigente por maestro al recalcular la clasificación de las ventas.
+CREATE INDEX idx_clasificacion_historia_maestro ON Dim_Clientes_Clasificacion_Historia (id_maestro_cliente_fk, fecha_inicio_validez);
 
 DROP TABLE IF EXISTS Dim_Roles_Comerciales_Historia CASCADE;
 CREATE TABLE Dim_Roles_Comerciales_Historia (
@@ -312,7 +377,7 @@ CREATE TABLE Gestion_Productos_Aux (
     descripcion_guia VARCHAR(255),
     clasificacion_py VARCHAR(100),
     equivalencia_py VARCHAR(50),
-    peso_neto NUMERIC(10, 4),
+    peso_neto NUMERIC(10, 4)
     --grupo_tq VARCHAR(100), Se crea un módulo dedicado para tq
     --activo_compra BOOLEAN DEFAULT TRUE, Se crea una tabla dedicada
 
@@ -359,10 +424,155 @@ CREATE TABLE Hechos_Ventas (
     lista_precio_erp VARCHAR(20),
     observaciones_erp VARCHAR(255),
     motivo_devolucion_erp VARCHAR(255),
-    pedido_tiendapp VARCHAR(20)
+    pedido_tiendapp VARCHAR(20),
+
+    -- Versión del producto (atributos y costos) vigente en la fecha de la venta
+    id_producto_historia_fk INT REFERENCES Dim_Productos_Historia(id_producto_historia),
+    -- Clasificación del cliente (canal, subcanal...) vigente en la fecha de la venta
+    id_clasificacion_historia_fk INT REFERENCES Dim_Clientes_Clasificacion_Historia(id_clasificacion_historia)
 );
 
 COMMENT ON TABLE Hechos_Ventas IS 'Tabla de hechos central que registra cada línea de venta. Conecta todas las dimensiones y contiene las medidas de negocio.';
+-- Índices para las auditorías: "¿tiene ventas desde X fecha?" por producto y por cliente (EXISTS).
+CREATE INDEX idx_hechos_ventas_producto_fecha ON Hechos_Ventas (id_producto_fk, fecha_sk);
+CREATE INDEX idx_hechos_ventas_cliente_fecha ON Hechos_Ventas (id_cliente_empresa_fk, fecha_sk);
+-- Índice por fecha: recarga por rango del ETL y exportación a Parquet mes a mes.
+CREATE INDEX idx_hechos_ventas_fecha ON Hechos_Ventas (fecha_sk);
+-- Una línea del ERP (DEKARDEXID por empresa) solo se carga una vez, aunque las ventanas de carga se solapen.
+CREATE UNIQUE INDEX uq_hechos_ventas_transaccion ON Hechos_Ventas (empresa_erp, id_transaccion_erp);
+
+DROP TABLE IF EXISTS Cuarentena_Ventas CASCADE;
+CREATE TABLE Cuarentena_Ventas (
+    -- Llave de la línea en el ERP (DEKARDEXID por empresa)
+    empresa_erp VARCHAR(50) NOT NULL,
+    id_transaccion_erp BIGINT NOT NULL,
+
+    -- Línea tal como llegó de la API (ya renombrada), para poder re-enriquecerla sin volver a llamarla
+    numero_factura_erp VARCHAR(50),
+    fecha_str VARCHAR(20),
+    fecha_sk DATE,
+    cod_cliente_erp VARCHAR(50),
+    codigo_producto_erp VARCHAR(30),
+    referencia_erp VARCHAR(30),
+    cod_vendedor_erp VARCHAR(50),
+    cantidad NUMERIC(18, 4),
+    valor_base NUMERIC(18, 4),
+    valor_descuento NUMERIC(18, 4),
+    valor_iva NUMERIC(18, 4),
+    valor_total NUMERIC(18, 4),
+    costo_total NUMERIC(18, 4),
+    precio_lista NUMERIC(18, 4),
+    forma_pago_erp VARCHAR(10),
+    bodega_erp VARCHAR(20),
+    lista_precio_erp VARCHAR(20),
+    observaciones_erp VARCHAR(255),
+    motivo_devolucion_erp VARCHAR(255),
+    pedido_tiendapp VARCHAR(20),
+
+    -- Control del rechazo
+    motivo_rechazo VARCHAR(100) NOT NULL, -- Dimensiones faltantes, ej: 'producto,rol_vendedor'
+    fecha_ingreso TIMESTAMP DEFAULT NOW(),
+    intentos INT DEFAULT 0,
+    fecha_ultimo_intento TIMESTAMP,
+    PRIMARY KEY (empresa_erp, id_transaccion_erp)
+);
+CREATE INDEX idx_cuarentena_ventas_fecha ON Cuarentena_Ventas (empresa_erp, fecha_sk);
+
+COMMENT ON TABLE Cuarentena_Ventas IS 'Líneas de venta que no se pudieron enriquecer (producto, cliente, vendedor o bodega inexistentes). Se reprocesan y promueven a Hechos_Ventas.';
+
+DROP TABLE IF EXISTS Archivo_Hechos_Ventas CASCADE;
+CREATE TABLE Archivo_Hechos_Ventas (
+    mes DATE NOT NULL,                   -- Primer día del mes archivado
+    parte INT NOT NULL,                  -- Un mes puede archivarse en varias partes (ventas promovidas después)
+    ruta_archivo VARCHAR(500) NOT NULL,  -- Relativa a ARCHIVO_VENTAS_DIR
+    filas BIGINT NOT NULL,
+    sha256 CHAR(64) NOT NULL,
+    suma_valor_total NUMERIC(24, 4) NOT NULL,
+    suma_cantidad NUMERIC(24, 4) NOT NULL,
+    fecha_archivo TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (mes, parte)
+);
+COMMENT ON TABLE Archivo_Hechos_Ventas IS 'Registro de los meses de Hechos_Ventas movidos a Parquet (archivo en frío), con filas, sumas de control y sha256 de cada archivo.';
+
+DROP TABLE IF EXISTS Resumen_Margenes_Mes CASCADE;
+CREATE TABLE Resumen_Margenes_Mes (
+    mes DATE NOT NULL,                  -- Primer día del mes
+    empresa_erp VARCHAR(50) NOT NULL,
+    eje VARCHAR(20) NOT NULL,           -- 'producto', 'cliente', 'rol', 'bodega' o 'empresa'
+    id_miembro INT NOT NULL,            -- id_producto, id_cliente_empresa, id_rol_historia o id_bodega (0 para 'empresa')
+
+    -- Solo sumas: los porcentajes se calculan al consultar, para poder agregar varios meses
+    lineas BIGINT NOT NULL,
+    cantidad NUMERIC(24, 4) NOT NULL,
+    valor_base NUMERIC(24, 4) NOT NULL,
+    valor_descuento NUMERIC(24, 4) NOT NULL,
+    costo_total NUMERIC(24, 4) NOT NULL,
+    valor_neto_con_costo NUMERIC(24, 4) NOT NULL,  -- Valor neto de las líneas que traen costo
+    valor_lista NUMERIC(24, 4) NOT NULL,           -- precio_lista x cantidad
+    valor_neto_con_lista NUMERIC(24, 4) NOT NULL,  -- Valor neto de las líneas que traen precio de lista
+    PRIMARY KEY (mes, empresa_erp, eje, id_miembro)
+);
+CREATE INDEX idx_resumen_margenes_eje ON Resumen_Margenes_Mes (eje, mes);
+COMMENT ON TABLE Resumen_Margenes_Mes IS 'Sumas mensuales de ventas, descuentos, costo y precio de lista por producto, cliente, rol y bodega. El ETL de ventas recalcula solo los meses que recarga.';
+
+DROP TABLE IF EXISTS Ventas_Diarias_Entidad CASCADE;
+CREATE TABLE Ventas_Diarias_Entidad (
+    fecha_sk DATE NOT NULL,
+    empresa_erp VARCHAR(50) NOT NULL,
+    tipo_entidad VARCHAR(20) NOT NULL,  -- 'producto' (id_producto) o 'cliente' (id_cliente_empresa)
+    id_entidad INT NOT NULL,
+    lineas INT NOT NULL,
+    facturas INT NOT NULL,
+    valor_neto NUMERIC(24, 4) NOT NULL,  -- valor_base - valor_descuento
+    utilidad NUMERIC(24, 4) NOT NULL,    -- valor neto - costo_total (líneas con costo)
+    PRIMARY KEY (fecha_sk, empresa_erp, tipo_entidad, id_entidad)
+);
+COMMENT ON TABLE Ventas_Diarias_Entidad IS 'Venta neta y utilidad por día, empresa y producto o cliente. El ETL de ventas recalcula los días que recarga; base de los acumulados ABC.';
+
+DROP TABLE IF EXISTS Acumulado_ABC CASCADE;
+CREATE TABLE Acumulado_ABC (
+    ventana_meses SMALLINT NOT NULL,
+    tipo_entidad VARCHAR(20) NOT NULL,
+    id_entidad INT NOT NULL,
+    valor_neto NUMERIC(24, 4) NOT NULL,
+    utilidad NUMERIC(24, 4) NOT NULL,
+    PRIMARY KEY (ventana_meses, tipo_entidad, id_entidad)
+);
+COMMENT ON TABLE Acumulado_ABC IS 'Suma de Ventas_Diarias_Entidad en cada ventana móvil, a la fecha de corte de Control_ABC. Se mantiene por diferencia.';
+
+DROP TABLE IF EXISTS Control_ABC CASCADE;
+CREATE TABLE Control_ABC (
+    ventana_meses SMALLINT PRIMARY KEY,
+    fecha_corte DATE NOT NULL  -- La ventana cubre (fecha_corte - ventana_meses meses, fecha_corte]
+);
+
+DROP TABLE IF EXISTS Dim_Clasificacion_ABC_Historia CASCADE;
+CREATE TABLE Dim_Clasificacion_ABC_Historia (
+    id_clasificacion_abc SERIAL PRIMARY KEY,
+    tipo_entidad VARCHAR(20) NOT NULL,  -- 'producto', 'maestro' (id_maestro_cliente) o 'cliente_empresa'
+    id_entidad INT NOT NULL,
+    ventana_meses SMALLINT NOT NULL,
+    clase_venta CHAR(1) NOT NULL,       -- A, B o C por venta neta
+    clase_utilidad CHAR(1) NOT NULL,    -- A, B o C por utilidad
+    fecha_inicio_validez DATE NOT NULL,
+    fecha_fin_validez DATE NOT NULL,
+    CONSTRAINT uq_clasificacion_abc_inicio UNIQUE (tipo_entidad, id_entidad, ventana_meses, fecha_inicio_validez)
+);
+CREATE INDEX idx_clasificacion_abc_vigente ON Dim_Clasificacion_ABC_Historia (fecha_fin_validez);
+COMMENT ON TABLE Dim_Clasificacion_ABC_Historia IS 'Historia de la clase ABC (Pareto) de productos y clientes por ventana móvil de 3, 6 y 12 meses. Solo se abre versión cuando cambia la clase.';
+
+DROP TABLE IF EXISTS Dim_Segmento_RFM_Historia CASCADE;
+CREATE TABLE Dim_Segmento_RFM_Historia (
+    id_segmento_rfm SERIAL PRIMARY KEY,
+    tipo_entidad VARCHAR(20) NOT NULL,  -- 'maestro' (id_maestro_cliente) o 'cliente_empresa' (id_cliente_empresa)
+    id_entidad INT NOT NULL,
+    segmento VARCHAR(30) NOT NULL,      -- Campeones, Leales, Potenciales, Nuevos, Requieren atención, En riesgo, Hibernando, Perdidos
+    fecha_inicio_validez DATE NOT NULL,
+    fecha_fin_validez DATE NOT NULL,
+    CONSTRAINT uq_segmento_rfm_inicio UNIQUE (tipo_entidad, id_entidad, fecha_inicio_validez)
+);
+CREATE INDEX idx_segmento_rfm_vigente ON Dim_Segmento_RFM_Historia (fecha_fin_validez);
+COMMENT ON TABLE Dim_Segmento_RFM_Historia IS 'Historia del segmento RFM (recencia, frecuencia, valor) de cada cliente maestro. Solo se abre versión cuando cambia el segmento.';
 
 CREATE TABLE Dim_Producto_Estado_Historia (
     id_estado_historia SERIAL PRIMARY KEY,
@@ -415,4 +625,48 @@ CREATE TABLE Api_Vendedores_Crudo (
     PRIMARY KEY (cod_cliente_erp, empresa_erp)
 );
 
-COMMENT ON TABLE Api_Vendedores_Crudo IS 'Tabla temporal que guarda el estado diario de los vendedores según la API de TNS.';
\ No newline at end of file
+COMMENT ON TABLE Api_Vendedores_Crudo IS 'Tabla temporal que guarda el estado diario de los vendedores según la API de TNS.';
+
+DROP TABLE IF EXISTS Etl_Run_Log CASCADE;
+CREATE TABLE Etl_Run_Log (
+    id_registro BIGSERIAL PRIMARY KEY,
+    id_ejecucion VARCHAR(40) NOT NULL,
+    proceso VARCHAR(50) NOT NULL,
+    etapa VARCHAR(50) NOT NULL,
+    inicio TIMESTAMPTZ NOT NULL,
+    segundos NUMERIC(12, 3),
+    filas_entrada INT,
+    filas_salida INT,
+    bytes_descargados BIGINT,
+    filas_afectadas_bd INT,
+    memoria_pico_mb NUMERIC(10, 1),
+    estado VARCHAR(10) NOT NULL,       -- OK, ERROR o REVERTIDA (terminó bien dentro de una transacción que se revirtió)
+    mensaje_error TEXT
+);
+CREATE INDEX idx_etl_run_log_proceso_etapa ON Etl_Run_Log (proceso, etapa, inicio);
+
+COMMENT ON TABLE Etl_Run_Log IS 'Bitácora de rendimiento: una fila por etapa (extracción, transformación, carga) de cada corrida del ETL.';
+
+DROP TABLE IF EXISTS Etl_Huellas_Payload CASCADE;
+CREATE TABLE Etl_Huellas_Payload (
+    proceso VARCHAR(50) NOT NULL,      -- Ej: 'productos', 'clientes', 'vendedores'
+    endpoint VARCHAR(50) NOT NULL,     -- Llave de config.API_URLS
+    empresa_erp VARCHAR(50) NOT NULL,
+    huella CHAR(64) NOT NULL,          -- SHA-256 del payload crudo (más el contexto del proceso)
+    fecha_proceso TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (proceso, endpoint, empresa_erp)
+);
+
+COMMENT ON TABLE Etl_Huellas_Payload IS 'Huella del último payload de la API cargado con éxito, por proceso, endpoint y empresa. Si el payload llega idéntico, se omiten la transformación y la carga.';
+
+DROP TABLE IF EXISTS Etl_Huellas_Registro CASCADE;
+CREATE TABLE Etl_Huellas_Registro (
+    proceso VARCHAR(50) NOT NULL,
+    empresa_erp VARCHAR(50) NOT NULL,
+    llave VARCHAR(255) NOT NULL,       -- Llave de negocio del registro, ej: 'codigo|referencia|empresa'
+    huella BIGINT NOT NULL,            -- Hash de 64 bits del contenido del registro
+    fecha_proceso TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (proceso, empresa_erp, llave)
+);
+
+COMMENT ON TABLE Etl_Huellas_Registro IS 'Huella de cada registro cargado (producto, cliente). Solo los registros nuevos o con huella distinta pasan a la transformación y la carga.';
@@ -0,0 +1,292 @@
+-- =================================================================
+-- MIGRACIÓN DE UNA BASE EXISTENTE AL ESQUEMA ACTUAL DE schema.sql
+-- =================================================================
+-- schema.sql borra y recrea cada tabla: sirve para una base nueva, no para una con datos.
+-- Este script solo agrega lo que falte (tablas, columnas e índices) y se puede ejecutar
+-- varias veces sobre la misma base. Cuando schema.sql agregue una tabla o columna,
+-- agrégala también aquí con IF NOT EXISTS.
+--
+-- Uso: psql -d gestion_comercial -f sql/migracion_esquema.sql
+-- (sin --single-transaction: el índice único de Hechos_Ventas se crea con CONCURRENTLY)
+
+-- =================================================================
+-- HISTORIA DE PRODUCTOS Y PRECIOS
+-- =================================================================
+
+CREATE TABLE IF NOT EXISTS Dim_Productos_Historia (
+    id_producto_historia SERIAL PRIMARY KEY,
+    id_producto_fk INT NOT NULL REFERENCES Dim_Productos(id_producto),
+
+    -- Atributos de Dim_Productos tal como estaban durante la vigencia
+    descripcion_erp VARCHAR(255),
+    cod_grupo_erp VARCHAR(50),
+    cod_linea_erp VARCHAR(50),
+    cod_dpto_sku_erp VARCHAR(50),
+    cod_marca_erp VARCHAR(50),
+    costo_promedio_erp NUMERIC(18, 6),
+    costo_ult_erp NUMERIC(18, 6),
+    huella_atributos CHAR(32) NOT NULL, -- md5 de los atributos: si no cambia, no se abre versión
+
+    -- Columnas para manejar el historial
+    fecha_inicio_validez DATE NOT NULL,
+    fecha_fin_validez DATE NOT NULL,
+    CONSTRAINT uq_producto_historia_inicio UNIQUE (id_producto_fk, fecha_inicio_validez)
+);
+-- Búsqueda de la versión vigente (fecha_fin_validez = '9999-12-31') al comparar huellas.
+CREATE INDEX IF NOT EXISTS idx_productos_historia_vigente ON Dim_Productos_Historia (id_producto_fk, fecha_fin_validez);
+COMMENT ON TABLE Dim_Productos_Historia IS 'Tabla histórica (SCD Tipo 2) de los atributos y costos de cada producto. La mantiene el ETL de productos.';
+
+CREATE TABLE IF NOT EXISTS Dim_Precios_Lista_Historia (
+    id_precio_historia SERIAL PRIMARY KEY,
+    id_producto_fk INT NOT NULL REFERENCES Dim_Productos(id_producto),
+    cod_lista_erp VARCHAR(20) NOT NULL, -- OCODLISTA de los Items del producto
+    precio NUMERIC(18, 4) NOT NULL,
+
+    -- Solo se abre una fila cuando el precio de la lista cambia
+    fecha_inicio_validez DATE NOT NULL,
+    fecha_fin_validez DATE NOT NULL,
+    CONSTRAINT uq_precio_lista_inicio UNIQUE (id_producto_fk, cod_lista_erp, fecha_inicio_validez)
+);
+-- Búsqueda de los precios vigentes (fecha_fin_validez = '9999-12-31') de cada producto.
+CREATE INDEX IF NOT EXISTS idx_precios_lista_vigente ON Dim_Precios_Lista_Historia (id_producto_fk, fecha_fin_validez);
+COMMENT ON TABLE Dim_Precios_Lista_Historia IS 'Historia de precios por lista de cada producto, con vigencia. Una fila por cambio de precio; la mantiene el ETL de productos.';
+
+-- =================================================================
+-- ÍNDICES NUEVOS SOBRE DIMENSIONES EXISTENTES
+-- =================================================================
+
+CREATE INDEX IF NOT EXISTS idx_clientes_empresa_sin_maestro ON Dim_Clientes_Empresa (id_cliente_empresa) WHERE id_maestro_cliente_fk IS NULL;
+CREATE INDEX IF NOT EXISTS idx_clasificacion_historia_maestro ON Dim_Clientes_Clasificacion_Historia (id_maestro_cliente_fk, fecha_inicio_validez);
+
+-- =================================================================
+-- HECHOS DE VENTAS
+-- =================================================================
+
+-- Versión del producto y de la clasificación del cliente vigentes en la fecha de la venta.
+-- Las filas cargadas antes de la migración quedan en NULL hasta que se recargue su rango.
+ALTER TABLE Hechos_Ventas
+    ADD COLUMN IF NOT EXISTS id_producto_historia_fk INT REFERENCES Dim_Productos_Historia(id_producto_historia),
+    ADD COLUMN IF NOT EXISTS id_clasificacion_historia_fk INT REFERENCES Dim_Clientes_Clasificacion_Historia(id_clasificacion_historia);
+
+CREATE INDEX IF NOT EXISTS idx_hechos_ventas_producto_fecha ON Hechos_Ventas (id_producto_fk, fecha_sk);
+CREATE INDEX IF NOT EXISTS idx_hechos_ventas_cliente_fecha ON Hechos_Ventas (id_cliente_empresa_fk, fecha_sk);
+CREATE INDEX IF NOT EXISTS idx_hechos_ventas_fecha ON Hechos_Ventas (fecha_sk);
+
+-- Llave única de la línea del ERP (DEKARDEXID por empresa), que usan los ON CONFLICT de la carga.
+-- 1. Las líneas cargadas más de una vez (ventanas de carga solapadas) dejan solo la última copia,
+--    como deduplicar_ventas. Si se borró alguna, recalcula después los resúmenes:
+--    python 00_ETL_TNS/resumen_margenes.py --reconstruir y python 00_ETL_TNS/clasificacion_abc.py --reconstruir
+DELETE FROM Hechos_Ventas a
+USING Hechos_Ventas b
+WHERE a.empresa_erp = b.empresa_erp AND a.id_transaccion_erp = b.id_transaccion_erp AND a.id_venta < b.id_venta;
+
+-- 2. Un CREATE INDEX CONCURRENTLY que falló (ej. una carga insertó un duplicado mientras tanto) deja
+--    el índice inválido, e IF NOT EXISTS no lo reconstruiría: se borra para volver a crearlo.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_index WHERE indexrelid = to_regclass('uq_hechos_ventas_transaccion') AND NOT indisvalid) THEN
+        DROP INDEX uq_hechos_ventas_transaccion;
+    END IF;
+END $$;
+
+-- 3. Sin bloquear las cargas ni las consultas mientras se construye
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_hechos_ventas_transaccion ON Hechos_Ventas (empresa_erp, id_transaccion_erp);
+
+-- =================================================================
+-- REPOSICIÓN
+-- =================================================================
+
+CREATE TABLE IF NOT EXISTS Plan_Reposicion (
+    fecha_corte DATE NOT NULL,            -- Último día de historia usado en el pronóstico
+    id_producto_fk INT NOT NULL REFERENCES dim_productos(id_producto),
+    id_bodega_fk INT NOT NULL REFERENCES Dim_Bodegas(id_bodega),
+    empresa_erp VARCHAR(50),
+    modelo VARCHAR(30) NOT NULL,          -- Modelo con menor error en la validación: media_movil, suavizado, estacional o croston
+    demanda_diaria NUMERIC(18, 4) NOT NULL,  -- Promedio pronosticado durante el tiempo de reposición
+    error_diario NUMERIC(18, 4) NOT NULL,    -- Error cuadrático medio diario del modelo en la validación
+    stock_disponible NUMERIC(18, 4) NOT NULL,
+    dias_cobertura NUMERIC(18, 1),           -- NULL si no hay demanda pronosticada
+    stock_seguridad NUMERIC(18, 4) NOT NULL,
+    punto_reorden NUMERIC(18, 4) NOT NULL,
+    reponer BOOLEAN NOT NULL,
+    PRIMARY KEY (id_producto_fk, id_bodega_fk)
+);
+COMMENT ON TABLE Plan_Reposicion IS 'Último pronóstico de demanda por producto y bodega, con días de cobertura y punto de reorden. Se reemplaza completo en cada corrida.';
+
+-- =================================================================
+-- CUARENTENA, ARCHIVO Y RESÚMENES DE VENTAS
+-- =================================================================
+
+CREATE TABLE IF NOT EXISTS Cuarentena_Ventas (
+    -- Llave de la línea en el ERP (DEKARDEXID por empresa)
+    empresa_erp VARCHAR(50) NOT NULL,
+    id_transaccion_erp BIGINT NOT NULL,
+
+    -- Línea tal como llegó de la API (ya renombrada), para poder re-enriquecerla sin volver a llamarla
+    numero_factura_erp VARCHAR(50),
+    fecha_str VARCHAR(20),
+    fecha_sk DATE,
+    cod_cliente_erp VARCHAR(50),
+    codigo_producto_erp VARCHAR(30),
+    referencia_erp VARCHAR(30),
+    cod_vendedor_erp VARCHAR(50),
+    cantidad NUMERIC(18, 4),
+    valor_base NUMERIC(18, 4),
+    valor_descuento NUMERIC(18, 4),
+    valor_iva NUMERIC(18, 4),
+    valor_total NUMERIC(18, 4),
+    costo_total NUMERIC(18, 4),
+    precio_lista NUMERIC(18, 4),
+    forma_pago_erp VARCHAR(10),
+    bodega_erp VARCHAR(20),
+    lista_precio_erp VARCHAR(20),
+    observaciones_erp VARCHAR(255),
+    motivo_devolucion_erp VARCHAR(255),
+    pedido_tiendapp VARCHAR(20),
+
+    -- Control del rechazo
+    motivo_rechazo VARCHAR(100) NOT NULL, -- Dimensiones faltantes, ej: 'producto,rol_vendedor'
+    fecha_ingreso TIMESTAMP DEFAULT NOW(),
+    intentos INT DEFAULT 0,
+    fecha_ultimo_intento TIMESTAMP,
+    PRIMARY KEY (empresa_erp, id_transaccion_erp)
+);
+CREATE INDEX IF NOT EXISTS idx_cuarentena_ventas_fecha ON Cuarentena_Ventas (empresa_erp, fecha_sk);
+
+COMMENT ON TABLE Cuarentena_Ventas IS 'Líneas de venta que no se pudieron enriquecer (producto, cliente, vendedor o bodega inexistentes). Se reprocesan y promueven a Hechos_Ventas.';
+
+CREATE TABLE IF NOT EXISTS Archivo_Hechos_Ventas (
+    mes DATE NOT NULL,                   -- Primer día del mes archivado
+    parte INT NOT NULL,                  -- Un mes puede archivarse en varias partes (ventas promovidas después)
+    ruta_archivo VARCHAR(500) NOT NULL,  -- Relativa a ARCHIVO_VENTAS_DIR
+    filas BIGINT NOT NULL,
+    sha256 CHAR(64) NOT NULL,
+    suma_valor_total NUMERIC(24, 4) NOT NULL,
+    suma_cantidad NUMERIC(24, 4) NOT NULL,
+    fecha_archivo TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (mes, parte)
+);
+COMMENT ON TABLE Archivo_Hechos_Ventas IS 'Registro de los meses de Hechos_Ventas movidos a Parquet (archivo en frío), con filas, sumas de control y sha256 de cada archivo.';
+
+CREATE TABLE IF NOT EXISTS Resumen_Margenes_Mes (
+    mes DATE NOT NULL,                  -- Primer día del mes
+    empresa_erp VARCHAR(50) NOT NULL,
+    eje VARCHAR(20) NOT NULL,           -- 'producto', 'cliente', 'rol', 'bodega' o 'empresa'
+    id_miembro INT NOT NULL,            -- id_producto, id_cliente_empresa, id_rol_historia o id_bodega (0 para 'empresa')
+
+    -- Solo sumas: los porcentajes se calculan al consultar, para poder agregar varios meses
+    lineas BIGINT NOT NULL,
+    cantidad NUMERIC(24, 4) NOT NULL,
+    valor_base NUMERIC(24, 4) NOT NULL,
+    valor_descuento NUMERIC(24, 4) NOT NULL,
+    costo_total NUMERIC(24, 4) NOT NULL,
+    valor_neto_con_costo NUMERIC(24, 4) NOT NULL,  -- Valor neto de las líneas que traen costo
+    valor_lista NUMERIC(24, 4) NOT NULL,           -- precio_lista x cantidad
+    valor_neto_con_lista NUMERIC(24, 4) NOT NULL,  -- Valor neto de las líneas que traen precio de lista
+    PRIMARY KEY (mes, empresa_erp, eje, id_miembro)
+);
+CREATE INDEX IF NOT EXISTS idx_resumen_margenes_eje ON Resumen_Margenes_Mes (eje, mes);
+COMMENT ON TABLE Resumen_Margenes_Mes IS 'Sumas mensuales de ventas, descuentos, costo y precio de lista por producto, cliente, rol y bodega. El ETL de ventas recalcula solo los meses que recarga.';
+
+CREATE TABLE IF NOT EXISTS Ventas_Diarias_Entidad (
+    fecha_sk DATE NOT NULL,
+    empresa_erp VARCHAR(50) NOT NULL,
+    tipo_entidad VARCHAR(20) NOT NULL,  -- 'producto' (id_producto) o 'cliente' (id_cliente_empresa)
+    id_entidad INT NOT NULL,
+    lineas INT NOT NULL,
+    facturas INT NOT NULL,
+    valor_neto NUMERIC(24, 4) NOT NULL,  -- valor_base - valor_descuento
+    utilidad NUMERIC(24, 4) NOT NULL,    -- valor neto - costo_total (líneas con costo)
+    PRIMARY KEY (fecha_sk, empresa_erp, tipo_entidad, id_entidad)
+);
+COMMENT ON TABLE Ventas_Diarias_Entidad IS 'Venta neta y utilidad por día, empresa y producto o cliente. El ETL de ventas recalcula los días que recarga; base de los acumulados ABC.';
+
+-- =================================================================
+-- CLASIFICACIÓN ABC Y SEGMENTOS RFM
+-- =================================================================
+
+CREATE TABLE IF NOT EXISTS Acumulado_ABC (
+    ventana_meses SMALLINT NOT NULL,
+    tipo_entidad VARCHAR(20) NOT NULL,
+    id_entidad INT NOT NULL,
+    valor_neto NUMERIC(24, 4) NOT NULL,
+    utilidad NUMERIC(24, 4) NOT NULL,
+    PRIMARY KEY (ventana_meses, tipo_entidad, id_entidad)
+);
+COMMENT ON TABLE Acumulado_ABC IS 'Suma de Ventas_Diarias_Entidad en cada ventana móvil, a la fecha de corte de Control_ABC. Se mantiene por diferencia.';
+
+CREATE TABLE IF NOT EXISTS Control_ABC (
+    ventana_meses SMALLINT PRIMARY KEY,
+    fecha_corte DATE NOT NULL  -- La ventana cubre (fecha_corte - ventana_meses meses, fecha_corte]
+);
+
+CREATE TABLE IF NOT EXISTS Dim_Clasificacion_ABC_Historia (
+    id_clasificacion_abc SERIAL PRIMARY KEY,
+    tipo_entidad VARCHAR(20) NOT NULL,  -- 'producto', 'maestro' (id_maestro_cliente) o 'cliente_empresa'
+    id_entidad INT NOT NULL,
+    ventana_meses SMALLINT NOT NULL,
+    clase_venta CHAR(1) NOT NULL,       -- A, B o C por venta neta
+    clase_utilidad CHAR(1) NOT NULL,    -- A, B o C por utilidad
+    fecha_inicio_validez DATE NOT NULL,
+    fecha_fin_validez DATE NOT NULL,
+    CONSTRAINT uq_clasificacion_abc_inicio UNIQUE (tipo_entidad, id_entidad, ventana_meses, fecha_inicio_validez)
+);
+CREATE INDEX IF NOT EXISTS idx_clasificacion_abc_vigente ON Dim_Clasificacion_ABC_Historia (fecha_fin_validez);
+COMMENT ON TABLE Dim_Clasificacion_ABC_Historia IS 'Historia de la clase ABC (Pareto) de productos y clientes por ventana móvil de 3, 6 y 12 meses. Solo se abre versión cuando cambia la clase.';
+
+CREATE TABLE IF NOT EXISTS Dim_Segmento_RFM_Historia (
+    id_segmento_rfm SERIAL PRIMARY KEY,
+    tipo_entidad VARCHAR(20) NOT NULL,  -- 'maestro' (id_maestro_cliente) o 'cliente_empresa' (id_cliente_empresa)
+    id_entidad INT NOT NULL,
+    segmento VARCHAR(30) NOT NULL,      -- Campeones, Leales, Potenciales, Nuevos, Requieren atención, En riesgo, Hibernando, Perdidos
+    fecha_inicio_validez DATE NOT NULL,
+    fecha_fin_validez DATE NOT NULL,
+    CONSTRAINT uq_segmento_rfm_inicio UNIQUE (tipo_entidad, id_entidad, fecha_inicio_validez)
+);
+CREATE INDEX IF NOT EXISTS idx_segmento_rfm_vigente ON Dim_Segmento_RFM_Historia (fecha_fin_validez);
+COMMENT ON TABLE Dim_Segmento_RFM_Historia IS 'Historia del segmento RFM (recencia, frecuencia, valor) de cada cliente maestro. Solo se abre versión cuando cambia el segmento.';
+
+-- =================================================================
+-- BITÁCORA Y HUELLAS DEL ETL
+-- =================================================================
+
+CREATE TABLE IF NOT EXISTS Etl_Run_Log (
+    id_registro BIGSERIAL PRIMARY KEY,
+    id_ejecucion VARCHAR(40) NOT NULL,
+    proceso VARCHAR(50) NOT NULL,
+    etapa VARCHAR(50) NOT NULL,
+    inicio TIMESTAMPTZ NOT NULL,
+    segundos NUMERIC(12, 3),
+    filas_entrada INT,
+    filas_salida INT,
+    bytes_descargados BIGINT,
+    filas_afectadas_bd INT,
+    memoria_pico_mb NUMERIC(10, 1),
+    estado VARCHAR(10) NOT NULL,       -- OK, ERROR o REVERTIDA (terminó bien dentro de una transacción que se revirtió)
+    mensaje_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_etl_run_log_proceso_etapa ON Etl_Run_Log (proceso, etapa, inicio);
+
+COMMENT ON TABLE Etl_Run_Log IS 'Bitácora de rendimiento: una fila por etapa (extracción, transformación, carga) de cada corrida del ETL.';
+
+CREATE TABLE IF NOT EXISTS Etl_Huellas_Payload (
+    proceso VARCHAR(50) NOT NULL,      -- Ej: 'productos', 'clientes', 'vendedores'
+    endpoint VARCHAR(50) NOT NULL,     -- Llave de config.API_URLS
+    empresa_erp VARCHAR(50) NOT NULL,
+    huella CHAR(64) NOT NULL,          -- SHA-256 del payload crudo (más el contexto del proceso)
+    fecha_proceso TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (proceso, endpoint, empresa_erp)
+);
+
+COMMENT ON TABLE Etl_Huellas_Payload IS 'Huella del último payload de la API cargado con éxito, por proceso, endpoint y empresa. Si el payload llega idéntico, se omiten la transformación y la carga.';
+
+CREATE TABLE IF NOT EXISTS Etl_Huellas_Registro (
+    proceso VARCHAR(50) NOT NULL,
+    empresa_erp VARCHAR(50) NOT NULL,
+    llave VARCHAR(255) NOT NULL,       -- Llave de negocio del registro, ej: 'codigo|referencia|empresa'
+    huella BIGINT NOT NULL,            -- Hash de 64 bits del contenido del registro
+    fecha_proceso TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (proceso, empresa_erp, llave)
+);
+
+COMMENT ON TABLE Etl_Huellas_Registro IS 'Huella de cada registro cargado (producto, cliente). Solo los registros nuevos o con huella distinta pasan a la transformación y la carga.';